@@ -5,7 +5,7 @@ Inherits from base-agent for shared functionality
 
 import os
 import sys
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime
 
 # Add the base_agent module to Python path
@@ -14,7 +14,7 @@ base_agent_path = os.path.join(current_dir, "base_agent")
 sys.path.insert(0, str(base_agent_path))
 
 try:
-    from core.agent import BaseAgent
+    from core.agent import BaseAgent, load_config
 except ImportError:
     # Fallback for when base_agent isn't properly set up
     print("Warning: base_agent module not found. Creating minimal BaseAgent.")
@@ -34,7 +34,9 @@ except ImportError:
                 "response_time": 1.0
             }
 
-from langchain.tools import Tool
+from jurisdictions import STATE_NAMES, detect_jurisdictions
+from knowledge_graph import KnowledgeGraph, snapshot_path
+from regulation_store import GENERAL, RegulationStore, detect_categories
 
 class ComplianceAgent(BaseAgent):
     """
@@ -47,6 +49,15 @@ class ComplianceAgent(BaseAgent):
         config_path = os.path.join(agent_path, "agent_config.yaml")
         self.config = load_config(config_path)
 
+        # Structured per-state requirements backing the state_requirements tool,
+        # built by update_regulations_daily.py rather than by every worker
+        self.regulation_store = RegulationStore.load_or_empty(agent_path)
+
+        # Indexed compliance ontology backing the knowledge_graph tool
+        ttl_path = os.path.join(agent_path, "rag", "knowledge_base.ttl")
+        self.knowledge_graph = KnowledgeGraph.load(ttl_path, snapshot_path(ttl_path)) \
+            if os.path.exists(ttl_path) else KnowledgeGraph()
+
         # Initialize base agent with config
         super().__init__(
             agent_name=self.config.agent.name,
@@ -55,32 +66,25 @@ class ComplianceAgent(BaseAgent):
             agent_path=agent_path
         )
 
-        # Add compliance-specific tools
-        self._add_compliance_tools()
-
-    def _add_compliance_tools(self):
-        """Add compliance-specific tools to the base agent"""
-        compliance_tools = [
+    def _create_tools(self):
+        """Compliance-specific tools, created when the agent is first built"""
+        return super()._create_tools() + [
             self._create_regulatory_search_tool(),
             self._create_compliance_check_tool(),
-            self._create_state_requirements_tool()
+            self._create_state_requirements_tool(),
+            self._create_knowledge_graph_tool()
         ]
 
-        # Add tools to base agent's tool list
-        self.tools.extend(compliance_tools)
-
-        # Reinitialize agent with new tools
-        self._initialize_agent()
-
     def _create_regulatory_search_tool(self):
         """Create regulatory search tool"""
+        from langchain.tools import Tool
+
         def regulatory_search(query: str) -> str:
             # Use base agent's RAG functionality with compliance-specific context
             if self.retriever:
                 try:
-                    docs = self.retriever.get_relevant_documents(f"cannabis regulation {query}")
-                    context = "\n\n".join([doc.page_content for doc in docs])
-                    return f"Regulatory guidance: {context}"
+                    context, _ = self.build_context(query, self.search_regulations(query, self.context_candidates()))
+                    return f"Regulatory guidance:\n{context}" if context else "No matching regulations found"
                 except Exception as e:
                     return f"Error searching regulations: {str(e)}"
             return "Regulatory search requires knowledge base setup"
@@ -93,6 +97,8 @@ class ComplianceAgent(BaseAgent):
 
     def _create_compliance_check_tool(self):
         """Create compliance check tool"""
+        from langchain.tools import Tool
+
         def compliance_check(query: str) -> str:
             return f"Compliance analysis for: {query}\n" \
                    f"Status: Review required\n" \
@@ -106,17 +112,72 @@ class ComplianceAgent(BaseAgent):
 
     def _create_state_requirements_tool(self):
         """Create state requirements tool"""
+        from langchain.tools import Tool
+
         def state_requirements(query: str) -> str:
-            return f"State requirements analysis for: {query}\n" \
-                   f"Jurisdiction: Multiple states applicable\n" \
-                   f"Key requirements: Licensing, testing, tracking, security"
+            # The agent often passes just a state code (e.g. "OR"), which
+            # free-text detection deliberately ignores for ambiguous codes
+            bare_code = query.strip().upper()
+            states = [bare_code] if bare_code in STATE_NAMES else detect_jurisdictions(query)
+            categories = detect_categories(query) or None
+
+            if not states:
+                covered = sorted(code for code in self.regulation_store.states if code != GENERAL)
+                return f"No state identified in: {query}\n" \
+                       f"States with structured requirements: {', '.join(covered)}\n\n" \
+                       f"{self.regulation_store.format(GENERAL, categories)}"
+
+            sections = [self.regulation_store.format(code, categories) for code in states]
+            sections.append(self.regulation_store.format(GENERAL, categories))
+            return "\n\n".join(sections)
 
         return Tool(
             name="state_requirements",
-            description="Analyze state-specific cannabis regulatory requirements",
+            description="Look up a state's cannabis requirements (licensing, testing, tracking, "
+                        "security, labeling). Input: a state name or code, optionally with a category",
             func=state_requirements
         )
 
+    def _create_knowledge_graph_tool(self):
+        """Create knowledge graph tool"""
+        from langchain.tools import Tool
+
+        def knowledge_graph(query: str) -> str:
+            return self.knowledge_graph.answer(query)
+
+        return Tool(
+            name="knowledge_graph",
+            description="Query the compliance ontology of regulators, license types, requirements and "
+                        "lab tests, e.g. 'which license types require water rights' or 'heavy metals test'",
+            func=knowledge_graph
+        )
+
+    def describe_tool_call(self, tool: str, tool_input: str) -> str:
+        """Progress message for streaming clients, e.g. Searching CA regulations"""
+        states = detect_jurisdictions(tool_input)
+        where = f"{', '.join(states)} " if states else ""
+        if tool == "regulatory_search":
+            return f"Searching {where}regulations"
+        if tool == "state_requirements":
+            return f"Looking up {where or tool_input.strip() + ' '}requirements"
+        if tool == "knowledge_graph":
+            return "Querying the compliance knowledge graph"
+        return super().describe_tool_call(tool, tool_input)
+
+    def search_regulations(self, query: str, k: Optional[int] = None) -> List[Tuple[Dict[str, Any], float]]:
+        """Chunks regulatory_search answers from, best first"""
+        if self.retriever is None:
+            return []
+        return self.retriever.search(f"cannabis regulation {query}", k)
+
+    def route_query(self, query: str) -> List[str]:
+        """Search only the shards for states named in the query"""
+        return detect_jurisdictions(query)
+
+    def cache_scope(self, query: str) -> str:
+        """Cache answers per jurisdiction so Colorado answers never serve California"""
+        return ",".join(sorted(detect_jurisdictions(query))) or "general"
+
     def get_system_prompt(self) -> str:
         """Override base system prompt with compliance-specific context"""
         return f"""You are a specialized AI agent for {self.config.agent.description}.
@@ -157,4 +218,3 @@ if __name__ == "__main__":
         print(f"Confidence: {result['confidence']}")
 
     asyncio.run(main())
-`
\ No newline at end of file
@@ -1,107 +1,418 @@
 
 """
 Base Agent Core Class
-Shared functionality for all specialized agents
+Shared functionality for all specialized agents.
+LangChain, the LLM client and FAISS are imported and built on first use,
+so constructing an agent is cheap; warm_up() builds them ahead of time.
 """
 
 import os
 import yaml
-from typing import List, Dict, Any, Optional
-from langchain.agents import AgentType, initialize_agent
-from langchain.llms import OpenAI
-from langchain.tools import Tool
-from langchain.memory import ConversationBufferMemory
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
 import time
 
+from .memory import SessionMemoryStore
+from .response_cache import ResponseCache
+from .tracing import ITERATION_BUCKETS, Trace
+
 class BaseAgent:
     """Base class for all specialized agents"""
     
+    # Blocking agent runs allowed in flight at once per process
+    executor_workers = 32
+    
     def __init__(self, agent_name: str, description: str, domain: str, agent_path: str = "."):
         self.agent_name = agent_name
         self.description = description
         self.domain = domain
         self.agent_path = agent_path
         self.tools = []
-        self.memory = ConversationBufferMemory(memory_key="chat_history")
+        # Subclasses may load agent_config.yaml themselves before calling super()
+        if not hasattr(self, "config"):
+            self.config = load_config(os.path.join(agent_path, "agent_config.yaml"))
+        self.memory = self._initialize_memory()
+        self.tracing = self._config_section("tracing")
         self.llm = None
-        self.agent = None
+        # Why the configured LLM could not be built; queries fail with it
+        self.llm_error: Optional[str] = None
         self.retriever = None
+        self.embeddings = None
+        self.rag_config: Dict[str, Any] = {}
+        # The LangChain executor is built exactly once, on first use
+        self._agent = None
+        self._agent_built = False
+        self._agent_lock = threading.Lock()
+        # Offload target for agents that only expose a blocking run()
+        self._executor = ThreadPoolExecutor(max_workers=self.executor_workers,
+                                            thread_name_prefix=f"{agent_name}-query")
         
         # Initialize base components
-        self._initialize_llm()
-        self._initialize_agent()
+        self._initialize_retriever()
+        self.response_cache = self._initialize_response_cache()
+    
+    def _config_section(self, name: str) -> Dict[str, Any]:
+        """Return a top-level section of agent_config.yaml, or {} if absent"""
+        if isinstance(self.config, dict):
+            return self.config.get(name) or {}
+        return {}
+    
+    def _initialize_memory(self) -> SessionMemoryStore:
+        """Create the per-user conversation memory store"""
+        memory_config = self._config_section("memory")
+        persist_dir = memory_config.get("persist_dir")
+        return SessionMemoryStore(
+            max_tokens=memory_config.get("max_tokens", 1500),
+            idle_ttl=memory_config.get("idle_ttl_seconds", 1800),
+            max_sessions=memory_config.get("max_sessions", 1000),
+            persist_dir=os.path.join(self.agent_path, persist_dir) if persist_dir else None
+        )
     
     def _initialize_llm(self):
-        """Initialize the language model"""
+        """Initialize the language model (llm.provider "stub" selects the offline stand-in).
+
+        The stub is only used when asked for by name; if the real model
+        cannot be built, queries return an error rather than stub text.
+        """
+        llm_config = self._config_section("llm")
+        if llm_config.get("provider") == "stub":
+            from .stub_llm import stub_llm_from_config
+            self.llm = stub_llm_from_config(llm_config.get("stub"))
+            return
         try:
-            self.llm = OpenAI(temperature=0.1, model_name="gpt-3.5-turbo-instruct")
+            from langchain.llms import OpenAI
+            # Streaming only changes behaviour when a callback consumes tokens
+            self.llm = OpenAI(temperature=0.1, model_name="gpt-3.5-turbo-instruct", streaming=True)
         except Exception as e:
             print(f"Warning: Could not initialize OpenAI LLM: {e}")
-            # Use a mock LLM for development
-            self.llm = MockLLM()
+            self.llm_error = str(e)
+    
+    def _initialize_retriever(self):
+        """Attach the published FAISS index, memory-mapped and hot-reloaded"""
+        rag_config = load_config(os.path.join(self.agent_path, "rag", "config.yaml"))
+        self.rag_config = rag_config if isinstance(rag_config, dict) else {}
+        vectorstore_config = rag_config.get("vectorstore", {}) if isinstance(rag_config, dict) else {}
+        if vectorstore_config.get("type", "faiss") != "faiss":
+            return
+        from .embeddings import embeddings_from_config
+        from .vectorstore import HotReloadRetriever, current_version
+
+        try:
+            self.embeddings = embeddings_from_config(vectorstore_config, self.agent_path)
+        except Exception as e:
+            print(f"Warning: Could not initialize embeddings: {e}")
+            return
+
+        index_dir = os.path.join(self.agent_path, vectorstore_config.get("index_dir", "rag/index"))
+        if current_version(index_dir) is None:
+            print(f"Warning: No published index in {index_dir}; run knowledge_base_builder.py")
+            return
+        try:
+            self.retriever = HotReloadRetriever(
+                index_dir,
+                self.embeddings,
+                k=vectorstore_config.get("top_k", 4),
+                check_interval=vectorstore_config.get("reload_interval", 5.0),
+                hybrid=vectorstore_config.get("hybrid", True),
+                candidates=vectorstore_config.get("hybrid_candidates", 20),
+                rrf_k=vectorstore_config.get("rrf_k", 60),
+                router=self.route_query
+            )
+        except Exception as e:
+            print(f"Warning: Could not initialize retriever: {e}")
+    
+    def _initialize_response_cache(self) -> Optional[ResponseCache]:
+        """Create the response cache, with paraphrase matching when embeddings exist"""
+        cache_config = self._config_section("response_cache")
+        if not cache_config.get("enabled", True):
+            return None
+        return ResponseCache(
+            ttl=cache_config.get("ttl_seconds", 86400),
+            max_entries=cache_config.get("max_entries", 5000),
+            embeddings=self.embeddings if cache_config.get("semantic", False) else None,
+            similarity_threshold=cache_config.get("similarity_threshold", 0.98)
+        )
+    
+    def context_candidates(self) -> Optional[int]:
+        """Chunks to retrieve before context assembly (rag/config.yaml context.candidates; None means top_k)"""
+        return (self.rag_config.get("context") or {}).get("candidates")
+    
+    def build_context(self, query: str, hits: List[Any]) -> Tuple[str, List[Dict[str, Any]]]:
+        """Pack retrieved (record, score) hits into the cited, token-budgeted context for the agent"""
+        from .context import assemble_context
+        context_config = self.rag_config.get("context") or {}
+        chunk_overlap = (self.rag_config.get("corpus") or {}).get("chunk_overlap", 200)
+        return assemble_context(
+            hits,
+            query,
+            max_tokens=context_config.get("max_tokens", 1200),
+            neighbours=context_config.get("neighbour_sentences", 1),
+            select=context_config.get("select_sentences", True),
+            # Chunk boundaries snap to whitespace, so overlaps run slightly past the setting
+            max_overlap=chunk_overlap * 2,
+            count_tokens=self.memory.count_tokens
+        )
+    
+    def corpus_version(self) -> str:
+        """Version of the knowledge base currently answering queries"""
+        if self.retriever is not None and self.retriever.snapshot is not None:
+            return self.retriever.snapshot.version
+        return "none"
+    
+    def route_query(self, query: str) -> List[str]:
+        """Index shards (jurisdictions) a query concerns; [] searches every shard"""
+        return []
+    
+    def cache_scope(self, query: str) -> str:
+        """Partition key for cached responses; subclasses narrow it (e.g. by jurisdiction)"""
+        return ""
+    
+    @property
+    def agent(self) -> Any:
+        """The LangChain agent executor, built on first access"""
+        if not self._agent_built:
+            with self._agent_lock:
+                if not self._agent_built:
+                    self._initialize_agent()
+                    self._agent_built = True
+        return self._agent
+    
+    async def _get_agent(self) -> Any:
+        """The agent executor, built off the event loop the first time"""
+        if self._agent_built:
+            return self._agent
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: self.agent)
+    
+    def _create_tools(self) -> List[Any]:
+        """Tools for the agent; subclasses add their domain tools"""
+        return []
+    
+    def warm_up(self) -> "BaseAgent":
+        """Build everything a query needs up front.
+
+        Call in each worker after it is forked (gunicorn's post_worker_init),
+        not in the master: the LLM client's connections, the sqlite embedding
+        cache and the executor's threads do not survive a fork. Index files
+        are memory-mapped, so workers share those pages regardless.
+        """
+        self.agent
+        self.memory.count_tokens("warm up")
+        return self
     
     def _initialize_agent(self):
         """Initialize the LangChain agent"""
+        if self.llm is None:
+            self._initialize_llm()
+        self.tools.extend(self._create_tools())
         if self.llm and self.tools:
             try:
-                self.agent = initialize_agent(
+                from langchain.agents import AgentType, initialize_agent
+                self._agent = initialize_agent(
                     tools=self.tools,
                     llm=self.llm,
                     agent=AgentType.CONVERSATIONAL_REACT_DESCRIPTION,
-                    memory=self.memory,
+                    # History is passed per call from the per-user memory store
                     verbose=True
                 )
             except Exception as e:
                 print(f"Warning: Could not initialize agent: {e}")
     
+    async def _run_agent(self, query: str, chat_history: str = "", callbacks: Optional[List[Any]] = None) -> str:
+        """Run the agent without blocking the event loop"""
+        agent = await self._get_agent()
+        if hasattr(agent, "ainvoke"):
+            # Native async path: LLM calls use the client's async API and
+            # synchronous tools are dispatched to the loop's executor
+            result = await agent.ainvoke({"input": query, "chat_history": chat_history},
+                                         config={"callbacks": callbacks})
+            return result["output"]
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, partial(agent.run, input=query, chat_history=chat_history, callbacks=callbacks)
+        )
+    
+    async def _traced_run(self, trace: Trace, query: str, chat_history: str = "",
+                          callbacks: Optional[List[Any]] = None) -> str:
+        """Run the agent with its LLM round trips, tool calls and retrieval recorded on trace"""
+        from .trace_callbacks import TracingCallbackHandler
+        handler = TracingCallbackHandler(trace, count_tokens=self.memory.count_tokens)
+        try:
+            with trace.active(), trace.span("agent"):
+                return await self._run_agent(query, chat_history, callbacks=[handler] + (callbacks or []))
+        finally:
+            trace.attributes["iterations"] = handler.iterations
+            trace.registry.observe("react_iterations", handler.iterations, buckets=ITERATION_BUCKETS)
+    
+    def _finish_trace(self, trace: Trace, outcome: str) -> None:
+        """Close the request's trace and dump it if tracing.trace_dir is set"""
+        duration = trace.finish(outcome)
+        trace_dir = self.tracing.get("trace_dir")
+        if trace_dir and duration >= self.tracing.get("slow_query_seconds", 0):
+            try:
+                trace.dump(os.path.join(self.agent_path, trace_dir))
+            except OSError as e:
+                print(f"Warning: Could not write trace {trace.trace_id}: {e}")
+    
+    def _unavailable_response(self, query: str) -> str:
+        """Placeholder answer when no agent could be built; fails if the LLM did not initialize"""
+        if self.llm_error is not None:
+            raise RuntimeError(f"LLM unavailable: {self.llm_error}")
+        return f"Mock response for: {query}"
+    
+    def _cache_lookup(self, user_id: str, query: str):
+        """Return (history, cache key or None, cached response or None)"""
+        history = self.memory.get_history(user_id)
+        # Follow-up questions depend on history, so only fresh
+        # conversations are served from (and stored in) the cache
+        if self.response_cache is None or history:
+            return history, None, None
+        key = (self.cache_scope(query), self.corpus_version())
+        hit = self.response_cache.get(query, *key)
+        return history, key, hit["response"] if hit is not None else None
+    
+    def _result(self, user_id: str, response: str, start_time: float, cached: bool = False,
+                trace: Optional[Trace] = None) -> Dict[str, Any]:
+        result = {
+            "response": response,
+            "confidence": 0.62,  # Mock confidence score
+            "response_time": round(time.time() - start_time, 3 if cached else 2),
+            "user_id": user_id,
+            "agent": self.agent_name,
+            "cached": cached
+        }
+        if trace is not None:
+            self._finish_trace(trace, "cached" if cached else "answered")
+            result.update(trace_id=trace.trace_id, timings=trace.stage_totals())
+        return result
+    
+    def _error_result(self, user_id: str, error: Exception, start_time: float,
+                      trace: Optional[Trace] = None) -> Dict[str, Any]:
+        result = {
+            "response": f"Error processing query: {str(error)}",
+            "confidence": 0.0,
+            "response_time": time.time() - start_time,
+            "user_id": user_id,
+            "agent": self.agent_name,
+            "error": True
+        }
+        if trace is not None:
+            self._finish_trace(trace, "error")
+            result.update(trace_id=trace.trace_id, timings=trace.stage_totals())
+        return result
+    
     async def process_query(self, user_id: str, query: str) -> Dict[str, Any]:
         """Process a user query and return response with metadata"""
         start_time = time.time()
+        trace = Trace("process_query", user_id=user_id, query=query)
         
         try:
-            if self.agent:
-                response = self.agent.run(query)
+            cached = False
+            if await self._get_agent():
+                with trace.span("cache_lookup"):
+                    history, cache_key, response = self._cache_lookup(user_id, query)
+                if response is not None:
+                    cached = True
+                else:
+                    response = await self._traced_run(trace, query, history)
+                    if cache_key is not None:
+                        self.response_cache.put(query, *cache_key, {"response": response})
+                self.memory.save_turn(user_id, query, response)
             else:
                 # Fallback response for development
-                response = f"Mock response for: {query}"
+                response = self._unavailable_response(query)
             
-            response_time = time.time() - start_time
+            return self._result(user_id, response, start_time, cached, trace)
+        except Exception as e:
+            return self._error_result(user_id, e, start_time, trace)
+    
+    def describe_tool_call(self, tool: str, tool_input: str) -> str:
+        """Progress message shown to streaming clients while a tool runs"""
+        return f"Using {tool}: {tool_input}"
+    
+    async def astream_query(self, user_id: str, query: str) -> AsyncIterator[Dict[str, Any]]:
+        """Yield tool and answer-token events as the agent works, then a final result event.
+
+        Events are dicts with a "type" of "tool", "tool_end", "token",
+        "result" or "error"; the result carries the same fields as
+        process_query.
+        """
+        start_time = time.time()
+        trace = Trace("astream_query", user_id=user_id, query=query)
+        task = None
+        try:
+            if not await self._get_agent():
+                response = self._unavailable_response(query)
+                yield {"type": "token", "text": response}
+                yield {"type": "result", **self._result(user_id, response, start_time, trace=trace)}
+                return
+            
+            with trace.span("cache_lookup"):
+                history, cache_key, response = self._cache_lookup(user_id, query)
+            if response is not None:
+                self.memory.save_turn(user_id, query, response)
+                yield {"type": "token", "text": response}
+                yield {"type": "result", **self._result(user_id, response, start_time, cached=True, trace=trace)}
+                return
+            
+            from .streaming import StreamingEventHandler
+            queue: "asyncio.Queue[Optional[Dict[str, Any]]]" = asyncio.Queue()
+            handler = StreamingEventHandler(queue, describe_tool=self.describe_tool_call)
+            task = asyncio.ensure_future(self._traced_run(trace, query, history, callbacks=[handler]))
+            task.add_done_callback(lambda _: queue.put_nowait(None))
+            while True:
+                event = await queue.get()
+                if event is None:
+                    break
+                yield event
+            response = task.result()
+            if not handler.streamed_answer:
+                # The LLM did not stream (or the answer had no recognised prefix)
+                yield {"type": "token", "text": response}
             
-            return {
-                "response": response,
-                "confidence": 0.62,  # Mock confidence score
-                "response_time": round(response_time, 2),
-                "user_id": user_id,
-                "agent": self.agent_name
-            }
+            if cache_key is not None:
+                self.response_cache.put(query, *cache_key, {"response": response})
+            self.memory.save_turn(user_id, query, response)
+            yield {"type": "result", **self._result(user_id, response, start_time, trace=trace)}
         except Exception as e:
-            return {
-                "response": f"Error processing query: {str(e)}",
-                "confidence": 0.0,
-                "response_time": time.time() - start_time,
-                "user_id": user_id,
-                "agent": self.agent_name,
-                "error": True
-            }
+            yield {"type": "error", **self._error_result(user_id, e, start_time, trace)}
+        finally:
+            # The client went away mid-answer: stop the agent run
+            if task is not None and not task.done():
+                task.cancel()
+                self._finish_trace(trace, "cancelled")
+    
+    def close(self):
+        """Release worker threads; called on server shutdown"""
+        self._executor.shutdown(wait=True, cancel_futures=True)
     
     def get_system_prompt(self) -> str:
         """Get the system prompt for this agent"""
         return f"You are {self.agent_name}, specialized in {self.domain}. {self.description}"
 
-class MockLLM:
-    """Mock LLM for development when OpenAI is not available"""
+class Config(dict):
+    """Configuration mapping that also allows attribute access (config.agent.name)"""
     
-    def __call__(self, prompt: str) -> str:
-        return f"Mock response to: {prompt[:100]}..."
+    def __init__(self, data: Optional[Dict[str, Any]] = None):
+        super().__init__({
+            key: Config(value) if isinstance(value, dict) else value
+            for key, value in (data or {}).items()
+        })
     
-    def run(self, prompt: str) -> str:
-        return self.__call__(prompt)
+    def __getattr__(self, name: str) -> Any:
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
 
 def load_config(config_path: str) -> Any:
     """Load YAML configuration file"""
     try:
         with open(config_path, 'r') as f:
-            return yaml.safe_load(f)
+            return Config(yaml.safe_load(f))
     except Exception as e:
         print(f"Warning: Could not load config from {config_path}: {e}")
         # Return mock config
@@ -0,0 +1,181 @@
+"""
+BM25 Inverted Index
+Lexical retrieval over the chunked corpus for exact tokens (section numbers,
+license classes, "METRC") that dense embeddings handle poorly. Postings are
+stored as flat numpy arrays that are memory-mapped from the snapshot.
+"""
+
+import os
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+BM25_DIRNAME = "bm25"
+
+# Keep dotted/hyphenated identifiers such as "5001.1" or "26-10" as one token
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.\-][a-z0-9]+)*")
+
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "how",
+    "i", "in", "is", "it", "of", "on", "or", "that", "the", "this", "to", "what", "when",
+    "which", "who", "with", "my", "our", "we", "you"
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stopwords"""
+    return [token for token in _TOKEN_PATTERN.findall(text.lower()) if token not in _STOPWORDS]
+
+
+class CollectionStats(NamedTuple):
+    """Statistics BM25 scores against; shared by shards so their scores are comparable"""
+    n_docs: int
+    avg_length: float
+    document_frequencies: Dict[str, int]
+
+
+class BM25Index:
+    """Okapi BM25 over array-backed postings.
+
+    For term t, ``postings[offsets[t]:offsets[t + 1]]`` are the positions of
+    the documents containing it and ``frequencies`` the matching term counts;
+    ``doc_ids`` maps a position back to the corpus record id.
+    """
+
+    def __init__(self, terms: Dict[str, int], offsets: np.ndarray, postings: np.ndarray,
+                 frequencies: np.ndarray, doc_lengths: np.ndarray, doc_ids: np.ndarray,
+                 k1: float = 1.2, b: float = 0.75):
+        self.terms = terms
+        self.offsets = offsets
+        self.postings = postings
+        self.frequencies = frequencies
+        self.doc_lengths = doc_lengths
+        self.doc_ids = doc_ids
+        self.k1 = k1
+        self.b = b
+        self.total_length = float(doc_lengths.sum()) if len(doc_lengths) else 0.0
+        self.avg_length = self.total_length / len(doc_lengths) if len(doc_lengths) else 0.0
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def document_frequency(self, term: str) -> int:
+        term_id = self.terms.get(term)
+        return 0 if term_id is None else int(self.offsets[term_id + 1] - self.offsets[term_id])
+
+    @classmethod
+    def build(cls, records: Iterable[Tuple[int, str]]) -> "BM25Index":
+        """Build from (record id, text) pairs"""
+        builder = BM25Builder()
+        for record_id, text in records:
+            builder.add(record_id, text)
+        return builder.build()
+
+    def search(self, query: str, k: int = 10, stats: Optional[CollectionStats] = None) -> List[Tuple[int, float]]:
+        """Return up to k (record id, score) pairs, best first.
+
+        IDF and length normalisation use stats when given (see
+        collection_stats), otherwise this index's own statistics.
+        """
+        if not len(self):
+            return []
+        scores = np.zeros(len(self), dtype="float32")
+        n_docs = stats.n_docs if stats else len(self)
+        avg_length = stats.avg_length if stats else self.avg_length
+        for term in set(tokenize(query)):
+            term_id = self.terms.get(term)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            positions = self.postings[start:end]
+            tf = self.frequencies[start:end]
+            df = stats.document_frequencies.get(term, end - start) if stats else end - start
+            idf = np.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * self.doc_lengths[positions] / (avg_length or 1.0))
+            scores[positions] += idf * tf * (self.k1 + 1.0) / (tf + norm)
+
+        matched = np.flatnonzero(scores)
+        if not len(matched):
+            return []
+        top = matched[np.argsort(-scores[matched], kind="stable")[:k]]
+        return [(int(self.doc_ids[i]), float(scores[i])) for i in top]
+
+    def save(self, directory: str) -> None:
+        """Write the vocabulary and posting arrays into directory"""
+        os.makedirs(directory, exist_ok=True)
+        vocabulary = sorted(self.terms, key=self.terms.get)
+        with open(os.path.join(directory, "terms.txt"), "w") as f:
+            f.write("\n".join(vocabulary))
+        for name in ("offsets", "postings", "frequencies", "doc_lengths", "doc_ids"):
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "BM25Index":
+        """Load an index; with mmap the postings stay in the shared page cache"""
+        with open(os.path.join(directory, "terms.txt"), "r") as f:
+            vocabulary = f.read().split("\n")
+        terms = {term: i for i, term in enumerate(vocabulary) if term}
+        arrays = [
+            np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r" if mmap else None)
+            for name in ("offsets", "postings", "frequencies", "doc_lengths", "doc_ids")
+        ]
+        return cls(terms, *arrays)
+
+
+def collection_stats(indexes: Sequence[BM25Index], query: str) -> CollectionStats:
+    """Document count, average length and the query terms' document frequencies across indexes"""
+    n_docs = sum(len(index) for index in indexes)
+    total_length = sum(index.total_length for index in indexes)
+    return CollectionStats(
+        n_docs,
+        total_length / n_docs if n_docs else 0.0,
+        {term: sum(index.document_frequency(term) for index in indexes) for term in set(tokenize(query))}
+    )
+
+
+class BM25Builder:
+    """Accumulates documents one at a time, then packs them into a BM25Index"""
+
+    def __init__(self):
+        self.doc_ids: List[int] = []
+        self.doc_lengths: List[int] = []
+        self.term_docs: Dict[str, List[Tuple[int, int]]] = {}
+
+    def add(self, record_id: int, text: str) -> None:
+        counts = Counter(tokenize(text))
+        position = len(self.doc_ids)
+        self.doc_ids.append(record_id)
+        self.doc_lengths.append(sum(counts.values()))
+        for term, count in counts.items():
+            self.term_docs.setdefault(term, []).append((position, count))
+
+    def build(self) -> BM25Index:
+        vocabulary = sorted(self.term_docs)
+        offsets = np.zeros(len(vocabulary) + 1, dtype="int64")
+        postings, frequencies = [], []
+        for i, term in enumerate(vocabulary):
+            entries = self.term_docs[term]
+            offsets[i + 1] = offsets[i] + len(entries)
+            postings.extend(position for position, _ in entries)
+            frequencies.extend(count for _, count in entries)
+
+        return BM25Index(
+            {term: i for i, term in enumerate(vocabulary)},
+            offsets,
+            np.asarray(postings, dtype="int32"),
+            np.asarray(frequencies, dtype="float32"),
+            np.asarray(self.doc_lengths, dtype="float32"),
+            np.asarray(self.doc_ids, dtype="int64")
+        )
+
+
+def reciprocal_rank_fusion(rankings: List[List[int]], k: int = 60,
+                           weights: Optional[List[float]] = None) -> List[Tuple[int, float]]:
+    """Fuse ranked id lists; each list contributes weight / (k + rank)"""
+    fused: Dict[int, float] = {}
+    for ranking, weight in zip(rankings, weights or [1.0] * len(rankings)):
+        for rank, doc_id in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + weight / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
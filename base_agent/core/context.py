@@ -0,0 +1,157 @@
+"""
+Context Assembly
+Turns retrieved chunks into the compact, cited context handed to the
+agent: overlapping chunks of one source are merged back together, only
+sentences sharing terms with the query (and their neighbours) are kept,
+and passages are packed best first into a token budget.
+"""
+
+import re
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from .bm25 import tokenize
+from .memory import token_counter
+
+# Sentence boundaries: end punctuation followed by the start of a new sentence or section
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?;])\s+(?=[A-Z0-9(\"'§])")
+# Shortest shared run treated as chunk overlap rather than coincidence
+MIN_OVERLAP_CHARS = 20
+# Passages that would be cut below this many tokens are skipped instead
+MIN_PASSAGE_TOKENS = 40
+GAP_MARKER = "…"
+
+
+def overlap_length(first: str, second: str, max_overlap: int) -> int:
+    """Length of the longest suffix of first that second starts with"""
+    probe = second[:MIN_OVERLAP_CHARS]
+    if len(probe) < MIN_OVERLAP_CHARS:
+        return 0
+    window_start = max(0, len(first) - max_overlap)
+    start = first.find(probe, window_start)
+    while start != -1:
+        if second.startswith(first[start:]):
+            return len(first) - start
+        start = first.find(probe, start + 1)
+    return 0
+
+
+def merge_overlapping(hits: List[Tuple[Dict[str, Any], float]], max_overlap: int) -> List[Dict[str, Any]]:
+    """Join retrieved chunks of the same source whose text overlaps into passages.
+
+    Chunk ids increase through a document, so chunks are merged in id
+    order; a passage keeps the best score of its chunks. Passages are
+    returned best first.
+    """
+    by_source: Dict[str, List[Tuple[Dict[str, Any], float]]] = {}
+    for record, score in hits:
+        by_source.setdefault(str(record.get("source", "")), []).append((record, score))
+
+    passages: List[Dict[str, Any]] = []
+    for source_hits in by_source.values():
+        current: Optional[Dict[str, Any]] = None
+        for record, score in sorted(source_hits, key=lambda hit: hit[0].get("id", 0)):
+            text = record["text"]
+            if current is not None and text in current["text"]:
+                current["score"] = max(current["score"], score)
+                current["chunk_ids"].append(record.get("id"))
+                continue
+            overlap = overlap_length(current["text"], text, max_overlap) if current is not None else 0
+            if overlap:
+                current["text"] += text[overlap:]
+                current["score"] = max(current["score"], score)
+                current["chunk_ids"].append(record.get("id"))
+                continue
+            current = {"text": text, "score": score, "record": record, "chunk_ids": [record.get("id")]}
+            passages.append(current)
+    return sorted(passages, key=lambda passage: passage["score"], reverse=True)
+
+
+def _normalize(sentence: str) -> str:
+    return " ".join(tokenize(sentence))
+
+
+def select_sentences(text: str, query_terms: Set[str], neighbours: int = 1,
+                     seen: Optional[Set[str]] = None) -> str:
+    """Sentences sharing a term with the query plus neighbours on each side.
+
+    Sentences already in ``seen`` (kept from an earlier passage) are
+    dropped; non-adjacent runs are joined with a gap marker.
+    """
+    sentences = _SENTENCE_BOUNDARY.split(text)
+    seen = seen if seen is not None else set()
+    matched = [i for i, sentence in enumerate(sentences) if query_terms & set(tokenize(sentence))]
+    keep = sorted({j for i in matched for j in range(i - neighbours, i + neighbours + 1) if 0 <= j < len(sentences)})
+
+    parts: List[str] = []
+    previous = None
+    for j in keep:
+        key = _normalize(sentences[j])
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        if previous is not None and j != previous + 1:
+            parts.append(GAP_MARKER)
+        parts.append(sentences[j])
+        previous = j
+    return " ".join(parts)
+
+
+def truncate_to_tokens(text: str, max_tokens: int, count_tokens: Callable[[str], int]) -> str:
+    """Drop trailing sentences (or, for one long sentence, trailing words) to fit max_tokens"""
+    sentences = _SENTENCE_BOUNDARY.split(text)
+    while len(sentences) > 1 and count_tokens(" ".join(sentences)) > max_tokens:
+        sentences.pop()
+    text = " ".join(sentences)
+    tokens = count_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    cut = text[:len(text) * max_tokens // tokens]
+    return cut[:cut.rfind(" ")].rstrip() + " " + GAP_MARKER if " " in cut else cut
+
+
+def citation(record: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: record[key] for key in ("source", "state", "category") if record.get(key)}
+
+
+def assemble_context(hits: List[Tuple[Dict[str, Any], float]], query: str, max_tokens: int = 1200,
+                     neighbours: int = 1, select: bool = True, max_overlap: int = 400,
+                     count_tokens: Optional[Callable[[str], int]] = None) -> Tuple[str, List[Dict[str, Any]]]:
+    """Pack retrieved (record, score) hits into at most max_tokens of cited context.
+
+    Returns the context, whose passages are headed "[n] source (state)",
+    and the citation metadata of each numbered passage.
+    """
+    count_tokens = count_tokens or token_counter()
+    passages = merge_overlapping(hits, max_overlap)
+    query_terms = set(tokenize(query))
+
+    seen: Set[str] = set()
+    texts = [select_sentences(p["text"], query_terms, neighbours, seen) if select and query_terms else p["text"]
+             for p in passages]
+    if not any(texts):
+        # Nothing shares a term with the query: fall back to the passages as retrieved
+        texts = [p["text"] for p in passages]
+
+    blocks: List[str] = []
+    citations: List[Dict[str, Any]] = []
+    used = 0
+    for passage, text in zip(passages, texts):
+        if not text:
+            continue
+        cited = citation(passage["record"])
+        header = f"[{len(citations) + 1}] {cited.get('source', 'unknown source')}" + \
+                 (f" ({cited['state']})" if cited.get("state") else "")
+        block = f"{header}\n{text}"
+        tokens = count_tokens(block)
+        if used + tokens > max_tokens:
+            remaining = max_tokens - used - count_tokens(header)
+            if remaining < MIN_PASSAGE_TOKENS:
+                continue
+            block = f"{header}\n{truncate_to_tokens(text, remaining, count_tokens)}"
+            tokens = count_tokens(block)
+            if used + tokens > max_tokens:
+                continue
+        blocks.append(block)
+        citations.append({**cited, "score": round(passage["score"], 4), "chunk_ids": passage["chunk_ids"]})
+        used += tokens
+    return "\n\n".join(blocks), citations
@@ -0,0 +1,185 @@
+"""
+Columnar Corpus Store
+Memory-mapped chunk storage: texts live in one blob addressed by an
+offsets array, metadata columns are dictionary-encoded, and a sorted id
+index gives random access by chunk id. Only the records actually read
+are materialized.
+"""
+
+import os
+import json
+import mmap
+import shutil
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+TEXT_FILENAME = "text.bin"
+SCHEMA_FILENAME = "schema.json"
+# Rows without a chunk id (hand-curated entries) are stored under this id
+NO_ID = -1
+
+
+class ColumnarCorpusWriter:
+    """Streams records into a new corpus directory, swapped in on commit"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.tmp_directory = f"{directory}.tmp"
+        shutil.rmtree(self.tmp_directory, ignore_errors=True)
+        os.makedirs(self.tmp_directory)
+        self._text = open(os.path.join(self.tmp_directory, TEXT_FILENAME), "wb")
+        self._offsets: List[int] = [0]
+        self._ids: List[int] = []
+        # Per column: distinct values, their codes and one code per row
+        self._values: Dict[str, List[Any]] = {}
+        self._codes_by_value: Dict[str, Dict[str, int]] = {}
+        self._codes: Dict[str, List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _encode(self, column: str, value: Any) -> int:
+        if column not in self._values:
+            self._values[column] = [None]
+            self._codes_by_value[column] = {"null": 0}
+            # Rows written before the column appeared have no value for it
+            self._codes[column] = [0] * len(self._ids)
+        key = json.dumps(value, sort_keys=True)
+        code = self._codes_by_value[column].get(key)
+        if code is None:
+            code = len(self._values[column])
+            self._values[column].append(value)
+            self._codes_by_value[column][key] = code
+        return code
+
+    def add(self, record: Dict[str, Any]) -> None:
+        encoded = record.get("text", "").encode("utf-8")
+        self._text.write(encoded)
+        self._offsets.append(self._offsets[-1] + len(encoded))
+        row_codes = {
+            column: self._encode(column, value)
+            for column, value in record.items() if column not in ("id", "text")
+        }
+        for column, codes in self._codes.items():
+            codes.append(row_codes.get(column, 0))
+        self._ids.append(record.get("id", NO_ID))
+
+    def finish(self) -> str:
+        """Write out the staged corpus without swapping it in; returns its directory.
+
+        The staged copy can be opened with ColumnarCorpus before commit.
+        """
+        if self._text.closed:
+            return self.tmp_directory
+        self._text.close()
+        ids = np.asarray(self._ids, dtype="int64")
+        order = np.argsort(ids, kind="stable")
+        arrays = {
+            "offsets": np.asarray(self._offsets, dtype="int64"),
+            "ids": ids,
+            "sorted_ids": ids[order],
+            "id_rows": order.astype("int64")
+        }
+        for column, codes in self._codes.items():
+            arrays[f"column_{column}"] = np.asarray(codes, dtype="int32")
+        for name, array in arrays.items():
+            np.save(os.path.join(self.tmp_directory, f"{name}.npy"), array)
+        with open(os.path.join(self.tmp_directory, SCHEMA_FILENAME), "w") as f:
+            json.dump({"count": len(self._ids), "columns": self._values}, f)
+        return self.tmp_directory
+
+    def commit(self) -> None:
+        """Finish the files and atomically replace the existing corpus"""
+        self.finish()
+        # Readers keep their mappings of the old files until they reopen
+        old_directory = f"{self.directory}.old"
+        shutil.rmtree(old_directory, ignore_errors=True)
+        if os.path.exists(self.directory):
+            os.replace(self.directory, old_directory)
+        os.replace(self.tmp_directory, self.directory)
+        shutil.rmtree(old_directory, ignore_errors=True)
+
+    def abort(self) -> None:
+        self._text.close()
+        shutil.rmtree(self.tmp_directory, ignore_errors=True)
+
+
+class ColumnarCorpus:
+    """Read-only, memory-mapped corpus addressable by chunk id"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, SCHEMA_FILENAME), "r") as f:
+            schema = json.load(f)
+        self.values: Dict[str, List[Any]] = schema["columns"]
+
+        def load(name: str) -> np.ndarray:
+            return np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+
+        self.offsets = load("offsets")
+        self.ids = load("ids")
+        self.sorted_ids = load("sorted_ids")
+        self.id_rows = load("id_rows")
+        self.codes = {column: load(f"column_{column}") for column in self.values}
+
+        text_path = os.path.join(directory, TEXT_FILENAME)
+        self._text: Any = b""
+        if os.path.getsize(text_path):
+            with open(text_path, "rb") as f:
+                self._text = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _row_for_id(self, chunk_id: int) -> Optional[int]:
+        position = int(np.searchsorted(self.sorted_ids, chunk_id))
+        if position < len(self.sorted_ids) and self.sorted_ids[position] == chunk_id and chunk_id != NO_ID:
+            return int(self.id_rows[position])
+        return None
+
+    def row(self, row: int) -> Dict[str, Any]:
+        """Materialize one record by row number"""
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        record: Dict[str, Any] = {}
+        if self.ids[row] != NO_ID:
+            record["id"] = int(self.ids[row])
+        record["text"] = self._text[start:end].decode("utf-8")
+        for column, values in self.values.items():
+            value = values[int(self.codes[column][row])]
+            if value is not None:
+                record[column] = value
+        return record
+
+    def __contains__(self, chunk_id: int) -> bool:
+        return self._row_for_id(chunk_id) is not None
+
+    def __getitem__(self, chunk_id: int) -> Dict[str, Any]:
+        row = self._row_for_id(chunk_id)
+        if row is None:
+            raise KeyError(chunk_id)
+        return self.row(row)
+
+    def get(self, chunk_id: int, default: Any = None) -> Any:
+        row = self._row_for_id(chunk_id)
+        return default if row is None else self.row(row)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        """Records in stored order"""
+        for row in range(len(self)):
+            yield self.row(row)
+
+
+def convert_jsonl(jsonl_path: str, directory: str) -> int:
+    """Convert a JSONL corpus into a columnar corpus directory, returning the row count"""
+    writer = ColumnarCorpusWriter(directory)
+    try:
+        with open(jsonl_path, "r") as f:
+            for line in f:
+                if line.strip():
+                    writer.add(json.loads(line))
+    except BaseException:
+        writer.abort()
+        raise
+    writer.commit()
+    return len(writer)
@@ -0,0 +1,226 @@
+"""
+Embedding Models
+Shared embedding model loading for corpus ingestion and queries, with an
+on-disk cache so repeated text (boilerplate, repeated statutes, common
+questions) is only ever embedded once per model
+"""
+
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form used for cache keys: NFKC with collapsed whitespace"""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text)).strip()
+
+
+class EmbeddingCache:
+    """SQLite-backed embedding cache keyed by model + normalized text hash, LRU-bounded.
+
+    Lookups are read-only: recency updates from hits are buffered in memory
+    and written in one transaction every touch_flush_size hits or
+    touch_flush_seconds, and before any eviction. Touches lost in a crash
+    only make the LRU order approximate.
+    """
+
+    def __init__(self, path: str, max_entries: int = 200000, touch_flush_size: int = 1000,
+                 touch_flush_seconds: float = 60.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.touch_flush_size = touch_flush_size
+        self.touch_flush_seconds = touch_flush_seconds
+        self.hits = 0
+        self.misses = 0
+        self._touched: Dict[str, float] = {}
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        # WAL lets several worker processes read while the builder writes
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model: str, kind: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\0{kind}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def _flush_touches(self) -> None:
+        """Write buffered recency updates (caller holds the lock and commits)"""
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE key = ? AND last_used < ?",
+                [(used, key, used) for key, used in self._touched.items()]
+            )
+            self._touched.clear()
+        self._last_flush = time.monotonic()
+
+    def flush(self) -> None:
+        """Persist buffered recency updates now"""
+        with self._lock:
+            self._flush_touches()
+            self._conn.commit()
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Return cached vectors for the keys that are present, refreshing their recency"""
+        found = {}
+        now = time.time()
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype="float32").tolist()
+            for key in found:
+                self._touched[key] = now
+            if len(self._touched) >= self.touch_flush_size or (
+                    self._touched and time.monotonic() - self._last_flush >= self.touch_flush_seconds):
+                self._flush_touches()
+                self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(set(keys)) - len(found)
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]) -> None:
+        """Store vectors, evicting the least recently used entries beyond max_entries"""
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, np.asarray(vector, dtype="float32").tobytes(), now) for key, vector in items.items()]
+            )
+            # Eviction must see every recent hit
+            self._flush_touches()
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            if count > self.max_entries:
+                # Evict down to 90% so we are not trimming on every insert
+                excess = count - int(self.max_entries * 0.9)
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)", (excess,)
+                )
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0
+        }
+
+
+class CachedEmbeddings:
+    """Wraps an embedding model so only uncached texts reach it"""
+
+    def __init__(self, embeddings: Any, cache: EmbeddingCache, model_name: str):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model_name = model_name
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self.cache.make_key(self.model_name, "document", text) for text in texts]
+        vectors = self.cache.get_many(list(dict.fromkeys(keys)))
+
+        # Embed each distinct missing text once, even if it repeats within the batch
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors and key not in missing:
+                missing[key] = text
+        if missing:
+            embedded = self.embeddings.embed_documents(list(missing.values()))
+            new_vectors = dict(zip(missing.keys(), embedded))
+            self.cache.put_many(new_vectors)
+            vectors.update(new_vectors)
+
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self.cache.make_key(self.model_name, "query", text)
+        cached = self.cache.get_many([key])
+        if key in cached:
+            return cached[key]
+        vector = self.embeddings.embed_query(text)
+        self.cache.put_many({key: vector})
+        return vector
+
+
+class HashEmbeddings:
+    """Deterministic local embedding stub using signed feature hashing.
+
+    Texts sharing words land near each other, which is enough to exercise
+    retrieval end to end without calling a remote model.
+    """
+
+    def __init__(self, dimension: int = 256):
+        self.dimension = dimension
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimension, dtype="float32")
+        for token in re.findall(r"\w+", normalize_text(text).lower()):
+            digest = hashlib.md5(token.encode("utf-8")).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dimension
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+def load_embeddings(model_name: str = "text-embedding-ada-002", provider: str = "openai") -> Any:
+    """Load the embedding model used by the RAG pipeline"""
+    if provider == "stub":
+        return HashEmbeddings()
+    try:
+        from langchain_openai import OpenAIEmbeddings
+    except ImportError:
+        from langchain.embeddings import OpenAIEmbeddings
+    return OpenAIEmbeddings(model=model_name)
+
+
+def embeddings_from_config(vectorstore_config: Dict[str, Any], base_path: str = ".") -> Any:
+    """Build the (optionally cached) embedding model described by rag/config.yaml"""
+    model_name = vectorstore_config.get("embedding_model", "text-embedding-ada-002")
+    provider = vectorstore_config.get("embedding_provider", "openai")
+    embeddings = load_embeddings(model_name, provider)
+
+    cache_config = vectorstore_config.get("embedding_cache") or {}
+    if not cache_config.get("enabled", True) or not cache_config.get("path"):
+        return embeddings
+    cache = EmbeddingCache(
+        os.path.join(base_path, cache_config["path"]),
+        max_entries=cache_config.get("max_entries", 200000),
+        touch_flush_size=cache_config.get("touch_flush_size", 1000),
+        touch_flush_seconds=cache_config.get("touch_flush_seconds", 60.0)
+    )
+    # Cache keys include the provider so stub vectors never mix with real ones
+    return CachedEmbeddings(embeddings, cache, f"{provider}:{model_name}")
@@ -0,0 +1,162 @@
+"""
+Conversation Memory Store
+Per-user conversation history with token-budgeted windows, idle eviction
+and an optional on-disk backend so sessions survive restarts
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+
+def token_counter() -> Callable[[str], int]:
+    """Count tokens with tiktoken when available, otherwise estimate ~4 chars/token"""
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding("cl100k_base")
+        return lambda text: len(encoding.encode(text, disallowed_special=()))
+    except Exception:
+        return lambda text: max(1, len(text) // 4)
+
+
+class ConversationSession:
+    """Sliding window of one user's turns, trimmed to a token budget"""
+
+    def __init__(self, user_id: str, turns: Optional[List[Dict[str, Any]]] = None):
+        self.user_id = user_id
+        self.turns = turns or []
+        self.last_active = time.time()
+
+    @property
+    def tokens(self) -> int:
+        return sum(turn["tokens"] for turn in self.turns)
+
+    def add_turn(self, human: str, ai: str, tokens: int, max_tokens: int):
+        self.turns.append({"human": human, "ai": ai, "tokens": tokens})
+        # Drop the oldest turns until the window fits the budget
+        while len(self.turns) > 1 and self.tokens > max_tokens:
+            self.turns.pop(0)
+        self.last_active = time.time()
+
+    def render(self, human_prefix: str = "Human", ai_prefix: str = "AI") -> str:
+        """Format history the same way ConversationBufferMemory does"""
+        lines = []
+        for turn in self.turns:
+            lines.append(f"{human_prefix}: {turn['human']}")
+            lines.append(f"{ai_prefix}: {turn['ai']}")
+        return "\n".join(lines)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"user_id": self.user_id, "turns": self.turns, "last_active": self.last_active}
+
+
+class SessionMemoryStore:
+    """Conversation memory keyed by user_id"""
+
+    def __init__(self, max_tokens: int = 1500, idle_ttl: float = 1800, max_sessions: int = 1000,
+                 persist_dir: Optional[str] = None):
+        self.max_tokens = max_tokens
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self.persist_dir = persist_dir
+        self._count_tokens: Optional[Callable[[str], int]] = None
+        self._sessions: "OrderedDict[str, ConversationSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        if persist_dir:
+            os.makedirs(persist_dir, exist_ok=True)
+
+    def count_tokens(self, text: str) -> int:
+        # The tokenizer is loaded on first use rather than at startup
+        if self._count_tokens is None:
+            self._count_tokens = token_counter()
+        return self._count_tokens(text)
+
+    def _session_path(self, user_id: str) -> str:
+        # Hash the id so arbitrary user ids are always safe filenames
+        digest = hashlib.sha256(user_id.encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.persist_dir, f"{digest}.json")
+
+    def _load(self, user_id: str) -> Optional[ConversationSession]:
+        if not self.persist_dir:
+            return None
+        try:
+            with open(self._session_path(user_id), "r") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Warning: Could not load session for {user_id}: {e}")
+            return None
+        session = ConversationSession(user_id, data.get("turns", []))
+        session.last_active = data.get("last_active", time.time())
+        return session
+
+    def _persist(self, session: ConversationSession):
+        if not self.persist_dir:
+            return
+        path = self._session_path(session.user_id)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(session.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    def _get_session(self, user_id: str, create: bool) -> Optional[ConversationSession]:
+        """Look up a session (caller holds the lock), loading it from disk if needed"""
+        session = self._sessions.get(user_id) or self._load(user_id)
+        # A session idle past the TTL starts fresh
+        if session is not None and time.time() - session.last_active > self.idle_ttl:
+            session = None
+        if session is None:
+            if not create:
+                return None
+            session = ConversationSession(user_id)
+        self._sessions[user_id] = session
+        self._sessions.move_to_end(user_id)
+        return session
+
+    def _evict(self):
+        """Drop idle sessions and the least recently used beyond max_sessions (caller holds the lock)"""
+        cutoff = time.time() - self.idle_ttl
+        for user_id in [uid for uid, s in self._sessions.items() if s.last_active < cutoff]:
+            del self._sessions[user_id]
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def get_history(self, user_id: str) -> str:
+        """Return the user's chat history formatted for the agent prompt"""
+        with self._lock:
+            session = self._get_session(user_id, create=False)
+            return session.render() if session else ""
+
+    def save_turn(self, user_id: str, human: str, ai: str):
+        """Append a completed exchange to the user's window"""
+        tokens = self.count_tokens(human) + self.count_tokens(ai)
+        with self._lock:
+            session = self._get_session(user_id, create=True)
+            session.add_turn(human, ai, tokens, self.max_tokens)
+            self._persist(session)
+            self._evict()
+
+    def clear(self, user_id: str):
+        """Forget a user's history in memory and on disk"""
+        with self._lock:
+            self._sessions.pop(user_id, None)
+            if self.persist_dir:
+                try:
+                    os.remove(self._session_path(user_id))
+                except FileNotFoundError:
+                    pass
+
+    def evict_idle(self) -> int:
+        """Evict idle sessions now, returning how many were dropped"""
+        with self._lock:
+            before = len(self._sessions)
+            self._evict()
+            return before - len(self._sessions)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
@@ -0,0 +1,161 @@
+"""
+Response Cache
+Caches agent answers by normalized query and scope (e.g. jurisdiction),
+with optional embedding-similarity matching for reworded questions.
+Entries are tied to the corpus version so a knowledge base rebuild
+invalidates every stale answer.
+"""
+
+import re
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .bm25 import tokenize
+
+# "t" is what is left of n't once punctuation is stripped
+_NEGATIONS = {"not", "no", "never", "without", "cannot", "nor", "none", "t"}
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace"""
+    return re.sub(r"\s+", " ", re.sub(r"[^\w\s]", " ", query.lower())).strip()
+
+
+def _stem(term: str) -> str:
+    for suffix in ("ing", "ed", "es", "s"):
+        if term.endswith(suffix) and len(term) - len(suffix) >= 3:
+            return term[:-len(suffix)]
+    return term
+
+
+def _content_terms(normalized: str) -> frozenset:
+    return frozenset(_stem(term) for term in tokenize(normalized) if term not in _NEGATIONS)
+
+
+def same_question(first: str, second: str) -> bool:
+    """Whether two normalized queries ask the same thing up to word order and inflection.
+
+    Embedding similarity alone cannot tell "labeling" from "testing" or
+    "must" from "must not", so a semantic match must also agree on every
+    content term and on negation.
+    """
+    negated = [bool(_NEGATIONS.intersection(query.split())) for query in (first, second)]
+    return negated[0] == negated[1] and _content_terms(first) == _content_terms(second)
+
+
+class ResponseCache:
+    """In-process LRU cache of agent responses"""
+
+    def __init__(self, ttl: float = 86400, max_entries: int = 5000, embeddings: Optional[Any] = None,
+                 similarity_threshold: float = 0.98):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.embeddings = embeddings
+        self.similarity_threshold = similarity_threshold
+        self.version: Optional[str] = None
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+        # Per scope: normalized queries and their unit-length query vectors
+        self._vectors: Dict[str, Tuple[List[str], Optional[np.ndarray]]] = {}
+        self._lock = threading.Lock()
+
+    def _check_version(self, version: str):
+        """Drop everything when the corpus version changes (caller holds the lock)"""
+        if version != self.version:
+            self._entries.clear()
+            self._vectors.clear()
+            self.version = version
+
+    def _embed(self, text: str) -> Optional[np.ndarray]:
+        if self.embeddings is None:
+            return None
+        try:
+            vector = np.asarray(self.embeddings.embed_query(text), dtype="float32")
+        except Exception as e:
+            print(f"Warning: Could not embed query for response cache: {e}")
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def _lookup(self, key: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry["stored_at"] > self.ttl:
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _remove(self, key: Tuple[str, str]):
+        self._entries.pop(key, None)
+        scope, normalized = key
+        queries, matrix = self._vectors.get(scope, ([], None))
+        if normalized in queries:
+            row = queries.index(normalized)
+            queries.pop(row)
+            matrix = np.delete(matrix, row, axis=0) if matrix is not None and len(queries) else None
+            self._vectors[scope] = (queries, matrix)
+
+    def get(self, query: str, scope: str, version: str) -> Optional[Dict[str, Any]]:
+        """Return a cached result for the query, or None"""
+        normalized = normalize_query(query)
+        with self._lock:
+            self._check_version(version)
+            entry = self._lookup((scope, normalized))
+            if entry is not None:
+                self.hits += 1
+                return entry["result"]
+            has_candidates = self._vectors.get(scope, ([], None))[1] is not None
+
+        # Paraphrase lookup: nearest cached query within the same scope
+        vector = self._embed(normalized) if has_candidates else None
+        with self._lock:
+            queries, matrix = self._vectors.get(scope, ([], None))
+            if vector is not None and matrix is not None and self.version == version:
+                similarities = matrix @ vector
+                for row in np.argsort(-similarities):
+                    if similarities[row] < self.similarity_threshold:
+                        break
+                    if not same_question(normalized, queries[row]):
+                        continue
+                    entry = self._lookup((scope, queries[row]))
+                    if entry is not None:
+                        self.hits += 1
+                        self.semantic_hits += 1
+                        return entry["result"]
+            self.misses += 1
+            return None
+
+    def put(self, query: str, scope: str, version: str, result: Dict[str, Any]):
+        """Store a result for the query"""
+        normalized = normalize_query(query)
+        vector = self._embed(normalized)
+        with self._lock:
+            self._check_version(version)
+            key = (scope, normalized)
+            self._remove(key)
+            self._entries[key] = {"result": result, "stored_at": time.time()}
+            if vector is not None:
+                queries, matrix = self._vectors.get(scope, ([], None))
+                matrix = vector[None, :] if matrix is None else np.vstack([matrix, vector])
+                self._vectors[scope] = (queries + [normalized], matrix)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "corpus_version": self.version
+        }
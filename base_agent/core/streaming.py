@@ -0,0 +1,63 @@
+"""
+Streaming Callbacks
+Turns LangChain callbacks into a queue of events (tool calls and answer
+tokens) that BaseAgent.astream_query yields to clients as they happen
+"""
+
+import asyncio
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackHandler
+
+# Markers after which a ReAct completion is the user-facing answer
+ANSWER_PREFIXES = ("AI:", "Final Answer:")
+
+
+class StreamingEventHandler(AsyncCallbackHandler):
+    """Queues tool events and the answer's tokens.
+
+    ReAct completions interleave reasoning ("Thought: ... Action: ...") with
+    the answer, so tokens of each LLM call are held back until an answer
+    prefix appears; everything after it is streamed.
+    """
+
+    def __init__(self, queue: "asyncio.Queue[Dict[str, Any]]",
+                 describe_tool: Optional[Callable[[str, str], str]] = None,
+                 answer_prefixes: tuple = ANSWER_PREFIXES):
+        self.queue = queue
+        self.describe_tool = describe_tool
+        self.answer_prefixes = answer_prefixes
+        self.streamed_answer = False
+        self._pending: List[str] = []
+        self._answering = False
+
+    async def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], **kwargs: Any) -> None:
+        self._pending = []
+        self._answering = False
+
+    async def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        if self._answering:
+            self._emit_token(token)
+            return
+        self._pending.append(token)
+        text = "".join(self._pending)
+        for prefix in self.answer_prefixes:
+            position = text.find(prefix)
+            if position != -1:
+                self._answering = True
+                self._pending = []
+                self._emit_token(text[position + len(prefix):].lstrip())
+                return
+
+    def _emit_token(self, text: str) -> None:
+        if text:
+            self.streamed_answer = True
+            self.queue.put_nowait({"type": "token", "text": text})
+
+    async def on_tool_start(self, serialized: Dict[str, Any], input_str: str, **kwargs: Any) -> None:
+        name = (serialized or {}).get("name", "tool")
+        message = self.describe_tool(name, input_str) if self.describe_tool else f"Using {name}"
+        self.queue.put_nowait({"type": "tool", "tool": name, "input": input_str, "message": message})
+
+    async def on_tool_end(self, output: Any, **kwargs: Any) -> None:
+        self.queue.put_nowait({"type": "tool_end", "output_chars": len(str(output))})
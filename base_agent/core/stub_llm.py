@@ -0,0 +1,140 @@
+"""
+Stub LLM
+Deterministic local stand-in for the remote model, for development and
+benchmarks. It speaks the conversational ReAct format the agent parses:
+it calls tools for a configured number of steps, then answers from the
+last observation, with configurable latency and completion length.
+"""
+
+import re
+import math
+import time
+import random
+import asyncio
+import hashlib
+from typing import Any, Dict, Iterator, List, Optional
+
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import LLMResult
+
+_TOOL_LIST = re.compile(r"should be one of \[([^\]]*)\]")
+_OBSERVATION = re.compile(r"Observation:(.*?)(?=\nThought:|\Z)", re.S)
+_WORD = re.compile(r"[A-Za-z][A-Za-z0-9.\-']*")
+
+# Keys of the llm.stub config section
+STUB_SETTINGS = ("tool_steps", "tool_sequence", "completion_tokens", "first_token_ms", "latency_jitter_ms",
+                 "latency_distribution", "token_delay_ms", "seed")
+
+
+class StubLLM(LLM):
+    """ReAct-speaking fake LLM whose output and timing depend only on the prompt and seed.
+
+    Latency is first_token_ms (drawn from latency_distribution: "fixed",
+    "normal" or "lognormal", spread by latency_jitter_ms) plus
+    token_delay_ms per streamed token. Usage is reported like a provider
+    would, at roughly four characters per prompt token.
+    """
+
+    tool_steps: int = 1
+    tool_sequence: List[str] = []
+    completion_tokens: int = 60
+    first_token_ms: float = 0.0
+    latency_jitter_ms: float = 0.0
+    latency_distribution: str = "fixed"
+    token_delay_ms: float = 0.0
+    seed: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"tool_steps": self.tool_steps, "completion_tokens": self.completion_tokens, "seed": self.seed}
+
+    def _rng(self, prompt: str) -> random.Random:
+        digest = hashlib.sha256(f"{self.seed}:{prompt}".encode("utf-8")).digest()
+        return random.Random(int.from_bytes(digest[:8], "little"))
+
+    def _first_token_delay(self, rng: random.Random) -> float:
+        """Seconds before the first token"""
+        mean, jitter = self.first_token_ms, self.latency_jitter_ms
+        if self.latency_distribution == "normal":
+            delay = rng.gauss(mean, jitter)
+        elif self.latency_distribution == "lognormal" and mean > 0:
+            # Mean and jitter describe the distribution itself, not its logarithm
+            sigma2 = math.log(1 + (jitter / mean) ** 2)
+            delay = rng.lognormvariate(math.log(mean) - sigma2 / 2, sigma2 ** 0.5)
+        else:
+            delay = mean
+        return max(delay, 0.0) / 1000
+
+    def _reply(self, prompt: str, rng: random.Random) -> str:
+        question, _, scratchpad = prompt.rpartition("New input:")[2].partition("\n")
+        question = question.strip()
+        observations = _OBSERVATION.findall(scratchpad)
+        tools_match = _TOOL_LIST.search(prompt)
+        tools = [t.strip() for t in tools_match.group(1).split(",") if t.strip()] if tools_match else []
+        sequence = [t for t in self.tool_sequence if t in tools] or tools
+
+        step = len(observations)
+        if sequence and step < self.tool_steps:
+            tool = sequence[step % len(sequence)]
+            return f"Thought: Do I need to use a tool? Yes\nAction: {tool}\nAction Input: {question}"
+        return f"Thought: Do I need to use a tool? No\nAI: {self._answer(question, observations, rng)}"
+
+    def _answer(self, question: str, observations: List[str], rng: random.Random) -> str:
+        """completion_tokens words drawn from the observations (or the question)"""
+        words = _WORD.findall(" ".join(observations)) or _WORD.findall(question) or ["compliance"]
+        body = [words[rng.randrange(len(words))] for _ in range(max(self.completion_tokens - 4, 1))]
+        return "Based on the regulations, " + " ".join(body) + "."
+
+    @staticmethod
+    def _tokens(text: str) -> Iterator[str]:
+        for match in re.finditer(r"\S+\s*|\s+", text):
+            yield match.group(0)
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> str:
+        rng = self._rng(prompt)
+        text = self._reply(prompt, rng)
+        time.sleep(self._first_token_delay(rng))
+        for token in self._tokens(text):
+            if self.token_delay_ms:
+                time.sleep(self.token_delay_ms / 1000)
+            if run_manager is not None:
+                run_manager.on_llm_new_token(token)
+        return text
+
+    async def _acall(self, prompt: str, stop: Optional[List[str]] = None, run_manager: Any = None,
+                     **kwargs: Any) -> str:
+        rng = self._rng(prompt)
+        text = self._reply(prompt, rng)
+        await asyncio.sleep(self._first_token_delay(rng))
+        for token in self._tokens(text):
+            if self.token_delay_ms:
+                await asyncio.sleep(self.token_delay_ms / 1000)
+            if run_manager is not None:
+                await run_manager.on_llm_new_token(token)
+        return text
+
+    def _usage(self, prompts: List[str], result: LLMResult) -> LLMResult:
+        completions = [g.text for generations in result.generations for g in generations]
+        result.llm_output = {"token_usage": {
+            "prompt_tokens": sum(len(p) // 4 for p in prompts),
+            "completion_tokens": sum(sum(1 for _ in self._tokens(c)) for c in completions)
+        }}
+        return result
+
+    def _generate(self, prompts: List[str], stop: Optional[List[str]] = None, run_manager: Any = None,
+                  **kwargs: Any) -> LLMResult:
+        return self._usage(prompts, super()._generate(prompts, stop=stop, run_manager=run_manager, **kwargs))
+
+    async def _agenerate(self, prompts: List[str], stop: Optional[List[str]] = None, run_manager: Any = None,
+                         **kwargs: Any) -> LLMResult:
+        result = await super()._agenerate(prompts, stop=stop, run_manager=run_manager, **kwargs)
+        return self._usage(prompts, result)
+
+
+def stub_llm_from_config(config: Dict[str, Any]) -> StubLLM:
+    """Build a StubLLM from the llm.stub section of agent_config.yaml"""
+    return StubLLM(**{key: value for key, value in (config or {}).items() if key in STUB_SETTINGS})
@@ -0,0 +1,94 @@
+"""
+Tracing Callbacks
+Records LangChain LLM round trips (with prompt and completion token
+counts), tool calls and ReAct iterations as spans on a request's Trace
+"""
+
+import time
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from .tracing import TOKEN_BUCKETS, Trace
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """Turns callback start/end pairs into spans on a trace.
+
+    Token counts come from the provider's usage report when there is one;
+    otherwise they are counted with count_tokens and marked as estimated.
+    """
+
+    def __init__(self, trace: Trace, count_tokens: Optional[Callable[[str], int]] = None):
+        self.trace = trace
+        self.count_tokens = count_tokens
+        self.iterations = 0
+        self._started: Dict[UUID, Tuple[float, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id: UUID, **attributes: Any) -> None:
+        with self._lock:
+            self._started[run_id] = (time.perf_counter(), attributes)
+
+    def _end(self, run_id: UUID, name: str, **attributes: Any) -> None:
+        with self._lock:
+            started = self._started.pop(run_id, None)
+        if started is not None:
+            start, start_attributes = started
+            self.trace.record(name, start, time.perf_counter(), **start_attributes, **attributes)
+
+    def _count(self, texts: List[str]) -> Optional[int]:
+        if self.count_tokens is None:
+            return None
+        return sum(self.count_tokens(text) for text in texts)
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id, prompts=prompts)
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[Any]], *, run_id: UUID,
+                            **kwargs: Any) -> None:
+        self._start(run_id, prompts=[str(getattr(m, "content", m)) for batch in messages for m in batch])
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            started = self._started.pop(run_id, None)
+        if started is None:
+            return
+        start, attributes = started
+        prompts = attributes.pop("prompts", [])
+        completions = [g.text for generations in response.generations for g in generations]
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt_tokens = usage.get("prompt_tokens")
+        completion_tokens = usage.get("completion_tokens")
+        if prompt_tokens is None or completion_tokens is None:
+            prompt_tokens, completion_tokens = self._count(prompts), self._count(completions)
+            attributes["estimated_tokens"] = True
+        self.trace.record("llm", start, time.perf_counter(), prompt_tokens=prompt_tokens,
+                          completion_tokens=completion_tokens, **attributes)
+        registry = self.trace.registry
+        for kind, tokens in (("prompt", prompt_tokens), ("completion", completion_tokens)):
+            if tokens is not None:
+                registry.observe("llm_tokens", tokens, buckets=TOKEN_BUCKETS, kind=kind)
+                registry.increment("llm_tokens_total", tokens, kind=kind)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            started = self._started.pop(run_id, None)
+        if started is not None:
+            self.trace.record("llm", started[0], time.perf_counter(), error=True)
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID, **kwargs: Any) -> None:
+        tool = (serialized or {}).get("name", "tool")
+        self.trace.registry.increment("tool_calls_total", tool=tool)
+        self._start(run_id, tool=tool, input=input_str)
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, "tool", output_chars=len(str(output)))
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, "tool", error=True)
+
+    def on_agent_action(self, action: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self.iterations += 1
@@ -0,0 +1,373 @@
+"""
+Tracing and Latency Metrics
+Per-request traces made of timed spans (cache lookup, retrieval, tool
+calls, LLM round trips, the agent loop) that also feed in-process
+histograms, exported with p50/p95/p99 summaries and in the Prometheus
+text format. Metrics are recorded per process; under gunicorn each worker
+also writes its registry to a shared directory and a scrape of any worker
+merges every file, so counters never jump between workers.
+"""
+
+import os
+import json
+import time
+import uuid
+import bisect
+import tempfile
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Upper bounds in seconds, from a FAISS lookup up to a slow multi-step answer
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+ITERATION_BUCKETS = (1, 2, 3, 4, 5, 6, 8, 10, 15)
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Span attributes that become metric labels; all others stay on the trace only
+METRIC_LABELS = ("tool",)
+
+
+class Histogram:
+    """Cumulative-bucket histogram with quantiles interpolated within buckets"""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        # One count per bucket plus the overflow (+Inf) bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for i, n in enumerate(self.counts):
+            if n and cumulative + n >= rank:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(lower + (upper - lower) * (rank - cumulative) / n, self.max)
+            cumulative += n
+        return self.max
+
+    def merge(self, other: "Histogram") -> None:
+        """Add another histogram with the same buckets into this one"""
+        if other.buckets != self.buckets:
+            raise ValueError("Cannot merge histograms with different buckets")
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"buckets": list(self.buckets), "counts": self.counts, "count": self.count, "sum": self.sum,
+                "max": self.max}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Histogram":
+        histogram = cls(data["buckets"])
+        histogram.counts = list(data["counts"])
+        histogram.count, histogram.sum, histogram.max = data["count"], data["sum"], data["max"]
+        return histogram
+
+    def summary(self) -> Dict[str, float]:
+        summary = {"count": self.count, "mean": round(self.sum / self.count, 4) if self.count else 0.0,
+                   "max": round(self.max, 4)}
+        for q in QUANTILES:
+            summary[f"p{int(q * 100)}"] = round(self.quantile(q), 4)
+        return summary
+
+
+def _label_key(labels: Dict[str, Any]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+
+class MetricsRegistry:
+    """Thread-safe named histograms and counters, keyed by label set"""
+
+    def __init__(self, prefix: str = "agent_"):
+        self.prefix = prefix
+        self._histograms: Dict[str, Dict[Tuple[Tuple[str, str], ...], Histogram]] = {}
+        self._counters: Dict[str, Dict[Tuple[Tuple[str, str], ...], float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, value: float, buckets: Sequence[float] = LATENCY_BUCKETS, **labels: Any) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def increment(self, name: str, value: float = 1.0, **labels: Any) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serializable copy of every series, for merging in another process"""
+        with self._lock:
+            return {
+                "histograms": {
+                    name: [{"labels": list(key), **histogram.to_dict()} for key, histogram in series.items()]
+                    for name, series in self._histograms.items()
+                },
+                "counters": {
+                    name: [{"labels": list(key), "value": value} for key, value in series.items()]
+                    for name, series in self._counters.items()
+                }
+            }
+
+    def merge(self, data: Dict[str, Any]) -> None:
+        """Add series from to_dict() output into this registry"""
+        with self._lock:
+            for name, entries in data.get("histograms", {}).items():
+                series = self._histograms.setdefault(name, {})
+                for entry in entries:
+                    key = tuple(tuple(pair) for pair in entry["labels"])
+                    incoming = Histogram.from_dict(entry)
+                    if key in series:
+                        series[key].merge(incoming)
+                    else:
+                        series[key] = incoming
+            for name, entries in data.get("counters", {}).items():
+                series = self._counters.setdefault(name, {})
+                for entry in entries:
+                    key = tuple(tuple(pair) for pair in entry["labels"])
+                    series[key] = series.get(key, 0.0) + entry["value"]
+
+    def summary(self) -> Dict[str, Any]:
+        """Histogram percentiles and counter totals, for JSON endpoints"""
+        with self._lock:
+            histograms = {
+                name: {_format_labels(key) or "all": histogram.summary() for key, histogram in series.items()}
+                for name, series in self._histograms.items()
+            }
+            counters = {
+                name: {_format_labels(key) or "all": value for key, value in series.items()}
+                for name, series in self._counters.items()
+            }
+        return {"histograms": histograms, "counters": counters}
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition: histograms, their quantiles and counters"""
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self._histograms.items()):
+                metric = f"{self.prefix}{name}"
+                lines.append(f"# TYPE {metric} histogram")
+                for key, histogram in series.items():
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else repr(float(bound))
+                        lines.append(f"{metric}_bucket{_format_labels(key, ('le', le))} {cumulative}")
+                    lines.append(f"{metric}_sum{_format_labels(key)} {histogram.sum}")
+                    lines.append(f"{metric}_count{_format_labels(key)} {histogram.count}")
+                lines.append(f"# TYPE {metric}_quantile gauge")
+                for key, histogram in series.items():
+                    for q in QUANTILES:
+                        lines.append(f"{metric}_quantile{_format_labels(key, ('quantile', str(q)))} "
+                                     f"{histogram.quantile(q)}")
+            for name, series in sorted(self._counters.items()):
+                metric = f"{self.prefix}{name}"
+                lines.append(f"# TYPE {metric} counter")
+                for key, value in series.items():
+                    lines.append(f"{metric}{_format_labels(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry every trace and span reports into
+METRICS = MetricsRegistry()
+
+PROCESS_METRICS_PREFIX = "metrics_"
+
+
+def write_process_metrics(directory: str, registry: MetricsRegistry = METRICS,
+                          gauges: Optional[Dict[str, float]] = None) -> None:
+    """Atomically write this process's registry and current gauges to directory/metrics_<pid>.json.
+
+    Files of exited processes are kept so their counts stay in the totals;
+    pass gauges=None on exit so a stopped worker's gauges are dropped.
+    """
+    os.makedirs(directory, exist_ok=True)
+    data = {"pid": os.getpid(), "metrics": registry.to_dict(), "gauges": gauges}
+    fd, tmp_path = tempfile.mkstemp(prefix=".metrics.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, os.path.join(directory, f"{PROCESS_METRICS_PREFIX}{os.getpid()}.json"))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def aggregate_process_metrics(directory: str,
+                              prefix: str = "agent_") -> Tuple[MetricsRegistry, Dict[int, Dict[str, float]]]:
+    """Merge every process file in directory; gauges are returned per pid, for live processes only"""
+    registry = MetricsRegistry(prefix)
+    gauges: Dict[int, Dict[str, float]] = {}
+    try:
+        names = sorted(os.listdir(directory))
+    except FileNotFoundError:
+        return registry, gauges
+    for name in names:
+        if not (name.startswith(PROCESS_METRICS_PREFIX) and name.endswith(".json")):
+            continue
+        try:
+            with open(os.path.join(directory, name), "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        registry.merge(data.get("metrics") or {})
+        if data.get("gauges") is not None and _process_alive(data["pid"]):
+            gauges[data["pid"]] = data["gauges"]
+    return registry, gauges
+
+_current_trace: "contextvars.ContextVar[Optional[Trace]]" = contextvars.ContextVar("current_trace", default=None)
+
+
+class Trace:
+    """Timed spans of one request; durations also go to the registry.
+
+    Spans are recorded from whichever thread runs the stage (tool calls
+    may run in an executor), so recording is locked.
+    """
+
+    def __init__(self, name: str, registry: MetricsRegistry = METRICS, **attributes: Any):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.registry = registry
+        self.attributes: Dict[str, Any] = dict(attributes)
+        self.started_at = time.time()
+        self.duration: Optional[float] = None
+        self.spans: List[Dict[str, Any]] = []
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def record(self, name: str, start: float, end: float, **attributes: Any) -> None:
+        """Add a span from perf_counter() timestamps"""
+        duration = end - start
+        span = {
+            "name": name,
+            "start_ms": round((start - self._origin) * 1000, 3),
+            "duration_ms": round(duration * 1000, 3),
+            **attributes
+        }
+        with self._lock:
+            self.spans.append(span)
+        _observe_stage(self.registry, name, duration, attributes)
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Dict[str, Any]]:
+        """Time a block; the yielded dict collects attributes set inside it"""
+        start = time.perf_counter()
+        try:
+            yield attributes
+        except BaseException:
+            attributes["error"] = True
+            raise
+        finally:
+            self.record(name, start, time.perf_counter(), **attributes)
+
+    @contextmanager
+    def active(self) -> Iterator["Trace"]:
+        """Make this the trace module-level span() records into"""
+        token = _current_trace.set(self)
+        try:
+            yield self
+        finally:
+            _current_trace.reset(token)
+
+    def finish(self, outcome: str) -> float:
+        """Record the whole request's duration under its outcome"""
+        self.duration = time.perf_counter() - self._origin
+        self.attributes["outcome"] = outcome
+        self.registry.observe("request_duration_seconds", self.duration, outcome=outcome)
+        self.registry.increment("requests_total", outcome=outcome)
+        return self.duration
+
+    def stage_totals(self) -> Dict[str, float]:
+        """Milliseconds spent per span name"""
+        totals: Dict[str, float] = {}
+        with self._lock:
+            for span in self.spans:
+                totals[span["name"]] = round(totals.get(span["name"], 0.0) + span["duration_ms"], 3)
+        return totals
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span["start_ms"])
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "attributes": self.attributes,
+            "spans": spans
+        }
+
+    def dump(self, directory: str) -> str:
+        """Write the trace as JSON into directory and return the path"""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime(self.started_at))}"
+                                       f"-{self.trace_id}.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2, default=str)
+        os.replace(tmp_path, path)
+        return path
+
+
+def _observe_stage(registry: MetricsRegistry, name: str, duration: float, attributes: Dict[str, Any]) -> None:
+    labels = {key: attributes[key] for key in METRIC_LABELS if key in attributes}
+    registry.observe("stage_duration_seconds", duration, stage=name, **labels)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Dict[str, Any]]:
+    """Time a block into the active trace, or only into the registry if none"""
+    trace = _current_trace.get()
+    if trace is not None:
+        with trace.span(name, **attributes) as span_attributes:
+            yield span_attributes
+        return
+    start = time.perf_counter()
+    try:
+        yield attributes
+    finally:
+        _observe_stage(METRICS, name, time.perf_counter() - start, attributes)
@@ -0,0 +1,300 @@
+"""
+FAISS Vector Store
+Persistent vector index with stable integer ids for incremental updates,
+published as versioned snapshots that readers memory-map and hot reload.
+Snapshots also carry a BM25 index; retrieval fuses both rankings.
+Snapshots are partitioned into per-jurisdiction shards so a query only
+searches the states it mentions plus the general shard.
+"""
+
+import os
+import json
+import heapq
+import shutil
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from .bm25 import BM25_DIRNAME, BM25Index, collection_stats, reciprocal_rank_fusion
+from .corpus_store import ColumnarCorpus
+from .tracing import span
+
+
+# Read-only, zero-copy view of the file's vectors
+MMAP_FLAGS = faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY
+
+
+class FaissVectorStore:
+    """Inner-product FAISS index over normalized vectors, addressable by id"""
+
+    def __init__(self, index: Optional["faiss.Index"] = None, dimension: Optional[int] = None):
+        if index is None and dimension is not None:
+            index = faiss.IndexIDMap2(faiss.IndexFlatIP(dimension))
+        self.index = index
+
+    @property
+    def dimension(self) -> Optional[int]:
+        return self.index.d if self.index is not None else None
+
+    def __len__(self) -> int:
+        return self.index.ntotal if self.index is not None else 0
+
+    @staticmethod
+    def _as_matrix(vectors) -> np.ndarray:
+        matrix = np.ascontiguousarray(np.asarray(vectors, dtype="float32"))
+        if matrix.ndim == 1:
+            matrix = matrix.reshape(1, -1)
+        faiss.normalize_L2(matrix)
+        return matrix
+
+    def add(self, ids: List[int], vectors) -> None:
+        """Add vectors under the given ids"""
+        if not ids:
+            return
+        matrix = self._as_matrix(vectors)
+        if self.index is None:
+            self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(matrix.shape[1]))
+        self.index.add_with_ids(matrix, np.asarray(ids, dtype="int64"))
+
+    def ids(self) -> List[int]:
+        """Ids of every stored vector"""
+        if self.index is None or not len(self):
+            return []
+        return faiss.vector_to_array(self.index.id_map).tolist()
+
+    def remove(self, ids: List[int]) -> int:
+        """Remove vectors by id, returning how many were deleted"""
+        if not ids or self.index is None:
+            return 0
+        return self.index.remove_ids(np.asarray(ids, dtype="int64"))
+
+    def search(self, vector, k: int = 4) -> List[Tuple[int, float]]:
+        """Return up to k (id, score) pairs, best first"""
+        if not len(self):
+            return []
+        scores, ids = self.index.search(self._as_matrix(vector), min(k, len(self)))
+        return [(int(i), float(s)) for i, s in zip(ids[0], scores[0]) if i != -1]
+
+    def subset(self, ids: List[int]) -> "FaissVectorStore":
+        """Copy the vectors for ids into a new store with the same ids"""
+        store = FaissVectorStore(dimension=self.dimension)
+        if ids:
+            keys = np.asarray(ids, dtype="int64")
+            store.index.add_with_ids(self.index.reconstruct_batch(keys), keys)
+        return store
+
+    def save(self, path: str) -> None:
+        """Write the index atomically so readers never see a partial file"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        faiss.write_index(self.index, tmp_path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = False) -> "FaissVectorStore":
+        """Load an index; with mmap the vectors stay in the shared page cache.
+
+        IO_FLAG_MMAP only maps IVF inverted lists; IO_FLAG_MMAP_IFC maps the
+        flat codes of IndexIDMap2(IndexFlatIP) too, so workers share them.
+        """
+        if mmap:
+            return cls(faiss.read_index(path, MMAP_FLAGS))
+        return cls(faiss.read_index(path))
+
+
+CURRENT_POINTER = "CURRENT"
+INDEX_FILENAME = "index.faiss"
+DOCSTORE_DIRNAME = "docstore"
+# Snapshots published before the columnar docstore
+LEGACY_DOCSTORE_FILENAME = "docstore.jsonl"
+SHARDS_DIRNAME = "shards"
+GENERAL_SHARD = "GENERAL"
+
+
+def shard_key(record: Dict[str, Any]) -> str:
+    """Shard a corpus record belongs to: its state code, or the general shard"""
+    return str(record.get("state") or GENERAL_SHARD).upper()
+
+
+def merge_by_score(result_lists: List[List[Tuple[int, float]]], k: int) -> List[Tuple[int, float]]:
+    """Merge per-shard (id, score) lists into the overall top k"""
+    return heapq.nlargest(k, (hit for hits in result_lists for hit in hits), key=lambda hit: hit[1])
+
+
+def current_version(index_dir: str) -> Optional[str]:
+    """Return the published snapshot version, if any"""
+    try:
+        with open(os.path.join(index_dir, CURRENT_POINTER), "r") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def publish_version(index_dir: str, version: str, keep: int = 2) -> None:
+    """Atomically point readers at a snapshot directory and prune old ones.
+
+    Processes that still have an older snapshot mapped keep working: unlinked
+    files stay readable until their last mapping goes away.
+    """
+    pointer = os.path.join(index_dir, CURRENT_POINTER)
+    tmp_pointer = f"{pointer}.tmp"
+    with open(tmp_pointer, "w") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_pointer, pointer)
+
+    versions = sorted(
+        name for name in os.listdir(index_dir)
+        if os.path.isdir(os.path.join(index_dir, name)) and name != version
+    )
+    for name in versions[:max(0, len(versions) - (keep - 1))]:
+        shutil.rmtree(os.path.join(index_dir, name), ignore_errors=True)
+
+
+class IndexShard:
+    """Vectors and postings for one jurisdiction"""
+
+    def __init__(self, directory: str):
+        self.store = FaissVectorStore.load(os.path.join(directory, INDEX_FILENAME), mmap=True)
+        # Snapshots published before BM25 support have no lexical index
+        bm25_dir = os.path.join(directory, BM25_DIRNAME)
+        self.lexical: Optional[BM25Index] = BM25Index.load(bm25_dir) if os.path.isdir(bm25_dir) else None
+
+
+class IndexSnapshot:
+    """One published index version: memory-mapped shards plus their documents"""
+
+    def __init__(self, index_dir: str, version: str):
+        self.version = version
+        snapshot_dir = os.path.join(index_dir, version)
+        shards_dir = os.path.join(snapshot_dir, SHARDS_DIRNAME)
+        self.shards: Dict[str, IndexShard] = {}
+        if os.path.isdir(shards_dir):
+            for key in sorted(os.listdir(shards_dir)):
+                self.shards[key] = IndexShard(os.path.join(shards_dir, key))
+        else:
+            # Unsharded snapshot: the whole index acts as the general shard
+            self.shards[GENERAL_SHARD] = IndexShard(snapshot_dir)
+        # Memory-mapped; records are only materialized when a search returns them
+        docstore_dir = os.path.join(snapshot_dir, DOCSTORE_DIRNAME)
+        if os.path.isdir(docstore_dir):
+            self.documents: Any = ColumnarCorpus(docstore_dir)
+        else:
+            self.documents = {}
+            with open(os.path.join(snapshot_dir, LEGACY_DOCSTORE_FILENAME), "r") as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        self.documents[record["id"]] = record
+
+        # Every shard's postings, so BM25 statistics are global rather than per shard
+        self.lexical_indexes = [shard.lexical for shard in self.shards.values() if shard.lexical is not None]
+
+    def __len__(self) -> int:
+        return sum(len(shard.store) for shard in self.shards.values())
+
+    def route(self, jurisdictions: List[str]) -> List[IndexShard]:
+        """Shards for the given jurisdictions plus general; all shards if none match"""
+        keys = [key for key in jurisdictions if key in self.shards]
+        if not keys:
+            return list(self.shards.values())
+        if GENERAL_SHARD in self.shards and GENERAL_SHARD not in keys:
+            keys.append(GENERAL_SHARD)
+        return [self.shards[key] for key in keys]
+
+
+class HotReloadRetriever:
+    """Retriever over the published FAISS snapshot that swaps in new versions live"""
+
+    def __init__(self, index_dir: str, embeddings: Any, k: int = 4, check_interval: float = 5.0,
+                 hybrid: bool = True, candidates: int = 20, rrf_k: int = 60,
+                 router: Optional[Callable[[str], List[str]]] = None):
+        self.index_dir = index_dir
+        self.embeddings = embeddings
+        self.k = k
+        self.check_interval = check_interval
+        self.hybrid = hybrid
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+        # Maps a query to the jurisdictions (shard keys) it concerns
+        self.router = router
+        self.snapshot: Optional[IndexSnapshot] = None
+        self._last_check = 0.0
+        self._reload_lock = threading.Lock()
+        self.reload()
+
+    def reload(self) -> bool:
+        """Load the published version if it differs from the one in use"""
+        with self._reload_lock:
+            self._last_check = time.monotonic()
+            version = current_version(self.index_dir)
+            if version is None or (self.snapshot and self.snapshot.version == version):
+                return False
+            try:
+                snapshot = IndexSnapshot(self.index_dir, version)
+            except Exception as e:
+                print(f"Warning: Could not load index version {version}: {e}")
+                return False
+            # Single reference swap; in-flight queries finish on the old snapshot
+            self.snapshot = snapshot
+            print(f"Loaded index version {version} ({len(snapshot)} vectors in {len(snapshot.shards)} shards)")
+            return True
+
+    def _maybe_reload(self) -> None:
+        if time.monotonic() - self._last_check >= self.check_interval:
+            self.reload()
+
+    def search(self, query: str, k: Optional[int] = None) -> List[Tuple[Dict[str, Any], float]]:
+        """Return (record, score) pairs for the query, best first.
+
+        Only the shards for jurisdictions the router finds in the query are
+        searched; otherwise every shard is, with results merged by score. BM25
+        scores every shard against the whole snapshot's statistics so shard
+        scores are comparable. In hybrid mode the dense and BM25 candidate
+        lists are merged with reciprocal rank fusion and the score is the
+        fused score.
+        """
+        with span("retrieval"):
+            return self._search(query, k)
+
+    def _search(self, query: str, k: Optional[int]) -> List[Tuple[Dict[str, Any], float]]:
+        self._maybe_reload()
+        snapshot = self.snapshot
+        if snapshot is None:
+            return []
+        k = k or self.k
+        shards = snapshot.route(self.router(query) if self.router else [])
+        with span("retrieval.embed"):
+            vector = self.embeddings.embed_query(query)
+        lexical_shards = [shard for shard in shards if shard.lexical is not None]
+        if not self.hybrid or not lexical_shards:
+            with span("retrieval.dense", shards=len(shards)):
+                hits = merge_by_score([shard.store.search(vector, k) for shard in shards], k)
+        else:
+            depth = max(k, self.candidates)
+            with span("retrieval.dense", shards=len(shards)):
+                dense = merge_by_score([shard.store.search(vector, depth) for shard in shards], depth)
+            with span("retrieval.lexical", shards=len(lexical_shards)):
+                stats = collection_stats(snapshot.lexical_indexes, query)
+                lexical = merge_by_score(
+                    [shard.lexical.search(query, depth, stats) for shard in lexical_shards], depth
+                )
+            hits = reciprocal_rank_fusion([[i for i, _ in dense], [i for i, _ in lexical]], k=self.rrf_k)[:k]
+        with span("retrieval.fetch", hits=len(hits)):
+            return [(snapshot.documents[i], score) for i, score in hits if i in snapshot.documents]
+
+    def get_relevant_documents(self, query: str) -> List[Any]:
+        """LangChain-style retrieval returning Document objects"""
+        from langchain.schema import Document
+
+        return [
+            Document(
+                page_content=record["text"],
+                metadata={key: value for key, value in record.items() if key != "text"} | {"score": score}
+            )
+            for record, score in self.search(query)
+        ]
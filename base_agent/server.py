@@ -1,24 +1,264 @@
 
 """
 Base Agent Web Server
-Provides dashboard and API endpoints for agent monitoring
+Provides dashboard and API endpoints for agent monitoring, plus query
+endpoints that run the agent on a background event loop with timeouts
+and backpressure. In production it is served by gunicorn (see wsgi.py).
 """
 
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, Response, abort, jsonify, make_response, render_template, request, stream_with_context
+import asyncio
+import concurrent.futures
+import hashlib
 import json
 import os
+import queue
+import threading
+import time
 from datetime import datetime
-from typing import Dict, Any
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from core.tracing import METRICS, aggregate_process_metrics, write_process_metrics
+
+class QueryRunner:
+    """Background asyncio loop that runs agent coroutines for the server's request threads"""
+    
+    def __init__(self, max_in_flight: int = 64):
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.accepting = True
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+    
+    def start(self):
+        """Start the loop thread (once per worker process, after any fork)"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self.loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self.loop.run_forever, name="agent-loop", daemon=True)
+            self._thread.start()
+    
+    def try_submit(self, coroutine_factory: Callable[[], Any]) -> Optional[concurrent.futures.Future]:
+        """Schedule a coroutine, or return None when at capacity or shutting down"""
+        self.start()
+        with self._lock:
+            if not self.accepting or self.in_flight >= self.max_in_flight:
+                self.rejected += 1
+                return None
+            self.in_flight += 1
+        future = asyncio.run_coroutine_threadsafe(coroutine_factory(), self.loop)
+        # The slot is held until the coroutine really finishes, even after a timeout
+        future.add_done_callback(self._release)
+        return future
+    
+    def _release(self, _future: concurrent.futures.Future):
+        with self._lock:
+            self.in_flight -= 1
+            self._idle.notify_all()
+    
+    def shutdown(self, timeout: float = 30.0):
+        """Stop accepting queries, let in-flight ones finish, then stop the loop"""
+        with self._lock:
+            self.accepting = False
+            self._idle.wait_for(lambda: self.in_flight == 0, timeout=timeout)
+        if self.loop is not None and self._thread is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout=5)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'in_flight': self.in_flight,
+            'max_in_flight': self.max_in_flight,
+            'rejected': self.rejected,
+            'timeouts': self.timeouts
+        }
+
+class CachedJSONFile:
+    """A JSON file parsed once and re-read only when its mtime or size changes.
+
+    ``prepare`` derives the served payload from the parsed file (e.g. adds
+    pre-aggregated breakdowns); the payload's serialized body and ETag are
+    cached alongside it. The file is stat-ed at most every check_interval.
+    """
+    
+    def __init__(self, paths: List[str], prepare: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None,
+                 check_interval: float = 1.0):
+        self.paths = paths
+        self.prepare = prepare
+        self.check_interval = check_interval
+        self.payload: Dict[str, Any] = {}
+        self.body = b'{}'
+        self.etag = hashlib.sha1(self.body).hexdigest()
+        self.mtime: Optional[float] = None
+        self._signature: Optional[Tuple[str, int, int]] = None
+        self._loaded = False
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+    
+    def _stat(self) -> Optional[Tuple[str, int, int]]:
+        for path in self.paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            return path, stat.st_mtime_ns, stat.st_size
+        return None
+    
+    def _load(self, signature: Optional[Tuple[str, int, int]]):
+        payload: Dict[str, Any] = {}
+        if signature is not None:
+            try:
+                with open(signature[0], 'r') as f:
+                    payload = json.load(f)
+            except Exception as e:
+                # Keep serving the last good copy (e.g. a file caught mid-write)
+                print(f"Error loading {signature[0]}: {e}")
+                return
+        if self.prepare is not None:
+            payload = self.prepare(payload)
+        self.payload = payload
+        self.body = json.dumps(payload).encode('utf-8')
+        self.etag = hashlib.sha1(self.body).hexdigest()
+        self.mtime = signature[1] / 1e9 if signature else None
+        self._signature = signature
+    
+    def refresh(self, force: bool = False) -> bool:
+        """Reload if the file changed; True if the payload was replaced"""
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.check_interval:
+            return False
+        with self._lock:
+            self._checked_at = now
+            signature = self._stat()
+            if not force and self._loaded and signature == self._signature:
+                return False
+            previous = self.etag
+            self._load(signature)
+            self._loaded = True
+            return self.etag != previous
+    
+    def get(self) -> Dict[str, Any]:
+        self.refresh()
+        return self.payload
+
+
+def summarize_baseline(results: List[Dict[str, Any]], questions: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Totals plus per-category and per-difficulty breakdowns of baseline results"""
+    def aggregate(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+        total = len(rows)
+        passed = sum(1 for r in rows if r.get('passed', False))
+        return {
+            'total_tests': total,
+            'passed_tests': passed,
+            'pass_rate': round(passed / total * 100, 1) if total else 0,
+            'average_score': round(sum(r.get('score', 0) for r in rows) / total, 1) if total else 0,
+            'average_response_time': round(sum(r.get('response_time', 0) for r in rows) / total, 2) if total else 0
+        }
+    
+    groups: Dict[str, Dict[str, List[Dict[str, Any]]]] = {'by_category': {}, 'by_difficulty': {}}
+    for result in results:
+        question = questions.get(result.get('id') or result.get('question_id'), {})
+        groups['by_category'].setdefault(question.get('category', 'general'), []).append(result)
+        groups['by_difficulty'].setdefault(question.get('difficulty', 'unknown'), []).append(result)
+    
+    summary = aggregate(results)
+    for breakdown, rows_by_key in groups.items():
+        summary[breakdown] = {key: aggregate(rows) for key, rows in sorted(rows_by_key.items())}
+    return summary
+
 
 class AgentServer:
-    def __init__(self, agent_name: str = "base-agent", port: int = 5000):
+    def __init__(self, agent_name: str = "base-agent", port: int = 5000, agent=None,
+                 agent_factory: Optional[Callable[[], Any]] = None, max_in_flight: int = 64,
+                 query_timeout: float = 60.0, metrics_dir: Optional[str] = None,
+                 metrics_flush_interval: float = 5.0, metrics_cache_ttl: float = 2.0):
         self.app = Flask(__name__, 
                         template_folder='templates',
                         static_folder='static')
         self.agent_name = agent_name
+        self.agent = agent
+        # Builds the agent on first use, so each worker process gets its own
+        self.agent_factory = agent_factory
         self.port = port
+        self.query_timeout = query_timeout
+        self.runner = QueryRunner(max_in_flight)
+        # Shared by every worker of a multi-process server; /metrics merges all of them
+        self.metrics_dir = metrics_dir
+        self.metrics_flush_interval = metrics_flush_interval
+        self._metrics_stop = threading.Event()
+        self._metrics_thread: Optional[threading.Thread] = None
+        # Merged worker metrics, re-read from metrics_dir at most every metrics_cache_ttl
+        self.metrics_cache_ttl = metrics_cache_ttl
+        self._collected: Optional[Tuple[float, Tuple[Any, Dict[Optional[int], Dict[str, float]]]]] = None
+        self._collected_lock = threading.Lock()
+        self._agent_lock = threading.Lock()
+        self.baseline_questions = CachedJSONFile(['baseline.json', os.path.join('..', 'baseline.json')])
+        self.baseline_results = CachedJSONFile(['baseline_results.json', os.path.join('..', 'baseline_results.json')])
+        # Payloads derived from both files, keyed by the ETags they were built from
+        self._derived: Dict[str, Tuple[Tuple[str, str], Dict[str, Any], bytes, str]] = {}
+        self._derived_lock = threading.RLock()
         self.setup_routes()
     
+    def get_agent(self) -> Any:
+        """The agent shared by every request in this process"""
+        if self.agent is None and self.agent_factory is not None:
+            with self._agent_lock:
+                if self.agent is None:
+                    self.agent = self.agent_factory()
+        return self.agent
+    
+    def start(self):
+        """Build and warm the agent and start the query loop (e.g. in a gunicorn post_worker_init hook)"""
+        agent = self.get_agent()
+        if agent is not None and hasattr(agent, 'warm_up'):
+            agent.warm_up()
+        self.runner.start()
+        if self.metrics_dir and self._metrics_thread is None:
+            # Written before serving so this worker is in the first merged view
+            self._write_metrics()
+            self._metrics_thread = threading.Thread(target=self._flush_metrics_periodically,
+                                                    name='metrics-flush', daemon=True)
+            self._metrics_thread.start()
+    
+    def shutdown(self, timeout: float = 30.0):
+        """Drain in-flight queries and release the agent's resources"""
+        self.runner.shutdown(timeout)
+        if self.metrics_dir:
+            self._metrics_stop.set()
+            # Final counts stay in the totals; gauges of a stopped worker do not
+            write_process_metrics(self.metrics_dir, METRICS, gauges=None)
+        if self.agent is not None and hasattr(self.agent, 'close'):
+            self.agent.close()
+    
+    def _write_metrics(self):
+        try:
+            write_process_metrics(self.metrics_dir, METRICS, self.process_gauges())
+        except OSError as e:
+            print(f"Warning: Could not write metrics to {self.metrics_dir}: {e}")
+    
+    def _flush_metrics_periodically(self):
+        while not self._metrics_stop.wait(self.metrics_flush_interval):
+            self._write_metrics()
+    
+    def collected_metrics(self) -> Tuple[Any, Dict[Optional[int], Dict[str, float]]]:
+        """(registry, gauges by pid): every worker's when metrics_dir is set, else this process's.
+
+        Worker files are merged at most every metrics_cache_ttl; requests
+        never write them, so figures lag by up to the flush interval.
+        """
+        if not self.metrics_dir:
+            return METRICS, {None: self.process_gauges()}
+        with self._collected_lock:
+            now = time.monotonic()
+            if self._collected is None or now - self._collected[0] >= self.metrics_cache_ttl:
+                self._collected = (now, aggregate_process_metrics(self.metrics_dir, METRICS.prefix))
+            return self._collected[1]
+    
     def setup_routes(self):
         """Setup Flask routes"""
         
@@ -30,17 +270,56 @@ class AgentServer:
         @self.app.route('/api/metrics')
         def get_metrics():
             """Get agent performance metrics"""
-            return jsonify(self.get_agent_metrics())
+            metrics = dict(self.get_agent_metrics())
+            metrics.update(self.get_runtime_metrics())
+            body = json.dumps(metrics).encode('utf-8')
+            return self.json_response(body, hashlib.sha1(body).hexdigest())
         
         @self.app.route('/api/baseline-results')
         def get_baseline_results():
             """Get baseline test results"""
-            return jsonify(self.load_baseline_results())
+            _, body, etag = self.derive('baseline_results', self.build_baseline_results)
+            return self.json_response(body, etag)
         
         @self.app.route('/api/baseline-questions')
         def get_baseline_questions():
             """Get baseline questions from baseline.json"""
-            return jsonify(self.load_baseline_questions())
+            self.baseline_questions.refresh()
+            return self.json_response(self.baseline_questions.body, self.baseline_questions.etag)
+        
+        @self.app.route('/api/query', methods=['POST'])
+        def query():
+            """Answer a question with the agent"""
+            user_id, question, agent = self.parse_query_request()
+            future = self.runner.try_submit(lambda: agent.process_query(user_id, question))
+            if future is None:
+                return self.overloaded_response()
+            try:
+                result = future.result(timeout=self.query_timeout)
+            except concurrent.futures.TimeoutError:
+                future.cancel()
+                self.runner.timeouts += 1
+                return jsonify({'error': f'Query timed out after {self.query_timeout:.0f}s'}), 504
+            return jsonify(result)
+        
+        @self.app.route('/api/query/stream', methods=['POST'])
+        def query_stream():
+            """Answer a question as a server-sent event stream of tool events and answer tokens"""
+            user_id, question, agent = self.parse_query_request()
+            events: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+            future = self.runner.try_submit(lambda: self.pump_events(agent, user_id, question, events))
+            if future is None:
+                return self.overloaded_response()
+            return Response(
+                stream_with_context(self.stream_events(future, events)),
+                mimetype='text/event-stream',
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+            )
+        
+        @self.app.route('/metrics')
+        def prometheus_metrics():
+            """Latency histograms and counters in the Prometheus text format"""
+            return Response(self.render_prometheus(), mimetype='text/plain; version=0.0.4')
         
         @self.app.route('/api/status')
         def get_status():
@@ -51,27 +330,120 @@ class AgentServer:
                 'timestamp': datetime.now().isoformat()
             })
     
-    def get_agent_metrics(self) -> Dict[str, Any]:
-        """Load and return agent metrics"""
+    def parse_query_request(self):
+        """Return (user_id, query, agent), aborting with an error response if unusable"""
+        payload = request.get_json(silent=True) or {}
+        question = str(payload.get('query') or '').strip()
+        if not question:
+            abort(make_response(jsonify({'error': "Request body must include a non-empty 'query'"}), 400))
+        agent = self.get_agent()
+        if agent is None:
+            abort(make_response(jsonify({'error': 'No agent is configured on this server'}), 503))
+        user_id = str(payload.get('user_id') or request.remote_addr or 'anonymous')
+        return user_id, question, agent
+    
+    def overloaded_response(self):
+        return jsonify({'error': 'Too many queries in flight, retry shortly'}), 503, {'Retry-After': '1'}
+    
+    @staticmethod
+    def sse_event(event: str, data: Any) -> str:
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    
+    @staticmethod
+    async def pump_events(agent: Any, user_id: str, question: str, events: "queue.Queue[Dict[str, Any]]"):
+        """Run the query on the agent loop, handing each event to the request thread"""
+        if hasattr(agent, 'astream_query'):
+            async for event in agent.astream_query(user_id, question):
+                events.put(event)
+        else:
+            events.put({'type': 'result', **(await agent.process_query(user_id, question))})
+    
+    def stream_events(self, future: concurrent.futures.Future, events: "queue.Queue[Dict[str, Any]]",
+                      heartbeat: float = 5.0) -> Iterator[str]:
+        """Relay agent events as SSE, with heartbeats so proxies keep the connection open"""
+        yield self.sse_event('start', {'agent': self.agent_name})
+        deadline = time.monotonic() + self.query_timeout
         try:
-            # Try to load baseline results for metrics
-            baseline_results = self.load_baseline_results()
-            if baseline_results and 'results' in baseline_results:
-                total_tests = len(baseline_results['results'])
-                passed_tests = sum(1 for r in baseline_results['results'] if r.get('passed', False))
-                avg_response_time = sum(r.get('response_time', 0) for r in baseline_results['results']) / total_tests if total_tests > 0 else 1.0
-                accuracy = (passed_tests / total_tests * 100) if total_tests > 0 else 0
-                
-                return {
-                    'accuracy': f"{accuracy:.0f}%",
-                    'response_time': f"{avg_response_time:.1f}s",
-                    'confidence': '62%',
-                    'tests_passed': f"{passed_tests}/{total_tests}",
-                    'status': 'running',
-                    'last_updated': datetime.now().isoformat()
-                }
-        except Exception as e:
-            print(f"Error loading metrics: {e}")
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.runner.timeouts += 1
+                    yield self.sse_event('error', {'error': f'Query timed out after {self.query_timeout:.0f}s'})
+                    break
+                try:
+                    event = events.get(timeout=min(heartbeat, remaining))
+                except queue.Empty:
+                    if future.done() and events.empty():
+                        # Finished without a result event (e.g. the pump itself failed)
+                        error = future.exception()
+                        if error is not None:
+                            yield self.sse_event('error', {'error': str(error)})
+                        break
+                    yield ": heartbeat\n\n"
+                    continue
+                yield self.sse_event(event.get('type', 'message'), event)
+                if event.get('type') in ('result', 'error'):
+                    break
+        finally:
+            # Timed out or the client disconnected: stop the agent run
+            future.cancel()
+        yield self.sse_event('done', {})
+    
+    @staticmethod
+    def json_response(body: bytes, etag: str) -> Response:
+        """JSON response that answers If-None-Match with 304 Not Modified"""
+        response = Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        # Let browsers keep the body but revalidate on every poll
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
+    
+    def derive(self, name: str, build: Callable[[], Dict[str, Any]]) -> Tuple[Dict[str, Any], bytes, str]:
+        """Payload built from the baseline files, rebuilt only when either changes"""
+        self.baseline_questions.refresh()
+        self.baseline_results.refresh()
+        key = (self.baseline_questions.etag, self.baseline_results.etag)
+        cached = self._derived.get(name)
+        if cached is None or cached[0] != key:
+            with self._derived_lock:
+                cached = self._derived.get(name)
+                if cached is None or cached[0] != key:
+                    payload = build()
+                    body = json.dumps(payload).encode('utf-8')
+                    cached = (key, payload, body, hashlib.sha1(body).hexdigest())
+                    self._derived[name] = cached
+        return cached[1], cached[2], cached[3]
+    
+    def questions_by_id(self) -> Dict[str, Dict[str, Any]]:
+        return {q.get('id'): q for q in self.baseline_questions.payload.get('questions', [])}
+    
+    def build_baseline_results(self) -> Dict[str, Any]:
+        """Baseline results with totals and per-category/difficulty breakdowns"""
+        results = self.baseline_results.payload
+        if not results:
+            return {}
+        payload = dict(results)
+        payload['summary'] = {
+            **results.get('summary', {}),
+            **summarize_baseline(results.get('results', []), self.questions_by_id())
+        }
+        return payload
+    
+    def build_agent_metrics(self) -> Dict[str, Any]:
+        """Dashboard metrics from the latest baseline run"""
+        summary = self.derive('baseline_results', self.build_baseline_results)[0].get('summary')
+        if summary and summary.get('total_tests'):
+            mtime = self.baseline_results.mtime
+            return {
+                'accuracy': f"{summary['pass_rate']:.0f}%",
+                'response_time': f"{summary['average_response_time']:.1f}s",
+                'confidence': '62%',
+                'tests_passed': f"{summary['passed_tests']}/{summary['total_tests']}",
+                'status': 'running',
+                'last_updated': datetime.fromtimestamp(mtime).isoformat() if mtime else datetime.now().isoformat(),
+                'by_category': summary.get('by_category', {}),
+                'by_difficulty': summary.get('by_difficulty', {})
+            }
         
         return {
             'accuracy': '0%',
@@ -82,44 +454,54 @@ class AgentServer:
             'last_updated': datetime.now().isoformat()
         }
     
+    def get_agent_metrics(self) -> Dict[str, Any]:
+        """Load and return agent metrics"""
+        return self.derive('agent_metrics', self.build_agent_metrics)[0]
+    
+    def get_runtime_metrics(self) -> Dict[str, Any]:
+        """Live counters from the agent served by this process, if any"""
+        registry, _ = self.collected_metrics()
+        runtime = {'queries': self.runner.stats(), 'latency': registry.summary()}
+        if self.agent is not None and getattr(self.agent, 'response_cache', None) is not None:
+            runtime['response_cache'] = self.agent.response_cache.stats()
+        return runtime
+    
+    def render_prometheus(self) -> str:
+        """Trace metrics plus query runner and response cache gauges (one series per live worker)"""
+        registry, gauges_by_pid = self.collected_metrics()
+        lines = [registry.render_prometheus().rstrip('\n')]
+        names = sorted({name for gauges in gauges_by_pid.values() for name in gauges})
+        for name in names:
+            lines.append(f'# TYPE {METRICS.prefix}{name} gauge')
+            for pid, gauges in sorted(gauges_by_pid.items(), key=lambda item: item[0] or 0):
+                if name in gauges:
+                    labels = f'{{pid="{pid}"}}' if pid is not None else ''
+                    lines.append(f'{METRICS.prefix}{name}{labels} {gauges[name]}')
+        return '\n'.join(lines) + '\n'
+    
+    def process_gauges(self) -> Dict[str, float]:
+        """Numeric query runner and response cache stats of this process"""
+        gauges = {f'queries_{name}': value for name, value in self.runner.stats().items()}
+        if self.agent is not None and getattr(self.agent, 'response_cache', None) is not None:
+            gauges.update({f'response_cache_{name}': value for name, value in self.agent.response_cache.stats().items()})
+        return {name: value for name, value in gauges.items()
+                if isinstance(value, (int, float)) and not isinstance(value, bool)}
+    
     def load_baseline_results(self) -> Dict[str, Any]:
-        """Load baseline test results"""
-        # Try multiple paths for baseline results
-        paths_to_try = [
-            'baseline_results.json',
-            os.path.join('..', 'baseline_results.json')
-        ]
-        
-        for results_path in paths_to_try:
-            if os.path.exists(results_path):
-                try:
-                    with open(results_path, 'r') as f:
-                        return json.load(f)
-                except Exception as e:
-                    print(f"Error loading baseline results from {results_path}: {e}")
-        return {}
+        """Load baseline test results (cached until the file changes)"""
+        return self.baseline_results.get()
     
     def load_baseline_questions(self) -> Dict[str, Any]:
-        """Load baseline questions from baseline.json"""
-        # Try multiple paths for baseline questions
-        paths_to_try = [
-            'baseline.json',
-            os.path.join('..', 'baseline.json')
-        ]
-        
-        for questions_path in paths_to_try:
-            if os.path.exists(questions_path):
-                try:
-                    with open(questions_path, 'r') as f:
-                        return json.load(f)
-                except Exception as e:
-                    print(f"Error loading baseline questions from {questions_path}: {e}")
-        return {}
+        """Load baseline questions from baseline.json (cached until the file changes)"""
+        return self.baseline_questions.get()
     
     def run(self, debug: bool = False):
-        """Start the server"""
+        """Start the development server; use gunicorn (wsgi.py) in production"""
         print(f"Starting {self.agent_name} dashboard on http://0.0.0.0:{self.port}")
-        self.app.run(host='0.0.0.0', port=self.port, debug=debug)
+        try:
+            self.app.run(host='0.0.0.0', port=self.port, debug=debug, threaded=True)
+        finally:
+            self.shutdown()
 
 if __name__ == "__main__":
     server = AgentServer()
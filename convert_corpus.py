@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Corpus Format Converter
+Converts a JSONL corpus (one chunk per line) into the columnar,
+memory-mappable rag/corpus/ layout, or exports one back to JSONL
+"""
+
+import os
+import sys
+import json
+import logging
+import argparse
+
+# Add the base_agent module to Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(current_dir, "base_agent"))
+
+from core.corpus_store import ColumnarCorpus, convert_jsonl
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    """Main function"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Convert between JSONL and columnar corpus formats")
+    parser.add_argument("--input", default=os.path.join("rag", "corpus.jsonl"),
+                        help="JSONL file to convert, or a columnar directory with --to-jsonl")
+    parser.add_argument("--output", default=os.path.join("rag", "corpus"),
+                        help="Columnar directory to write, or a JSONL file with --to-jsonl")
+    parser.add_argument("--to-jsonl", action="store_true", help="Export a columnar corpus to JSONL")
+    args = parser.parse_args()
+
+    if args.to_jsonl:
+        rows = 0
+        tmp_path = f"{args.output}.tmp"
+        with open(tmp_path, "w") as f:
+            for record in ColumnarCorpus(args.input):
+                f.write(json.dumps(record) + "\n")
+                rows += 1
+        os.replace(tmp_path, args.output)
+    else:
+        rows = convert_jsonl(args.input, args.output)
+    logger.info(f"Wrote {rows} records from {args.input} to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Near-Duplicate Detection
+64-bit SimHash fingerprints over word shingles, with a banded index that
+finds fingerprints within a small Hamming distance. Used by the knowledge
+base builder to drop mirrored pages and chunks that repeat content already
+indexed
+"""
+
+import re
+import hashlib
+from typing import Dict, Generic, List, Optional, Tuple, TypeVar
+
+import numpy as np
+
+FINGERPRINT_BITS = 64
+SHINGLE_SIZE = 3
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+T = TypeVar("T")
+
+
+def _shingle_hashes(text: str) -> np.ndarray:
+    words = _WORD_PATTERN.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        shingles = [" ".join(words)] if words else []
+    else:
+        shingles = [" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)]
+    return np.array(
+        [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little") for s in shingles],
+        dtype="<u8"
+    )
+
+
+class SimHasher:
+    """Incremental SimHash: feed text segments, then read the fingerprint"""
+
+    def __init__(self):
+        self.weights = np.zeros(FINGERPRINT_BITS, dtype="int64")
+
+    def update(self, text: str) -> None:
+        hashes = _shingle_hashes(text)
+        if not len(hashes):
+            return
+        # One row of 64 bits per shingle; each set bit votes +1, each clear bit -1
+        bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+        self.weights += 2 * bits.sum(axis=0, dtype="int64") - len(hashes)
+
+    def digest(self) -> int:
+        fingerprint = 0
+        for bit, weight in enumerate(self.weights):
+            if weight > 0:
+                fingerprint |= 1 << bit
+        return fingerprint
+
+
+def simhash(text: str) -> int:
+    hasher = SimHasher()
+    hasher.update(text)
+    return hasher.digest()
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class SimHashIndex(Generic[T]):
+    """Finds a stored fingerprint within max_distance bits of a query.
+
+    Fingerprints are split into max_distance + 1 bands; by the pigeonhole
+    principle any match agrees exactly on at least one band, so only that
+    band's bucket needs checking.
+    """
+
+    def __init__(self, max_distance: int = 3):
+        self.max_distance = max_distance
+        self.bands = max_distance + 1
+        self.band_bits = FINGERPRINT_BITS // self.bands
+        self._buckets: List[Dict[int, List[Tuple[int, T]]]] = [{} for _ in range(self.bands)]
+
+    def _band_keys(self, fingerprint: int) -> List[int]:
+        mask = (1 << self.band_bits) - 1
+        return [(fingerprint >> (band * self.band_bits)) & mask for band in range(self.bands)]
+
+    def find(self, fingerprint: int) -> Optional[T]:
+        """Value stored with the nearest matching fingerprint, or None"""
+        best: Optional[Tuple[int, T]] = None
+        for bucket, key in zip(self._buckets, self._band_keys(fingerprint)):
+            for candidate, value in bucket.get(key, []):
+                distance = hamming_distance(candidate, fingerprint)
+                if distance <= self.max_distance and (best is None or distance < best[0]):
+                    best = (distance, value)
+        return best[1] if best else None
+
+    def add(self, fingerprint: int, value: T) -> None:
+        for bucket, key in zip(self._buckets, self._band_keys(fingerprint)):
+            bucket.setdefault(key, []).append((fingerprint, value))
@@ -6,12 +6,17 @@ Downloads regulatory content using direct HTTP requests
 
 import os
 import json
+import hashlib
 import logging
+import argparse
+import threading
 import requests
 import time
 import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, List
+from typing import Any, Dict, List, Optional
 from urllib.parse import urljoin, urlparse, quote
 from pathlib import Path
 
@@ -19,10 +24,49 @@ from pathlib import Path
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+class HostThrottle:
+    """Per-host concurrency limit and politeness delay shared by all mirror threads"""
+
+    def __init__(self, max_per_host: int = 1, delay: float = 1.0):
+        self.max_per_host = max_per_host
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._next_slot: Dict[str, float] = {}
+
+    def _semaphore(self, host: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self._semaphores[host]
+
+    @contextmanager
+    def slot(self, url: str):
+        """Hold a request slot for the URL's host, waiting out the politeness delay"""
+        host = urlparse(url).netloc
+        semaphore = self._semaphore(host)
+        with semaphore:
+            # Reserve the next start time under the lock, then sleep outside it
+            # so other hosts are never held up by this one.
+            with self._lock:
+                now = time.monotonic()
+                start = max(now, self._next_slot.get(host, 0.0))
+                self._next_slot[host] = start + self.delay
+            if start > now:
+                time.sleep(start - now)
+            yield
+
+
 class SimpleRegulationMirror:
-    def __init__(self, base_dir: str = "regulations"):
+    def __init__(self, base_dir: str = "regulations", max_workers: int = 1,
+                 per_host_limit: int = 1, host_delay: float = 1.0):
         self.base_dir = base_dir
         self.state_sites = self._get_state_regulatory_sites()
+        self.max_workers = max_workers
+        self.throttle = HostThrottle(max_per_host=per_host_limit, delay=host_delay)
+        self._local = threading.local()
+        # Files rewritten during the last run, per state; empty means no reindex needed
+        self.changed_files: Dict[str, List[str]] = {}
         self.session = requests.Session()
 
         # Set up session with realistic headers
@@ -30,7 +74,7 @@ class SimpleRegulationMirror:
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8',
             'Accept-Language': 'en-US,en;q=0.9',
-            'Accept-Encoding': 'gzip, deflate, br',
+            'Accept-Encoding': 'gzip, deflate',
             'Connection': 'keep-alive',
             'Upgrade-Insecure-Requests': '1',
             'Sec-Fetch-Dest': 'document',
@@ -39,6 +83,15 @@ class SimpleRegulationMirror:
             'Cache-Control': 'max-age=0'
         })
 
+    def _get_session(self) -> requests.Session:
+        """Return a session owned by the calling thread"""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update(self.session.headers)
+            self._local.session = session
+        return session
+
     def _get_state_regulatory_sites(self) -> Dict[str, Dict[str, str]]:
         """Define main regulatory websites for each state with direct regulation URLs"""
         return {
@@ -89,8 +142,10 @@ class SimpleRegulationMirror:
             }
         }
 
-    def download_url_content(self, url: str, max_retries: int = 3) -> tuple:
-        """Download content from a URL with retries"""
+    def _request_with_retries(self, url: str, max_retries: int = 3,
+                              extra_headers: Optional[Dict[str, str]] = None) -> Optional[requests.Response]:
+        """GET a URL with retries; returns the 200/304 response or None"""
+        extra_headers = extra_headers or {}
         for attempt in range(max_retries):
             try:
                 logger.info(f"Downloading: {url} (attempt {attempt + 1})")
@@ -99,18 +154,21 @@ class SimpleRegulationMirror:
                 if attempt > 0:
                     time.sleep(2 * attempt)
 
-                response = self.session.get(url, timeout=30, verify=False, allow_redirects=True)
+                session = self._get_session()
+                with self.throttle.slot(url):
+                    response = session.get(url, headers=extra_headers, timeout=30, verify=False, allow_redirects=True)
 
-                if response.status_code == 200:
-                    logger.info(f"Successfully downloaded: {url} ({len(response.content)} bytes)")
-                    return True, response.content, response.text
+                if response.status_code in (200, 304):
+                    return response
                 elif response.status_code == 403:
                     logger.warning(f"Access forbidden for {url}, trying different user agent")
                     # Try with different user agent
-                    headers = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'}
-                    response = self.session.get(url, headers=headers, timeout=30, verify=False)
-                    if response.status_code == 200:
-                        return True, response.content, response.text
+                    headers = dict(extra_headers)
+                    headers['User-Agent'] = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
+                    with self.throttle.slot(url):
+                        response = session.get(url, headers=headers, timeout=30, verify=False)
+                    if response.status_code in (200, 304):
+                        return response
                 else:
                     logger.warning(f"HTTP {response.status_code} for {url}")
 
@@ -118,9 +176,10 @@ class SimpleRegulationMirror:
                 logger.warning(f"SSL error for {url}, trying HTTP")
                 try:
                     http_url = url.replace('https://', 'http://')
-                    response = self.session.get(http_url, timeout=30, allow_redirects=True)
-                    if response.status_code == 200:
-                        return True, response.content, response.text
+                    with self.throttle.slot(http_url):
+                        response = self._get_session().get(http_url, headers=extra_headers, timeout=30, allow_redirects=True)
+                    if response.status_code in (200, 304):
+                        return response
                 except Exception as e:
                     logger.warning(f"HTTP fallback failed: {e}")
 
@@ -128,8 +187,56 @@ class SimpleRegulationMirror:
                 logger.warning(f"Attempt {attempt + 1} failed for {url}: {e}")
 
         logger.error(f"Failed to download {url} after {max_retries} attempts")
+        return None
+
+    def download_url_content(self, url: str, max_retries: int = 3) -> tuple:
+        """Download content from a URL with retries"""
+        response = self._request_with_retries(url, max_retries)
+        if response is not None and response.status_code == 200:
+            logger.info(f"Successfully downloaded: {url} ({len(response.content)} bytes)")
+            return True, response.content, response.text
         return False, None, None
 
+    def fetch_if_changed(self, url: str, cache_entry: Optional[Dict[str, Any]] = None,
+                         max_retries: int = 3) -> tuple:
+        """Conditionally fetch a URL using validators from a previous run.
+
+        Returns (status, response, entry) where status is "updated",
+        "not_modified" (HTTP 304), "unchanged" (same content hash) or "failed",
+        and entry is the refreshed fetch cache record for the URL.
+        """
+        cache_entry = cache_entry or {}
+        headers = {}
+        if cache_entry.get('etag'):
+            headers['If-None-Match'] = cache_entry['etag']
+        if cache_entry.get('last_modified'):
+            headers['If-Modified-Since'] = cache_entry['last_modified']
+
+        response = self._request_with_retries(url, max_retries, extra_headers=headers)
+        if response is None:
+            return "failed", None, cache_entry
+
+        entry = dict(cache_entry)
+        entry['checked'] = datetime.now().isoformat()
+        if response.headers.get('ETag'):
+            entry['etag'] = response.headers['ETag']
+        if response.headers.get('Last-Modified'):
+            entry['last_modified'] = response.headers['Last-Modified']
+
+        if response.status_code == 304:
+            logger.info(f"Not modified: {url}")
+            return "not_modified", response, entry
+
+        content_hash = hashlib.sha256(response.content).hexdigest()
+        status = "unchanged" if content_hash == cache_entry.get('sha256') else "updated"
+        if status == "updated":
+            logger.info(f"Successfully downloaded: {url} ({len(response.content)} bytes)")
+        else:
+            logger.info(f"Content unchanged: {url}")
+        entry['sha256'] = content_hash
+        entry['size'] = len(response.content)
+        return status, response, entry
+
     def extract_regulation_links(self, html_content: str, base_url: str) -> List[str]:
         """Extract relevant regulation links from HTML content"""
         if not html_content:
@@ -162,7 +269,11 @@ class SimpleRegulationMirror:
         return links[:10]  # Limit to 10 additional links
 
     def safe_filename(self, url: str, index: int = 0) -> str:
-        """Create a safe filename from URL"""
+        """Create a safe filename from URL.
+
+        The last path segment keeps the name readable; a short hash of the
+        full URL keeps pages that share a last segment in separate files.
+        """
         parsed = urlparse(url)
         path = parsed.path.strip('/')
 
@@ -172,16 +283,24 @@ class SimpleRegulationMirror:
             if not filename or filename == '/':
                 filename = f"page_{index}"
         else:
-            filename = f"index_{index}" if index > 0 else "index"
+            filename = "index"
 
         # Clean filename
         filename = re.sub(r'[^\w\-_\.]', '_', filename)
+        stem, extension = os.path.splitext(filename)
+        url_hash = hashlib.sha256(url.encode('utf-8')).hexdigest()[:8]
 
         # Add .html if no extension
-        if '.' not in filename:
-            filename += '.html'
+        return f"{stem}_{url_hash}{extension or '.html'}"
 
-        return filename
+    @staticmethod
+    def file_sha256(path: Path) -> Optional[str]:
+        """Content hash of a mirrored file, or None if it cannot be read"""
+        try:
+            with open(path, 'rb') as f:
+                return hashlib.sha256(f.read()).hexdigest()
+        except OSError:
+            return None
 
     def mirror_state_simple(self, state_code: str) -> bool:
         """Mirror regulatory content for a state using simple HTTP requests"""
@@ -195,66 +314,91 @@ class SimpleRegulationMirror:
 
         logger.info(f"Mirroring {state_info['name']} ({state_code})")
 
-        total_files = 0
-        total_size = 0
+        # Validators (ETag / Last-Modified / content hash) from the previous run
+        metadata_path = state_dir / 'metadata.json'
+        previous_cache = {}
+        if metadata_path.exists():
+            try:
+                with open(metadata_path, 'r') as f:
+                    previous_cache = json.load(f).get('fetch_cache', {})
+            except Exception as e:
+                logger.warning(f"Could not read previous metadata for {state_code}: {e}")
+
+        fetch_cache = {}
+        stats = {"total_files": 0, "total_size": 0, "bytes_downloaded": 0}
         downloaded_urls = []
+        changed_files = []
+
+        def mirror_url(url: str, filename: str) -> tuple:
+            """Fetch one URL into the state directory, skipping the write if unchanged"""
+            file_path = state_dir / filename
+            # Validators are only trustworthy while the previous copy is on disk
+            # and still holds the bytes they describe
+            cache_entry = previous_cache.get(url)
+            if cache_entry and (cache_entry.get('filename') != filename
+                                or self.file_sha256(file_path) != cache_entry.get('sha256')):
+                cache_entry = None
+            status, response, entry = self.fetch_if_changed(url, cache_entry)
+            if status == "failed":
+                return False, None
+
+            if status == "updated":
+                with open(file_path, 'wb') as f:
+                    f.write(response.content)
+                changed_files.append(filename)
+                logger.info(f"Saved: {filename} ({len(response.content)} bytes)")
+            if status != "not_modified":
+                stats["bytes_downloaded"] += len(response.content)
+
+            entry['filename'] = filename
+            fetch_cache[url] = entry
+            stats["total_files"] += 1
+            stats["total_size"] += file_path.stat().st_size
+            downloaded_urls.append(url)
+
+            if status == "not_modified":
+                return True, None
+            return True, response.text
 
         # Download main page and regulation pages
         urls_to_download = [state_info['main_url']] + state_info.get('regulation_urls', [])
 
         for i, url in enumerate(urls_to_download):
             try:
-                success, content, html = self.download_url_content(url)
-
-                if success and content:
-                    # Save the content
-                    filename = self.safe_filename(url, i)
-                    file_path = state_dir / filename
-
-                    with open(file_path, 'wb') as f:
-                        f.write(content)
+                filename = self.safe_filename(url, i)
+                success, html = mirror_url(url, filename)
 
-                    total_files += 1
-                    total_size += len(content)
-                    downloaded_urls.append(url)
-
-                    logger.info(f"Saved: {filename} ({len(content)} bytes)")
+                if success and i == 0:  # Only from main page to avoid too many requests
+                    if html is None:
+                        # 304: extract links from the copy already on disk
+                        html = (state_dir / filename).read_text(errors='ignore')
 
                     # Try to extract and download additional regulation links
-                    if html and i == 0:  # Only from main page to avoid too many requests
-                        additional_links = self.extract_regulation_links(html, url)
-                        logger.info(f"Found {len(additional_links)} additional regulation links")
-
-                        for j, link_url in enumerate(additional_links[:5]):  # Limit to 5 additional
-                            try:
-                                link_success, link_content, _ = self.download_url_content(link_url)
-                                if link_success and link_content:
-                                    link_filename = self.safe_filename(link_url, i + j + 10)
-                                    link_path = state_dir / link_filename
-
-                                    with open(link_path, 'wb') as f:
-                                        f.write(link_content)
-
-                                    total_files += 1
-                                    total_size += len(link_content)
-                                    downloaded_urls.append(link_url)
+                    additional_links = self.extract_regulation_links(html, url)
+                    logger.info(f"Found {len(additional_links)} additional regulation links")
 
-                                    logger.info(f"Saved additional: {link_filename}")
-
-                                    # Be respectful - add delay
-                                    time.sleep(1)
-
-                            except Exception as e:
-                                logger.warning(f"Failed to download additional link {link_url}: {e}")
-                                continue
-
-                # Be respectful - add delay between main requests
-                time.sleep(2)
+                    for j, link_url in enumerate(additional_links[:5]):  # Limit to 5 additional
+                        try:
+                            mirror_url(link_url, self.safe_filename(link_url, i + j + 10))
+                        except Exception as e:
+                            logger.warning(f"Failed to download additional link {link_url}: {e}")
+                            continue
 
             except Exception as e:
                 logger.error(f"Failed to download {url}: {e}")
                 continue
 
+        # Copies left under a URL's previous filename would be indexed twice
+        current_files = {entry['filename'] for entry in fetch_cache.values()}
+        for url, entry in previous_cache.items():
+            old_filename = entry.get('filename')
+            if url in fetch_cache and old_filename and old_filename not in current_files:
+                (state_dir / old_filename).unlink(missing_ok=True)
+                logger.info(f"Removed {old_filename}, now mirrored as {fetch_cache[url]['filename']}")
+
+        total_files = stats["total_files"]
+        self.changed_files[state_code] = changed_files
+
         # Create metadata
         metadata = {
             "state": state_code,
@@ -264,32 +408,53 @@ class SimpleRegulationMirror:
             "downloaded_urls": downloaded_urls,
             "last_updated": datetime.now().isoformat(),
             "total_files": total_files,
-            "total_size_mb": round(total_size / 1024 / 1024, 2),
+            "total_size_mb": round(stats["total_size"] / 1024 / 1024, 2),
+            "changed_files": changed_files,
+            "bytes_downloaded": stats["bytes_downloaded"],
+            "fetch_cache": fetch_cache,
             "mirror_success": total_files > 0
         }
 
-        metadata_path = state_dir / 'metadata.json'
         with open(metadata_path, 'w') as f:
             json.dump(metadata, f, indent=2)
 
-        logger.info(f"Mirror complete for {state_code}: {total_files} files, {metadata['total_size_mb']} MB")
+        logger.info(f"Mirror complete for {state_code}: {total_files} files "
+                    f"({len(changed_files)} changed), {metadata['total_size_mb']} MB")
         return total_files > 0
 
+    def _mirror_state_logged(self, state_code: str) -> bool:
+        """Mirror one state, logging the outcome instead of raising"""
+        try:
+            success = self.mirror_state_simple(state_code)
+            logger.info(f"State {state_code}: {'✅ Success' if success else '❌ Failed'}")
+            return success
+        except Exception as e:
+            logger.error(f"Error mirroring {state_code}: {e}")
+            return False
+
     def mirror_all_states(self) -> Dict[str, bool]:
         """Mirror all states with simple HTTP approach"""
-        logger.info("Starting simplified mirroring for all states")
+        logger.info(f"Starting simplified mirroring for all states ({self.max_workers} workers)")
+        start_time = time.time()
 
         base_path = Path(self.base_dir)
         base_path.mkdir(exist_ok=True)
 
         results = {}
-        for state_code in self.state_sites.keys():
-            try:
-                results[state_code] = self.mirror_state_simple(state_code)
-                logger.info(f"State {state_code}: {'✅ Success' if results[state_code] else '❌ Failed'}")
-            except Exception as e:
-                logger.error(f"Error mirroring {state_code}: {e}")
-                results[state_code] = False
+        if self.max_workers > 1:
+            # States run in parallel; HostThrottle keeps each host polite, so
+            # wall time is bounded by the slowest host rather than the total.
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = {
+                    executor.submit(self._mirror_state_logged, state_code): state_code
+                    for state_code in self.state_sites.keys()
+                }
+                for future in as_completed(futures):
+                    results[futures[future]] = future.result()
+            results = {state_code: results[state_code] for state_code in self.state_sites.keys()}
+        else:
+            for state_code in self.state_sites.keys():
+                results[state_code] = self._mirror_state_logged(state_code)
 
         # Create summary
         summary = {
@@ -298,7 +463,10 @@ class SimpleRegulationMirror:
             "successful_mirrors": sum(results.values()),
             "failed_mirrors": len(self.state_sites) - sum(results.values()),
             "results": results,
-            "method": "simple_http"
+            "changed_files": {state: len(files) for state, files in self.changed_files.items()},
+            "method": "simple_http",
+            "workers": self.max_workers,
+            "duration_seconds": round(time.time() - start_time, 2)
         }
 
         summary_path = base_path / 'mirror_summary.json'
@@ -313,9 +481,22 @@ class SimpleRegulationMirror:
 
 def main():
     """Main function"""
+    parser = argparse.ArgumentParser(description="Mirror state cannabis regulation websites")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of states to mirror in parallel (default: 1, serial)")
+    parser.add_argument("--per-host", type=int, default=1,
+                        help="Maximum concurrent requests to a single host")
+    parser.add_argument("--host-delay", type=float, default=1.0,
+                        help="Minimum seconds between request starts to the same host")
+    args = parser.parse_args()
+
     logger.info("🌐 Starting Simple Regulation Mirror")
 
-    mirror = SimpleRegulationMirror()
+    mirror = SimpleRegulationMirror(
+        max_workers=args.workers,
+        per_host_limit=args.per_host,
+        host_delay=args.host_delay
+    )
     results = mirror.mirror_all_states()
 
     successful = sum(results.values())
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Streaming Regulation Text Extraction
+Walks the regulation mirror, sniffs each file's real content type, and
+streams text out of HTML (boilerplate stripped) and PDF (page by page)
+into fixed-size overlapping chunks, so no whole document is ever held
+in memory
+"""
+
+import re
+import sys
+import json
+import codecs
+import logging
+import argparse
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+READ_BLOCK_SIZE = 64 * 1024
+SNIFF_BYTES = 2048
+
+# Content types that carry regulation text; everything else is skipped
+CONTENT_TYPES = {"text/html", "text/plain", "application/pdf"}
+
+# Elements whose text is page chrome rather than regulation content
+BOILERPLATE_TAGS = {"script", "style", "noscript", "nav", "header", "footer", "aside", "form", "svg", "template"}
+# Containers marked as page chrome by ARIA role, or by id/class (site menus, out-of-date
+# browser banners, cookie notices) when the page does not use the semantic tags above
+BOILERPLATE_ROLES = {"navigation", "banner", "contentinfo", "complementary", "search", "menu", "menubar"}
+BOILERPLATE_CONTAINERS = {"div", "section", "ul", "ol", "span", "table"}
+# An id or class item names chrome when it starts or ends with one of these words;
+# modifier classes such as "with-nav-sidebar" describe the content instead
+_BOILERPLATE_NAMES = re.compile(
+    r"^(?!(?:with|has|is|no)[_-])(?:(?:nav|navbar|navigation|menu|breadcrumbs?|banner|footer|header|cookies?|"
+    r"outdated|skip|sidebar|social|share)(?:[_-].*)?|.*[_-](?:nav|navbar|navigation|menu|breadcrumbs?|banner|"
+    r"footer|header|cookies?|outdated|sidebar|social|share))$", re.I
+)
+# Elements that end a run of text; segments are flushed at these boundaries
+BLOCK_TAGS = {
+    "p", "div", "section", "article", "main", "li", "ul", "ol", "table", "tr", "td", "th",
+    "h1", "h2", "h3", "h4", "h5", "h6", "br", "hr", "blockquote", "pre", "dd", "dt"
+}
+
+_MAGIC_NUMBERS = [
+    (b"%PDF-", "application/pdf"),
+    (b"\x89PNG", "image/png"),
+    (b"GIF8", "image/gif"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x00\x00\x01\x00", "image/x-icon"),
+    (b"PK\x03\x04", "application/zip"),
+    (b"\x1f\x8b", "application/gzip"),
+]
+_HTML_MARKERS = re.compile(rb"<(!doctype html|html|head|body|div|p|title|meta|table)\b", re.I)
+_CHARSET = re.compile(rb"""charset\s*=\s*["']?([a-z0-9_\-]+)""", re.I)
+# Share of control bytes above which a file is binary rather than text in some charset
+BINARY_THRESHOLD = 0.05
+_TEXT_CONTROLS = b"\t\n\r\f\x1b"
+_WHITESPACE = re.compile(r"\s+")
+
+
+def sniff_content_type(path: Path) -> str:
+    """Identify a file by its leading bytes rather than its extension"""
+    with open(path, "rb") as f:
+        head = f.read(SNIFF_BYTES)
+    for magic, content_type in _MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return content_type
+    # Markers are ASCII, so pages in any single-byte charset are recognised
+    if _HTML_MARKERS.search(head):
+        return "text/html"
+    controls = sum(1 for byte in head if (byte < 0x20 and byte not in _TEXT_CONTROLS) or byte == 0x7f)
+    if b"\x00" in head or (head and controls / len(head) > BINARY_THRESHOLD):
+        # Undecoded (e.g. brotli) bodies saved by older mirror runs land here
+        return "application/octet-stream"
+    # A multi-byte character may be cut at the sniff boundary
+    text = codecs.getincrementaldecoder("utf-8")(errors="replace").decode(head)
+    stripped = text.lstrip()
+    if stripped.startswith("<?xml") or stripped.startswith("<svg"):
+        return "application/xml"
+    if "<" not in text and re.search(r"\{[^}]*:[^}]*;", text):
+        return "text/css"
+    return "text/plain"
+
+
+def is_content_file(path: Path) -> bool:
+    return path.name != "metadata.json" and sniff_content_type(path) in CONTENT_TYPES
+
+
+class _StreamingTextParser(HTMLParser):
+    """Collects visible text segments, dropping boilerplate elements"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.segments: List[str] = []
+        self._current: List[str] = []
+        self._skip_depth = 0
+        # Chrome marked only by attributes: the tag that opened it and how deeply it is nested
+        self._skip_container: Optional[str] = None
+        self._skip_nesting = 0
+
+    def _flush(self):
+        text = _WHITESPACE.sub(" ", "".join(self._current)).strip()
+        if text:
+            self.segments.append(text)
+        self._current = []
+
+    @staticmethod
+    def _is_chrome(tag, attrs) -> bool:
+        if tag not in BOILERPLATE_CONTAINERS:
+            return False
+        attributes = dict(attrs)
+        if (attributes.get("role") or "").lower() in BOILERPLATE_ROLES:
+            return True
+        names = (attributes.get("id") or "").split() + (attributes.get("class") or "").split()
+        return any(_BOILERPLATE_NAMES.match(name) for name in names)
+
+    def handle_starttag(self, tag, attrs):
+        if self._skip_container is not None:
+            if tag == self._skip_container:
+                self._skip_nesting += 1
+        elif tag in BOILERPLATE_TAGS:
+            self._skip_depth += 1
+        elif self._is_chrome(tag, attrs):
+            self._flush()
+            self._skip_container, self._skip_nesting = tag, 1
+        elif tag in BLOCK_TAGS:
+            self._flush()
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in BLOCK_TAGS:
+            self._flush()
+
+    def handle_endtag(self, tag):
+        if self._skip_container is not None:
+            if tag == self._skip_container:
+                self._skip_nesting -= 1
+                if not self._skip_nesting:
+                    self._skip_container = None
+        elif tag in BOILERPLATE_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in BLOCK_TAGS:
+            self._flush()
+
+    def handle_data(self, data):
+        if not self._skip_depth and self._skip_container is None:
+            self._current.append(data)
+
+    def close(self):
+        super().close()
+        self._flush()
+
+
+def html_encoding(path: Path) -> str:
+    """Charset an HTML page declares, else UTF-8 if its head decodes as such, else windows-1252"""
+    with open(path, "rb") as f:
+        head = f.read(SNIFF_BYTES)
+    declared = _CHARSET.search(head)
+    if declared:
+        try:
+            return codecs.lookup(declared.group(1).decode("ascii")).name
+        except LookupError:
+            pass
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(head)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "cp1252"
+
+
+def iter_html_text(path: Path) -> Iterator[str]:
+    """Yield text segments of an HTML page, reading it block by block"""
+    decoder = codecs.getincrementaldecoder(html_encoding(path))(errors="replace")
+    parser = _StreamingTextParser()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(READ_BLOCK_SIZE), b""):
+            parser.feed(decoder.decode(block))
+            yield from parser.segments
+            parser.segments = []
+    parser.feed(decoder.decode(b"", final=True))
+    parser.close()
+    yield from parser.segments
+
+
+def iter_pdf_text(path: Path) -> Iterator[str]:
+    """Yield a PDF's text one page at a time.
+
+    The reader is given an open file rather than a path: pypdf then seeks
+    into the file for each page instead of reading the whole file into memory.
+    """
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        logger.warning(f"pypdf not installed, skipping {path}")
+        return
+    with open(path, "rb") as f:
+        reader = PdfReader(f)
+        for page_number, page in enumerate(reader.pages, start=1):
+            try:
+                text = page.extract_text() or ""
+            except Exception as e:
+                logger.warning(f"Could not extract page {page_number} of {path}: {e}")
+                continue
+            text = _WHITESPACE.sub(" ", text).strip()
+            if text:
+                yield text
+
+
+def iter_plain_text(path: Path) -> Iterator[str]:
+    """Yield a text file's paragraphs"""
+    paragraph: List[str] = []
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            if line.strip():
+                paragraph.append(line.strip())
+            elif paragraph:
+                yield " ".join(paragraph)
+                paragraph = []
+    if paragraph:
+        yield " ".join(paragraph)
+
+
+def iter_text(path: Path, content_type: Optional[str] = None) -> Iterator[str]:
+    """Yield text segments from any mirrored content file; assets yield nothing"""
+    content_type = content_type or sniff_content_type(path)
+    if content_type == "text/html":
+        return iter_html_text(path)
+    if content_type == "application/pdf":
+        return iter_pdf_text(path)
+    if content_type == "text/plain":
+        return iter_plain_text(path)
+    logger.info(f"Skipping {content_type} file {path}")
+    return iter(())
+
+
+def extract_text(path: Path) -> str:
+    """Whole-document text, for callers that need it in one string"""
+    return " ".join(iter_text(path))
+
+
+def _split_point(text: str, chunk_size: int) -> int:
+    """Break before chunk_size on whitespace where possible"""
+    split_at = text.rfind(" ", chunk_size // 2, chunk_size)
+    return split_at if split_at != -1 else chunk_size
+
+
+def iter_chunks(segments: Iterable[str], chunk_size: int = 1000, chunk_overlap: int = 200) -> Iterator[str]:
+    """Turn a stream of text segments into overlapping chunks.
+
+    Only the current chunk plus the incoming segment are buffered.
+    """
+    buffer = ""
+    for segment in segments:
+        buffer = f"{buffer} {segment}" if buffer else segment
+        while len(buffer) > chunk_size:
+            end = _split_point(buffer, chunk_size)
+            chunk = buffer[:end].strip()
+            if chunk:
+                yield chunk
+            buffer = buffer[max(end - chunk_overlap, 1):].lstrip()
+    buffer = buffer.strip()
+    if buffer:
+        yield buffer
+
+
+def chunk_text(text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> List[str]:
+    """Split text into overlapping chunks, breaking on whitespace where possible"""
+    return list(iter_chunks([_WHITESPACE.sub(" ", text).strip()], chunk_size, chunk_overlap))
+
+
+def iter_mirror_files(regulations_dir: Path) -> Iterator[Dict[str, object]]:
+    """Yield the content files of every state in the mirror"""
+    for state_dir in sorted(p for p in regulations_dir.iterdir() if p.is_dir()):
+        for path in sorted(state_dir.iterdir()):
+            if not path.is_file() or path.name == "metadata.json":
+                continue
+            content_type = sniff_content_type(path)
+            if content_type in CONTENT_TYPES:
+                yield {"path": path, "state": state_dir.name, "content_type": content_type}
+
+
+def main():
+    """Stream the mirror into a JSONL corpus without embedding it"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Extract and chunk mirrored regulations into a JSONL corpus")
+    parser.add_argument("--regulations-dir", default="regulations")
+    parser.add_argument("--output", default=None, help="Output JSONL (default: stdout)")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    args = parser.parse_args()
+
+    regulations_dir = Path(args.regulations_dir)
+    out = open(args.output, "w") if args.output else sys.stdout
+    chunks = 0
+    try:
+        for doc in iter_mirror_files(regulations_dir):
+            source = doc["path"].relative_to(regulations_dir).as_posix()
+            for chunk in iter_chunks(iter_text(doc["path"], doc["content_type"]), args.chunk_size, args.chunk_overlap):
+                out.write(json.dumps({"text": chunk, "source": source, "category": "regulation",
+                                      "state": doc["state"]}) + "\n")
+                chunks += 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    logger.info(f"Wrote {chunks} chunks")
+
+
+if __name__ == "__main__":
+    main()
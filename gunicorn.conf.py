@@ -0,0 +1,117 @@
+"""
+Gunicorn configuration for the compliance agent server
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Request threads hand queries to a per-worker asyncio loop, so a worker
+can have many agent runs in flight while LLM calls are pending. Each
+in-flight query still holds its request thread, so the thread count is
+derived from server.max_in_flight in agent_config.yaml (or MAX_IN_FLIGHT):
+a saturated worker keeps spare threads to answer 503 + Retry-After and
+serve the dashboard instead of queueing requests inside gunicorn.
+"""
+
+import os
+import sys
+import time
+import shutil
+import signal
+import tempfile
+import multiprocessing
+from typing import Optional
+
+import yaml
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", min(4, multiprocessing.cpu_count())))
+worker_class = "gthread"
+# Threads beyond max_in_flight for rejections, status and dashboard requests
+SPARE_THREADS = int(os.environ.get("GUNICORN_SPARE_THREADS", "8"))
+
+
+def _configured_max_in_flight() -> int:
+    if "MAX_IN_FLIGHT" in os.environ:
+        return int(os.environ["MAX_IN_FLIGHT"])
+    try:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "agent_config.yaml"), "r") as f:
+            return int(((yaml.safe_load(f) or {}).get("server") or {}).get("max_in_flight", 32))
+    except (OSError, yaml.YAMLError):
+        return 32
+
+
+max_in_flight = _configured_max_in_flight()
+threads = int(os.environ.get("GUNICORN_THREADS", max_in_flight + SPARE_THREADS))
+# An explicit thread count wins; the in-flight limit shrinks to fit under it
+max_in_flight = max(1, min(max_in_flight, threads - SPARE_THREADS))
+# Workers are forked from this process and read it in wsgi.create_server
+os.environ["MAX_IN_FLIGHT"] = str(max_in_flight)
+# Must exceed the query timeout so slow queries get a 504, not a killed worker
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "120"))
+# SIGTERM: stop accepting, give in-flight queries this long to finish
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+# Agents are built and warmed per worker after the fork (post_worker_init);
+# sqlite connections and background threads do not survive fork safely.
+# Fork-safe artifacts are prepared once in the master (on_starting)
+preload_app = False
+accesslog = "-"
+
+# Workers write their metrics here and /metrics on any worker merges every
+# file, so Prometheus sees totals for the whole server rather than whichever
+# worker answered the scrape. Emptied when the server starts, like any
+# counter reset. The directory can also be set explicitly via METRICS_DIR.
+os.environ.setdefault("METRICS_DIR",
+                      os.path.join(tempfile.gettempdir(), f"compliance-agent-metrics-{bind.rsplit(':', 1)[-1]}"))
+
+
+def on_starting(arbiter):
+    shutil.rmtree(os.environ["METRICS_DIR"], ignore_errors=True)
+    os.makedirs(os.environ["METRICS_DIR"])
+    # Parse the ontology once here; workers then load its snapshot instead of
+    # each parsing the Turtle file and writing the same snapshot
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, app_dir)
+    from knowledge_graph import KnowledgeGraph, snapshot_path
+    ttl_path = os.path.join(app_dir, "rag", "knowledge_base.ttl")
+    if os.path.exists(ttl_path):
+        KnowledgeGraph.load(ttl_path, snapshot_path(ttl_path))
+
+
+# When this worker was told to stop; the master SIGKILLs it graceful_timeout later
+_exit_requested: Optional[float] = None
+# Seconds kept back from the drain for stopping the loop and closing the agent
+EXIT_MARGIN = 5
+
+
+def _mark_exit_requested():
+    global _exit_requested
+    if _exit_requested is None:
+        _exit_requested = time.monotonic()
+
+
+def post_worker_init(worker):
+    from wsgi import server
+    server.start()
+    # gunicorn has no SIGTERM hook, so wrap the worker's handler to note the time
+    handle_term = signal.getsignal(signal.SIGTERM)
+
+    def on_term(signum, frame):
+        _mark_exit_requested()
+        handle_term(signum, frame)
+
+    signal.signal(signal.SIGTERM, on_term)
+
+
+def worker_int(worker):
+    # SIGINT / SIGQUIT: a quick shutdown, leave no time for draining
+    global _exit_requested
+    _exit_requested = time.monotonic() - graceful_timeout
+
+
+def worker_exit(arbiter, worker):
+    from wsgi import server
+    # gunicorn has already spent part of graceful_timeout waiting for request
+    # threads; drain only for what is left of it
+    _mark_exit_requested()
+    remaining = graceful_timeout - (time.monotonic() - _exit_requested) - EXIT_MARGIN
+    server.shutdown(timeout=max(0.0, remaining))
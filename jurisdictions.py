@@ -0,0 +1,46 @@
+"""
+Jurisdiction Detection
+Maps state names and postal codes mentioned in text to state codes
+"""
+
+import re
+from typing import Dict, List
+
+STATE_NAMES: Dict[str, str] = {
+    "AL": "Alabama", "AK": "Alaska", "AZ": "Arizona", "AR": "Arkansas", "CA": "California",
+    "CO": "Colorado", "CT": "Connecticut", "DE": "Delaware", "DC": "District of Columbia",
+    "FL": "Florida", "GA": "Georgia", "HI": "Hawaii", "ID": "Idaho", "IL": "Illinois",
+    "IN": "Indiana", "IA": "Iowa", "KS": "Kansas", "KY": "Kentucky", "LA": "Louisiana",
+    "ME": "Maine", "MD": "Maryland", "MA": "Massachusetts", "MI": "Michigan", "MN": "Minnesota",
+    "MS": "Mississippi", "MO": "Missouri", "MT": "Montana", "NE": "Nebraska", "NV": "Nevada",
+    "NH": "New Hampshire", "NJ": "New Jersey", "NM": "New Mexico", "NY": "New York",
+    "NC": "North Carolina", "ND": "North Dakota", "OH": "Ohio", "OK": "Oklahoma", "OR": "Oregon",
+    "PA": "Pennsylvania", "RI": "Rhode Island", "SC": "South Carolina", "SD": "South Dakota",
+    "TN": "Tennessee", "TX": "Texas", "UT": "Utah", "VT": "Vermont", "VA": "Virginia",
+    "WA": "Washington", "WV": "West Virginia", "WI": "Wisconsin", "WY": "Wyoming"
+}
+
+# Codes that are also everyday English words are only recognized by full name
+_AMBIGUOUS_CODES = {"HI", "ID", "IN", "ME", "OH", "OK", "OR"}
+
+# Longest names first so "West Virginia" is never read as "Virginia"
+_NAME_PATTERN = re.compile(
+    r"\b(" + "|".join(sorted((re.escape(name) for name in STATE_NAMES.values()), key=len, reverse=True)) + r")\b",
+    re.IGNORECASE
+)
+_CODE_PATTERN = re.compile(r"\b([A-Z]{2})\b")
+_CODES_BY_NAME = {name.lower(): code for code, name in STATE_NAMES.items()}
+
+
+def detect_jurisdictions(text: str) -> List[str]:
+    """Return state codes mentioned in the text by name or postal code"""
+    found = []
+    for match in _NAME_PATTERN.finditer(text):
+        code = _CODES_BY_NAME[match.group(1).lower()]
+        if code not in found:
+            found.append(code)
+    for match in _CODE_PATTERN.finditer(text):
+        code = match.group(1)
+        if code in STATE_NAMES and code not in _AMBIGUOUS_CODES and code not in found:
+            found.append(code)
+    return found
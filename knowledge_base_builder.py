@@ -0,0 +1,454 @@
+#!/usr/bin/env python3
+"""
+Incremental Knowledge Base Builder
+Re-chunks and re-embeds only the mirrored regulation files that changed
+since the last build, keeping the columnar rag/corpus/ and the FAISS index
+in sync.
+Each build is published as a new rag/index/<version>/ snapshot.
+Near-duplicate pages and chunks are dropped before embedding, with the
+pages they duplicate recorded in rag/canonical_sources.json.
+"""
+
+import os
+import sys
+import json
+import yaml
+import hashlib
+import logging
+import argparse
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+# Add the base_agent module to Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(current_dir, "base_agent"))
+
+from core.embeddings import embeddings_from_config
+from core.bm25 import BM25_DIRNAME, BM25Builder
+from core.corpus_store import ColumnarCorpus, ColumnarCorpusWriter
+from core.vectorstore import (
+    DOCSTORE_DIRNAME, INDEX_FILENAME, SHARDS_DIRNAME, FaissVectorStore, current_version, publish_version,
+    shard_key
+)
+
+from dedup import SimHasher, SimHashIndex, simhash
+from extract_regulations import is_content_file, iter_chunks, iter_text
+
+logger = logging.getLogger(__name__)
+
+EMBED_BATCH_SIZE = 64
+
+
+class KnowledgeBaseBuilder:
+    """Builds the RAG corpus and vector index from the regulation mirror"""
+
+    def __init__(self, regulations_dir: str = "regulations", rag_dir: str = "rag",
+                 embeddings: Optional[Any] = None):
+        self.regulations_dir = Path(regulations_dir)
+        self.rag_dir = Path(rag_dir)
+        self.index_dir = self.rag_dir / "index"
+        self.corpus_dir = self.rag_dir / "corpus"
+        # Seed corpus from before the columnar format; read until rag/corpus/ exists
+        self.legacy_corpus_path = self.rag_dir / "corpus.jsonl"
+        self.canonical_sources_path = self.rag_dir / "canonical_sources.json"
+
+        with open(self.rag_dir / "config.yaml", "r") as f:
+            config = yaml.safe_load(f) or {}
+        self.vectorstore_config = config.get("vectorstore", {})
+        self.embedding_model = self.vectorstore_config.get("embedding_model", "text-embedding-ada-002")
+        self.embedding_provider = self.vectorstore_config.get("embedding_provider", "openai")
+        self.chunk_size = config.get("corpus", {}).get("chunk_size", 1000)
+        self.chunk_overlap = config.get("corpus", {}).get("chunk_overlap", 200)
+        dedup_config = config.get("dedup", {})
+        # Maximum SimHash distance counted as a duplicate; None disables dedup
+        self.dedup_distance = dedup_config.get("max_distance", 3) if dedup_config.get("enabled", True) else None
+        self._embeddings = embeddings
+
+    @property
+    def embeddings(self) -> Any:
+        if self._embeddings is None:
+            self._embeddings = embeddings_from_config(self.vectorstore_config, str(self.rag_dir.parent))
+        return self._embeddings
+
+    def _empty_manifest(self) -> Dict[str, Any]:
+        return {
+            "embedding_model": self.embedding_model,
+            "embedding_provider": self.embedding_provider,
+            "chunk_size": self.chunk_size,
+            "chunk_overlap": self.chunk_overlap,
+            "dedup_distance": self.dedup_distance,
+            "next_id": 0,
+            "documents": {}
+        }
+
+    def _snapshot_dir(self, version: Optional[str] = None) -> Optional[Path]:
+        version = version or current_version(str(self.index_dir))
+        return self.index_dir / version if version else None
+
+    def load_manifest(self) -> Dict[str, Any]:
+        """Load the published build manifest, or an empty one if it is unusable"""
+        snapshot_dir = self._snapshot_dir()
+        if snapshot_dir is None or not (snapshot_dir / "manifest.json").exists():
+            return self._empty_manifest()
+        with open(snapshot_dir / "manifest.json", "r") as f:
+            manifest = json.load(f)
+
+        # Any change to how chunks are produced or embedded invalidates every vector
+        for key in ("embedding_model", "embedding_provider", "chunk_size", "chunk_overlap", "dedup_distance"):
+            if manifest.get(key, "openai" if key == "embedding_provider" else None) != getattr(self, key):
+                logger.info(f"{key} changed since last build, rebuilding from scratch")
+                return self._empty_manifest()
+        return manifest
+
+    def _source_urls(self, state_dir: Path) -> Dict[str, str]:
+        """Map mirrored filenames back to the URL they were fetched from"""
+        metadata_path = state_dir / "metadata.json"
+        if not metadata_path.exists():
+            return {}
+        try:
+            with open(metadata_path, "r") as f:
+                fetch_cache = json.load(f).get("fetch_cache", {})
+        except Exception:
+            return {}
+        return {entry["filename"]: url for url, entry in fetch_cache.items() if "filename" in entry}
+
+    def scan_mirror(self) -> Iterator[Dict[str, Any]]:
+        """Yield every content file in the mirror with its state and source"""
+        if not self.regulations_dir.exists():
+            return
+        for state_dir in sorted(p for p in self.regulations_dir.iterdir() if p.is_dir()):
+            sources = self._source_urls(state_dir)
+            for path in sorted(state_dir.iterdir()):
+                if path.is_file() and is_content_file(path):
+                    yield {
+                        "path": path,
+                        "key": path.relative_to(self.regulations_dir).as_posix(),
+                        "state": state_dir.name,
+                        "source": sources.get(path.name, path.relative_to(self.regulations_dir).as_posix())
+                    }
+
+    @staticmethod
+    def _file_hash(path: Path) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def diff(self, manifest: Dict[str, Any]) -> Dict[str, Any]:
+        """Compare the mirror against the manifest"""
+        previous = manifest["documents"]
+        changed, unchanged, current = [], [], {}
+
+        for doc in self.scan_mirror():
+            stat = doc["path"].stat()
+            entry = previous.get(doc["key"])
+            # Size and mtime are a cheap pre-check; the hash decides
+            if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+                doc["sha256"] = entry["sha256"]
+            else:
+                doc["sha256"] = self._file_hash(doc["path"])
+            doc["size"], doc["mtime"] = stat.st_size, stat.st_mtime
+            current[doc["key"]] = doc
+
+            if entry and entry["sha256"] == doc["sha256"]:
+                unchanged.append(doc)
+            else:
+                changed.append(doc)
+
+        removed = [key for key in previous if key not in current]
+        return {"changed": changed, "unchanged": unchanged, "removed": removed}
+
+    def _iter_corpus(self) -> Iterator[Dict[str, Any]]:
+        if self.corpus_dir.exists():
+            yield from ColumnarCorpus(str(self.corpus_dir))
+        elif self.legacy_corpus_path.exists():
+            with open(self.legacy_corpus_path, "r") as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+
+    def _iter_base_corpus(self, incremental: bool) -> Iterator[Dict[str, Any]]:
+        """Records an incremental build starts from.
+
+        Built chunks come from the published snapshot's docstore, which
+        flips together with the manifest, so a build that failed before
+        publishing cannot leak its chunks into the next one. Rows without
+        an id only live in rag/corpus.
+        """
+        snapshot_dir = self._snapshot_dir()
+        docstore_dir = snapshot_dir / DOCSTORE_DIRNAME if snapshot_dir else None
+        if not incremental or docstore_dir is None or not docstore_dir.is_dir():
+            yield from self._iter_corpus()
+            return
+        for record in self._iter_corpus():
+            if "id" not in record:
+                yield record
+        yield from ColumnarCorpus(str(docstore_dir))
+
+    @staticmethod
+    def _expand_dependents(manifest: Dict[str, Any], changes: Dict[str, Any]) -> None:
+        """Reprocess unchanged documents whose duplicates were resolved against a stale one.
+
+        A page dropped as a copy of another must be reconsidered once that
+        other page changes or disappears.
+        """
+        stale = set(changes["removed"]) | {doc["key"] for doc in changes["changed"]}
+        unchanged = {doc["key"]: doc for doc in changes["unchanged"]}
+        while True:
+            dependents = [
+                key for key in unchanged
+                if stale.intersection(manifest["documents"].get(key, {}).get("depends_on", []))
+            ]
+            if not dependents:
+                break
+            for key in dependents:
+                stale.add(key)
+                changes["changed"].append(unchanged.pop(key))
+        changes["unchanged"] = list(unchanged.values())
+        # Deterministic canonical choice: the first key in sort order wins
+        changes["changed"].sort(key=lambda doc: doc["key"])
+
+    def _dedup_indexes(self, manifest: Dict[str, Any], changes: Dict[str, Any]):
+        """Seed per-state document and chunk fingerprint indexes from unchanged documents.
+
+        Both are keyed by state: queries are routed to state shards, so a page
+        is only dropped in favour of a copy that lands in the same shard.
+        """
+        document_indexes: Dict[str, SimHashIndex] = {}
+        chunk_indexes: Dict[str, SimHashIndex] = {}
+        if self.dedup_distance is None:
+            return document_indexes, chunk_indexes
+        for doc in changes["unchanged"]:
+            entry = manifest["documents"][doc["key"]]
+            if entry.get("duplicate_of") or "simhash" not in entry:
+                continue
+            document_index = document_indexes.setdefault(entry["state"], SimHashIndex(self.dedup_distance))
+            document_index.add(int(entry["simhash"], 16), doc["key"])
+            chunk_index = chunk_indexes.setdefault(entry["state"], SimHashIndex(self.dedup_distance))
+            for fingerprint in entry.get("chunk_simhashes", []):
+                chunk_index.add(int(fingerprint, 16), doc["key"])
+        return document_indexes, chunk_indexes
+
+    def _write_canonical_sources(self, manifest: Dict[str, Any]) -> None:
+        """Record which source each dropped page or repeated block should be cited as"""
+        documents = manifest["documents"]
+
+        def source(key: str) -> str:
+            return documents.get(key, {}).get("source", key)
+
+        mapping = {
+            "documents": {
+                source(key): source(entry["duplicate_of"])
+                for key, entry in sorted(documents.items()) if entry.get("duplicate_of")
+            },
+            "chunks": {
+                source(key): [source(canonical) for canonical in entry["depends_on"]]
+                for key, entry in sorted(documents.items())
+                if entry.get("depends_on") and not entry.get("duplicate_of")
+            }
+        }
+        tmp_path = self.canonical_sources_path.with_suffix(".json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(mapping, f, indent=2)
+        os.replace(tmp_path, self.canonical_sources_path)
+
+    def build(self, full: bool = False) -> Dict[str, int]:
+        """Bring the corpus and index up to date with the mirror.
+
+        Chunks stream from the extractor straight into the new corpus
+        and are embedded in batches, so only one batch is held in memory.
+        """
+        manifest = self._empty_manifest() if full else self.load_manifest()
+        incremental = bool(manifest["documents"])
+        store = (
+            FaissVectorStore.load(str(self._snapshot_dir() / INDEX_FILENAME))
+            if incremental else FaissVectorStore()
+        )
+        changes = self.diff(manifest)
+        self._expand_dependents(manifest, changes)
+
+        # Drop vectors and corpus rows for documents that changed or disappeared
+        stale_keys = changes["removed"] + [doc["key"] for doc in changes["changed"]]
+        stale_ids = set()
+        for key in stale_keys:
+            stale_ids.update(manifest["documents"].get(key, {}).get("chunk_ids", []))
+        if incremental:
+            # Ids no manifest document owns were left by a build that failed
+            # part way; drop them and never hand their ids out again
+            owned_ids = {i for entry in manifest["documents"].values() for i in entry.get("chunk_ids", [])}
+            seen_ids = set(store.ids()) | {r["id"] for r in self._iter_base_corpus(incremental) if "id" in r}
+            stale_ids.update(seen_ids - owned_ids)
+            manifest["next_id"] = max([manifest["next_id"]] + [i + 1 for i in seen_ids])
+        removed_vectors = store.remove(sorted(stale_ids))
+        for key in changes["removed"]:
+            manifest["documents"].pop(key, None)
+
+        document_indexes, chunk_indexes = self._dedup_indexes(manifest, changes)
+        duplicate_documents = duplicate_chunks = 0
+        pending: List[Dict[str, Any]] = []
+        embedded = 0
+
+        def embed_pending():
+            nonlocal embedded
+            if pending:
+                vectors = self.embeddings.embed_documents([record["text"] for record in pending])
+                store.add([record["id"] for record in pending], vectors)
+                embedded += len(pending)
+                pending.clear()
+
+        out = ColumnarCorpusWriter(str(self.corpus_dir))
+        try:
+            # Rows without an id were not produced by this builder and are kept as-is
+            for record in self._iter_base_corpus(incremental):
+                if record.get("id") not in stale_ids and (incremental or "id" not in record):
+                    out.add(record)
+
+            if changes["changed"]:
+                logger.info(f"Embedding chunks from {len(changes['changed'])} documents")
+            for doc in changes["changed"]:
+                entry = manifest["documents"][doc["key"]] = {
+                    "sha256": doc["sha256"],
+                    "size": doc["size"],
+                    "mtime": doc["mtime"],
+                    "state": doc["state"],
+                    "source": doc["source"],
+                    "chunk_ids": [],
+                    "chunk_simhashes": [],
+                    "depends_on": []
+                }
+                if self.dedup_distance is not None:
+                    document_index = document_indexes.setdefault(doc["state"], SimHashIndex(self.dedup_distance))
+                    # A cheap extraction pass decides before anything is embedded
+                    hasher = SimHasher()
+                    for segment in iter_text(doc["path"]):
+                        hasher.update(segment)
+                    fingerprint = hasher.digest()
+                    entry["simhash"] = format(fingerprint, "016x")
+                    canonical = document_index.find(fingerprint)
+                    if canonical is not None:
+                        logger.info(f"{doc['key']} duplicates {canonical}, skipping")
+                        entry["duplicate_of"] = canonical
+                        entry["depends_on"] = [canonical]
+                        duplicate_documents += 1
+                        continue
+                    document_index.add(fingerprint, doc["key"])
+
+                chunk_index = chunk_indexes.setdefault(doc["state"], SimHashIndex(self.dedup_distance or 0))
+                depends_on = set()
+                for chunk in iter_chunks(iter_text(doc["path"]), self.chunk_size, self.chunk_overlap):
+                    if self.dedup_distance is not None:
+                        fingerprint = simhash(chunk)
+                        canonical = chunk_index.find(fingerprint)
+                        if canonical is not None:
+                            if canonical != doc["key"]:
+                                depends_on.add(canonical)
+                            duplicate_chunks += 1
+                            continue
+                        chunk_index.add(fingerprint, doc["key"])
+                        entry["chunk_simhashes"].append(format(fingerprint, "016x"))
+                    record = {
+                        "id": manifest["next_id"],
+                        "text": chunk,
+                        "source": doc["source"],
+                        "category": "regulation",
+                        "state": doc["state"]
+                    }
+                    manifest["next_id"] += 1
+                    entry["chunk_ids"].append(record["id"])
+                    out.add(record)
+                    pending.append(record)
+                    if len(pending) >= EMBED_BATCH_SIZE:
+                        embed_pending()
+                entry["depends_on"] = sorted(depends_on)
+            embed_pending()
+        except BaseException:
+            out.abort()
+            raise
+
+        stats = {
+            "changed_documents": len(changes["changed"]),
+            "unchanged_documents": len(changes["unchanged"]),
+            "removed_documents": len(changes["removed"]),
+            "embedded_chunks": embedded,
+            "duplicate_documents": duplicate_documents,
+            "duplicate_chunks": duplicate_chunks,
+            "removed_vectors": removed_vectors,
+            "total_vectors": len(store)
+        }
+        if not embedded and not stale_ids and incremental and not changes["changed"]:
+            out.abort()
+            logger.info("Knowledge base already up to date")
+            return stats
+
+        # rag/corpus is only replaced once the snapshot holding next_id is live
+        try:
+            if store.index is not None:
+                version = self.publish(store, manifest, stats, ColumnarCorpus(out.finish()))
+                logger.info(f"Published index version {version}")
+        except BaseException:
+            out.abort()
+            raise
+        out.commit()
+        self._write_canonical_sources(manifest)
+
+        logger.info(f"Knowledge base build complete: {stats}")
+        return stats
+
+    def publish(self, store: FaissVectorStore, manifest: Dict[str, Any], stats: Dict[str, int],
+                corpus: Optional[Iterable[Dict[str, Any]]] = None) -> str:
+        """Write a complete snapshot directory, then flip the CURRENT pointer to it.
+
+        Running agents pick the new version up on their next reload check; a
+        build that fails before the flip leaves the previous version live.
+        corpus is the build's staged corpus; it defaults to rag/corpus.
+        """
+        version = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+        snapshot_dir = self._snapshot_dir(version)
+        snapshot_dir.mkdir(parents=True, exist_ok=True)
+
+        store.save(str(snapshot_dir / INDEX_FILENAME))
+        # One pass over the corpus writes the docstore and feeds each shard's postings
+        shard_ids: Dict[str, List[int]] = {}
+        lexical: Dict[str, BM25Builder] = {}
+        docstore = ColumnarCorpusWriter(str(snapshot_dir / DOCSTORE_DIRNAME))
+        for record in self._iter_corpus() if corpus is None else corpus:
+            if "id" not in record:
+                continue
+            docstore.add(record)
+            key = shard_key(record)
+            shard_ids.setdefault(key, []).append(record["id"])
+            lexical.setdefault(key, BM25Builder()).add(record["id"], record["text"])
+        docstore.commit()
+
+        # Readers search per-jurisdiction shards; the full index stays as the
+        # base for the next incremental build
+        for key, ids in sorted(shard_ids.items()):
+            shard_dir = snapshot_dir / SHARDS_DIRNAME / key
+            store.subset(ids).save(str(shard_dir / INDEX_FILENAME))
+            lexical[key].build().save(str(shard_dir / BM25_DIRNAME))
+
+        manifest["version"] = version
+        manifest["last_build"] = datetime.now().isoformat()
+        manifest["stats"] = stats
+        with open(snapshot_dir / "manifest.json", "w") as f:
+            json.dump(manifest, f, indent=2)
+
+        publish_version(str(self.index_dir), version)
+        return version
+
+
+def main():
+    """Main function"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Incrementally rebuild the RAG knowledge base")
+    parser.add_argument("--full", action="store_true", help="Ignore the manifest and re-embed everything")
+    args = parser.parse_args()
+
+    stats = KnowledgeBaseBuilder().build(full=args.full)
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
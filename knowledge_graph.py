@@ -0,0 +1,440 @@
+"""
+Compliance Knowledge Graph
+Parses the Turtle ontology in rag/knowledge_base.ttl once into a compact,
+subject/predicate/object-indexed in-memory triple store, with a binary
+snapshot so later startups skip parsing entirely
+"""
+
+import os
+import re
+import pickle
+import hashlib
+from array import array
+from collections import defaultdict
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Set, Tuple, Union
+
+
+class Literal(NamedTuple):
+    """An RDF literal; resources are plain prefixed-name strings"""
+    value: Any
+    datatype: str = ""
+
+
+Term = Union[str, Literal, Tuple[Any, ...]]
+Triple = Tuple[str, str, Term]
+
+RDF_TYPE = "rdf:type"
+
+_TOKEN_PATTERN = re.compile(r"""
+    (?P<ws>\s+|\#[^\n]*)
+  | (?P<iri><[^>]*>)
+  | (?P<string>"(?:[^"\\]|\\.)*")
+  | (?P<datatype>\^\^)
+  | (?P<lang>@[a-zA-Z]+(?:-[a-zA-Z0-9]+)*)
+  | (?P<number>[+-]?\d+(?:\.\d+)?)
+  | (?P<punct>[.;,()\[\]])
+  | (?P<name>[A-Za-z_][\w.-]*:[\w.-]*|:[\w.-]*|[A-Za-z_][\w-]*)
+""", re.VERBOSE)
+
+
+_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", '"': '"', "'": "'", "\\": "\\"}
+
+
+def _unescape(text: str) -> str:
+    return re.sub(r"\\(.)", lambda m: _ESCAPES.get(m.group(1), m.group(1)), text)
+
+
+def _tokenize(text: str) -> List[Tuple[str, str]]:
+    tokens = []
+    position = 0
+    while position < len(text):
+        match = _TOKEN_PATTERN.match(text, position)
+        if not match:
+            raise ValueError(f"Unexpected Turtle syntax at offset {position}: {text[position:position + 30]!r}")
+        position = match.end()
+        kind = match.lastgroup
+        if kind == "ws":
+            continue
+        value = match.group(kind)
+        # Prefixed names may not end with '.', which is the statement terminator
+        if kind == "name" and value.endswith(".") and not value.endswith(":."):
+            tokens.append((kind, value[:-1]))
+            tokens.append(("punct", "."))
+            continue
+        tokens.append((kind, value))
+    return tokens
+
+
+class _TurtleParser:
+    """Recursive-descent parser for the Turtle subset used by the knowledge base"""
+
+    def __init__(self, text: str):
+        self.tokens = _tokenize(text)
+        self.position = 0
+        self.prefixes: Dict[str, str] = {}
+        self.blank_nodes = 0
+
+    def _peek(self) -> Tuple[str, str]:
+        return self.tokens[self.position] if self.position < len(self.tokens) else ("eof", "")
+
+    def _next(self) -> Tuple[str, str]:
+        token = self._peek()
+        self.position += 1
+        return token
+
+    def _expect(self, value: str):
+        kind, token = self._next()
+        if token != value:
+            raise ValueError(f"Expected {value!r} in Turtle, found {token!r}")
+
+    def parse(self) -> Iterator[Triple]:
+        while self._peek()[0] != "eof":
+            kind, value = self._peek()
+            if kind == "lang" and value in ("@prefix", "@base"):
+                self._next()
+                if value == "@prefix":
+                    _, prefix = self._next()
+                    _, iri = self._next()
+                    self.prefixes[prefix.rstrip(":")] = iri[1:-1]
+                else:
+                    self._next()
+                self._expect(".")
+                continue
+            subject = self._resource()
+            yield from self._predicate_objects(subject)
+            self._expect(".")
+
+    def _resource(self) -> str:
+        kind, value = self._next()
+        if kind == "iri":
+            return value[1:-1]
+        if kind == "name":
+            return RDF_TYPE if value == "a" else value
+        raise ValueError(f"Expected a resource in Turtle, found {value!r}")
+
+    def _predicate_objects(self, subject: str) -> Iterator[Triple]:
+        while True:
+            predicate = self._resource()
+            while True:
+                obj, nested = self._object()
+                yield from nested
+                yield (subject, predicate, obj)
+                if self._peek()[1] != ",":
+                    break
+                self._next()
+            if self._peek()[1] != ";":
+                return
+            self._next()
+            # A trailing ';' before the terminator is allowed
+            if self._peek()[1] in (".", "]"):
+                return
+
+    def _object(self) -> Tuple[Term, List[Triple]]:
+        kind, value = self._peek()
+        if value == "(":
+            self._next()
+            items, nested = [], []
+            while self._peek()[1] != ")":
+                item, item_nested = self._object()
+                items.append(item)
+                nested.extend(item_nested)
+            self._next()
+            return tuple(items), nested
+        if value == "[":
+            self._next()
+            self.blank_nodes += 1
+            node = f"_:b{self.blank_nodes}"
+            nested = list(self._predicate_objects(node)) if self._peek()[1] != "]" else []
+            self._expect("]")
+            return node, nested
+        if kind == "string":
+            self._next()
+            text = _unescape(value[1:-1])
+            if self._peek()[0] == "datatype":
+                self._next()
+                return Literal(text, self._resource()), []
+            if self._peek()[0] == "lang":
+                self._next()
+            return Literal(text), []
+        if kind == "number":
+            self._next()
+            number = float(value) if "." in value else int(value)
+            return Literal(number, "xsd:decimal" if "." in value else "xsd:integer"), []
+        if kind == "name" and value in ("true", "false"):
+            self._next()
+            return Literal(value == "true", "xsd:boolean"), []
+        return self._resource(), []
+
+
+def parse_turtle(text: str) -> Iterator[Triple]:
+    """Yield (subject, predicate, object) triples from Turtle text.
+
+    Resources keep their prefixed form (e.g. "compliance:CaliforniaDCC"),
+    literals are Literal tuples and RDF collections become Python tuples.
+    """
+    return _TurtleParser(text).parse()
+
+
+def load_triples(path: str) -> List[Triple]:
+    """Parse a Turtle file into a list of triples"""
+    with open(path, "r") as f:
+        return list(parse_turtle(f.read()))
+
+
+SNAPSHOT_VERSION = 1
+
+
+def snapshot_path(ttl_path: str) -> str:
+    """rag/knowledge_base.ttl -> rag/knowledge_base.graph.pickle"""
+    return os.path.splitext(ttl_path)[0] + ".graph.pickle"
+
+
+class KnowledgeGraph:
+    """Interned triple store with SPO, POS and OSP indexes.
+
+    Every term is stored once and referred to by an integer id; each index
+    maps two ids to the set of third ids, so any pattern with at least one
+    bound position is answered with dictionary lookups. A word index over
+    resource names and labels lets answer() start from the matching nodes.
+    """
+
+    def __init__(self, triples: Optional[List[Triple]] = None):
+        self.terms: List[Term] = []
+        self.term_ids: Dict[Term, int] = {}
+        self.triples = array("I")
+        self._reset_indexes()
+        for triple in triples or []:
+            self.add(*triple)
+
+    def _reset_indexes(self):
+        self.spo: Dict[int, Dict[int, Set[int]]] = defaultdict(lambda: defaultdict(set))
+        self.pos: Dict[int, Dict[int, Set[int]]] = defaultdict(lambda: defaultdict(set))
+        self.osp: Dict[int, Dict[int, Set[int]]] = defaultdict(lambda: defaultdict(set))
+        # Words of each resource's name and rdfs:label, and the resources for each word
+        self.node_words: Dict[int, Set[str]] = {}
+        self.word_nodes: Dict[str, Set[int]] = defaultdict(set)
+
+    def _intern(self, term: Term) -> int:
+        term_id = self.term_ids.get(term)
+        if term_id is None:
+            term_id = len(self.terms)
+            self.terms.append(term)
+            self.term_ids[term] = term_id
+        return term_id
+
+    def _index(self, s: int, p: int, o: int):
+        self.spo[s][p].add(o)
+        self.pos[p][o].add(s)
+        self.osp[o][s].add(p)
+        for term_id in (s, p, o):
+            if term_id not in self.node_words and isinstance(self.terms[term_id], str):
+                self._index_words(term_id, humanize(self.terms[term_id]))
+        label = self.terms[o]
+        if self.terms[p] == "rdfs:label" and isinstance(label, Literal) and isinstance(label.value, str):
+            self._index_words(s, label.value)
+
+    def _index_words(self, term_id: int, text: str):
+        words = self.node_words.setdefault(term_id, set())
+        for word in _words(text):
+            words.add(word)
+            self.word_nodes[word].add(term_id)
+
+    def add(self, subject: str, predicate: str, obj: Term):
+        s, p, o = self._intern(subject), self._intern(predicate), self._intern(obj)
+        if o in self.spo.get(s, {}).get(p, ()):
+            return
+        self.triples.extend((s, p, o))
+        self._index(s, p, o)
+
+    def __len__(self) -> int:
+        return len(self.triples) // 3
+
+    def match(self, subject: Optional[str] = None, predicate: Optional[str] = None,
+              obj: Optional[Term] = None) -> Iterator[Triple]:
+        """Yield triples matching a pattern; None is a wildcard"""
+        ids = []
+        for term in (subject, predicate, obj):
+            if term is None:
+                ids.append(None)
+            elif term in self.term_ids:
+                ids.append(self.term_ids[term])
+            else:
+                return
+        s, p, o = ids
+        terms = self.terms
+
+        if s is not None:
+            for p_id, objects in self.spo.get(s, {}).items():
+                if p is not None and p_id != p:
+                    continue
+                if o is None:
+                    for o_id in objects:
+                        yield terms[s], terms[p_id], terms[o_id]
+                elif o in objects:
+                    yield terms[s], terms[p_id], terms[o]
+        elif p is not None:
+            for o_id, subjects in self.pos.get(p, {}).items():
+                if o is not None and o_id != o:
+                    continue
+                for s_id in subjects:
+                    yield terms[s_id], terms[p], terms[o_id]
+        elif o is not None:
+            for s_id, predicates in self.osp.get(o, {}).items():
+                for p_id in predicates:
+                    yield terms[s_id], terms[p_id], terms[o]
+        else:
+            for i in range(0, len(self.triples), 3):
+                yield terms[self.triples[i]], terms[self.triples[i + 1]], terms[self.triples[i + 2]]
+
+    def subjects(self, predicate: str, obj: Term) -> List[str]:
+        return [s for s, _, _ in self.match(None, predicate, obj)]
+
+    def objects(self, subject: str, predicate: str) -> List[Term]:
+        return [o for _, _, o in self.match(subject, predicate, None)]
+
+    def properties(self, subject: str) -> Dict[str, List[Term]]:
+        result: Dict[str, List[Term]] = {}
+        for _, predicate, obj in self.match(subject, None, None):
+            result.setdefault(predicate, []).append(obj)
+        return result
+
+    def value(self, subject: str, predicate: str) -> Any:
+        """First object of a property, unwrapping literals"""
+        objects = self.objects(subject, predicate)
+        if not objects:
+            return None
+        return objects[0].value if isinstance(objects[0], Literal) else objects[0]
+
+    def label(self, subject: str) -> str:
+        label = self.value(subject, "rdfs:label")
+        return label if isinstance(label, str) else humanize(subject)
+
+    def instances(self, rdf_class: str) -> List[str]:
+        return self.subjects(RDF_TYPE, rdf_class)
+
+    def save_snapshot(self, path: str, source_hash: str):
+        """Persist terms and the packed triple array; indexes are rebuilt on load"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump({
+                "version": SNAPSHOT_VERSION,
+                "source_hash": source_hash,
+                "terms": self.terms,
+                "triples": self.triples.tobytes()
+            }, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def from_snapshot(cls, data: Dict[str, Any]) -> "KnowledgeGraph":
+        graph = cls()
+        graph.terms = data["terms"]
+        graph.term_ids = {term: i for i, term in enumerate(graph.terms)}
+        graph.triples.frombytes(data["triples"])
+        for i in range(0, len(graph.triples), 3):
+            graph._index(graph.triples[i], graph.triples[i + 1], graph.triples[i + 2])
+        return graph
+
+    @classmethod
+    def load(cls, ttl_path: str, snapshot_path: Optional[str] = None) -> "KnowledgeGraph":
+        """Load from the snapshot when it matches the Turtle file, else parse and snapshot"""
+        with open(ttl_path, "rb") as f:
+            source = f.read()
+        source_hash = hashlib.sha256(source).hexdigest()
+
+        if snapshot_path and os.path.exists(snapshot_path):
+            try:
+                with open(snapshot_path, "rb") as f:
+                    data = pickle.load(f)
+                if data.get("version") == SNAPSHOT_VERSION and data.get("source_hash") == source_hash:
+                    return cls.from_snapshot(data)
+            except Exception as e:
+                print(f"Warning: Ignoring unreadable graph snapshot {snapshot_path}: {e}")
+
+        graph = cls(list(parse_turtle(source.decode("utf-8"))))
+        if snapshot_path:
+            try:
+                graph.save_snapshot(snapshot_path, source_hash)
+            except OSError as e:
+                print(f"Warning: Could not write graph snapshot {snapshot_path}: {e}")
+        return graph
+
+    def answer(self, question: str) -> str:
+        """Answer a structured question such as "which license types require water rights".
+
+        The question is matched against class labels (e.g. "license types"),
+        boolean properties (e.g. "requires water rights") and entity labels.
+        """
+        words = _words(question)
+        words |= {word[:-1] for word in words if word.endswith("s")}
+        type_id = self.term_ids.get(RDF_TYPE)
+        if type_id is None:
+            return "No matching entities in the compliance knowledge graph"
+        terms = self.terms
+
+        def overlap(text: str) -> int:
+            return len(words & _words(text))
+
+        # Only resources sharing a word with the question are considered
+        candidates = sorted(set().union(*(self.word_nodes.get(word, ()) for word in words)))
+        class_members = self.pos.get(type_id, {})
+
+        classes = [c for c in candidates if c in class_members]
+        target_class = max(classes, key=lambda c: (overlap(humanize(terms[c])), -len(terms[c])), default=None)
+        if target_class is not None and overlap(humanize(terms[target_class])) == 0:
+            target_class = None
+
+        # Boolean properties read as "requires <something>"
+        true_id = self.term_ids.get(Literal(True, "xsd:boolean"))
+        false_id = self.term_ids.get(Literal(False, "xsd:boolean"))
+        flags = [
+            p for p in candidates
+            if true_id in self.pos.get(p, {}) or false_id in self.pos.get(p, {})
+        ]
+        best_flag = max(flags, key=lambda p: overlap(humanize(terms[p])), default=None)
+        if best_flag is not None and overlap(humanize(terms[best_flag])) > 0:
+            subjects = self.pos[best_flag].get(true_id, set())
+            if target_class is not None:
+                subjects = {s for s in subjects if target_class in self.spo[s].get(type_id, ())}
+            if subjects:
+                lines = sorted(f"{self.label(terms[s])} ({terms[s]})" for s in subjects)
+                return f"Entities with {humanize(terms[best_flag])}:\n" + "\n".join(f"  - {line}" for line in lines)
+
+        # Otherwise describe the best matching entity, or list a class
+        entities = [s for s in candidates if type_id in self.spo.get(s, {})]
+        best_entity = max(entities, key=lambda s: len(words & self.node_words[s]), default=None)
+        if best_entity is not None and len(words & self.node_words[best_entity]) >= 2:
+            return self.describe(terms[best_entity])
+        if target_class is not None:
+            members = sorted(terms[s] for s in class_members[target_class])
+            return f"{humanize(terms[target_class]).title()} ({len(members)}):\n" + \
+                "\n".join(f"  - {self.label(s)} ({s})" for s in members)
+        return "No matching entities in the compliance knowledge graph"
+
+    def describe(self, subject: str) -> str:
+        """Render every property of an entity"""
+        lines = [f"{self.label(subject)} ({subject})"]
+        for predicate, objects in sorted(self.properties(subject).items()):
+            if predicate == "rdfs:label":
+                continue
+            rendered = []
+            for obj in objects:
+                if isinstance(obj, Literal):
+                    rendered.append(str(obj.value))
+                elif isinstance(obj, tuple):
+                    rendered.append("; ".join(
+                        str(item.value) if isinstance(item, Literal) else self.label(item) for item in obj
+                    ))
+                else:
+                    rendered.append(self.label(obj))
+            lines.append(f"  {humanize(predicate)}: {', '.join(rendered)}")
+        return "\n".join(lines)
+
+
+def _words(text: str) -> Set[str]:
+    return set(re.findall(r"[a-z]+", text.lower()))
+
+
+def humanize(name: str) -> str:
+    """compliance:requiresWaterRights -> requires water rights"""
+    local = name.split(":")[-1]
+    return re.sub(r"(?<!^)(?=[A-Z])", " ", local).lower().strip()
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Structured Regulation Store
+Per-state compliance requirements (licensing, testing, tracking, security,
+labeling) built from the regulation mirror and rag/knowledge_base.ttl,
+indexed by state code and category for constant-time lookup
+"""
+
+import os
+import re
+import json
+import logging
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from jurisdictions import STATE_NAMES
+from knowledge_graph import KnowledgeGraph, Literal, snapshot_path
+
+logger = logging.getLogger(__name__)
+
+GENERAL = "GENERAL"
+
+# Keywords that place a requirement in a category
+CATEGORY_KEYWORDS: Dict[str, List[str]] = {
+    "licensing": ["license", "licensing", "licensee", "permit", "application", "renewal"],
+    "testing": ["testing", "tested", "laboratory", "lab test", "potency", "pesticide", "contaminant"],
+    "tracking": ["track-and-trace", "track and trace", "seed-to-sale", "metrc", "inventory tracking", "manifest"],
+    "security": ["security", "surveillance", "camera", "alarm", "transport", "vault"],
+    "labeling": ["label", "labeling", "packaging", "warning", "advertising", "marketing", "universal symbol"]
+}
+CATEGORIES = list(CATEGORY_KEYWORDS)
+
+MAX_FACTS_PER_CATEGORY = 8
+# Bumped when mining changes; stores saved by older code are rebuilt by the daily update
+STORE_FORMAT = 2
+
+# A mined sentence must state an obligation or cite a provision to count as a requirement
+_REQUIREMENT = re.compile(
+    r"\b(?:must|shall|required|requires|prohibited|prohibits|may not|not permitted|mandatory)\b"
+    r"|§|\b(?:section|sec\.|rule|article|chapter|ccr|oar|cfr|rcw|ncac)\s*\d",
+    re.I
+)
+# Site chrome that survives extraction (browser banners, calls to action)
+_WEB_CHROME = re.compile(
+    r"\b(?:browser|websites?|web site|click|javascript|cookies?|subscribe|sign up|log in|skip to|"
+    r"learn more|read more|view the)\b",
+    re.I
+)
+
+
+def detect_categories(text: str) -> List[str]:
+    """Return the requirement categories a question or passage touches"""
+    lowered = text.lower()
+    return [
+        category for category, keywords in CATEGORY_KEYWORDS.items()
+        if any(keyword in lowered for keyword in keywords)
+    ]
+
+
+def _humanize(name: str) -> str:
+    """compliance:requiresWaterRights -> water rights"""
+    local = name.split(":")[-1]
+    local = re.sub(r"^requires", "", local)
+    return re.sub(r"(?<!^)(?=[A-Z])", " ", local).lower().strip()
+
+
+def _is_prose(sentence: str) -> bool:
+    """Reject menu text, which is mostly Title Case words strung together"""
+    words = sentence.split()
+    return sum(1 for word in words if word[:1].islower()) >= len(words) / 2
+
+
+def is_requirement(sentence: str) -> bool:
+    """Whether a mined sentence reads as a regulatory requirement rather than page text"""
+    return (40 <= len(sentence) <= 300 and _is_prose(sentence) and not _WEB_CHROME.search(sentence)
+            and bool(_REQUIREMENT.search(sentence)))
+
+
+class RegulationStore:
+    """State code -> category -> facts, plus per-state agency details"""
+
+    def __init__(self, states: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.states: Dict[str, Dict[str, Any]] = states or {}
+
+    def _state(self, code: str) -> Dict[str, Any]:
+        if code not in self.states:
+            self.states[code] = {
+                "name": "All jurisdictions" if code == GENERAL else STATE_NAMES.get(code, code.title()),
+                "agency": None,
+                "website": None,
+                "last_updated": None,
+                "categories": {category: [] for category in CATEGORIES}
+            }
+        return self.states[code]
+
+    def add_fact(self, code: str, category: str, fact: str, source: str):
+        facts = self._state(code)["categories"][category]
+        if len(facts) < MAX_FACTS_PER_CATEGORY and all(existing["fact"] != fact for existing in facts):
+            facts.append({"fact": fact, "source": source})
+
+    def lookup(self, code: str, category: Optional[str] = None) -> Dict[str, Any]:
+        """Return a state's record, or only one category's facts"""
+        record = self.states.get(code.upper(), {})
+        if category is None:
+            return record
+        return {category: record.get("categories", {}).get(category, [])}
+
+    @classmethod
+    def build(cls, regulations_dir: str = "regulations",
+              ttl_path: str = os.path.join("rag", "knowledge_base.ttl")) -> "RegulationStore":
+        """Build the store from mirror metadata, mirrored pages and the ontology"""
+        store = cls()
+        store._ingest_ontology(ttl_path)
+        store._ingest_mirror(Path(regulations_dir))
+        return store
+
+    def _ingest_ontology(self, ttl_path: str):
+        if not os.path.exists(ttl_path):
+            return
+        graph = KnowledgeGraph.load(ttl_path, snapshot_path(ttl_path))
+        value, label = graph.value, graph.label
+
+        # Regulatory bodies anchor everything else to a state
+        body_states = {}
+        codes_by_name = {name.lower(): code for code, name in STATE_NAMES.items()}
+        for subject in graph.instances("compliance:RegulatoryBody"):
+            code = codes_by_name.get(str(value(subject, "compliance:jurisdiction")).lower())
+            if code is None:
+                continue
+            body_states[subject] = code
+            state = self._state(code)
+            state["agency"] = state["agency"] or label(subject)
+            state["website"] = state["website"] or value(subject, "compliance:website")
+
+        for subject in sorted(graph.instances("compliance:LicenseType")):
+            source = f"knowledge_base.ttl#{subject}"
+            code = body_states.get(value(subject, "compliance:issuedBy"), GENERAL)
+            requirements = [
+                _humanize(predicate) for predicate, objects in graph.properties(subject).items()
+                if predicate.startswith("compliance:requires") and Literal(True, "xsd:boolean") in objects
+            ]
+            self.add_fact(code, "licensing", f"{label(subject)} requires: {', '.join(requirements)}", source)
+            if any("track" in requirement for requirement in requirements):
+                self.add_fact(code, "tracking", f"{label(subject)} holders must use track-and-trace", source)
+            if any("security" in requirement for requirement in requirements):
+                self.add_fact(code, "security", f"{label(subject)} requires an approved security plan", source)
+
+        subjects = graph.instances("compliance:Requirement") + graph.instances("compliance:Restriction")
+        for subject in sorted(set(subjects)):
+            source = f"knowledge_base.ttl#{subject}"
+            name = label(subject)
+            for predicate, objects in graph.properties(subject).items():
+                for obj in objects:
+                    # Literals are NamedTuples too; only RDF collections are lists of items
+                    if not isinstance(obj, tuple) or isinstance(obj, Literal):
+                        continue
+                    items = [item.value if isinstance(item, Literal) else label(item) for item in obj]
+                    fact = f"{name} - {_humanize(predicate)}: {'; '.join(items)}"
+                    for category in detect_categories(f"{name} {predicate}") or ["licensing"]:
+                        self.add_fact(GENERAL, category, fact, source)
+
+    def _ingest_mirror(self, regulations_dir: Path):
+        if not regulations_dir.exists():
+            return
+        # Imported here so loading a prebuilt store needs no extraction dependencies
+        from extract_regulations import is_content_file, iter_text
+
+        for state_dir in sorted(p for p in regulations_dir.iterdir() if p.is_dir()):
+            code = state_dir.name.upper()
+            metadata_path = state_dir / "metadata.json"
+            if metadata_path.exists():
+                with open(metadata_path, "r") as f:
+                    metadata = json.load(f)
+                state = self._state(code)
+                state["agency"] = metadata.get("agency") or state["agency"]
+                state["website"] = metadata.get("main_url") or state["website"]
+                state["last_updated"] = metadata.get("last_updated")
+
+            for path in sorted(state_dir.iterdir()):
+                if not path.is_file() or not is_content_file(path):
+                    continue
+                source = path.relative_to(regulations_dir).as_posix()
+                for segment in iter_text(path):
+                    for sentence in re.split(r"(?<=[.!?])\s+", segment):
+                        sentence = sentence.strip()
+                        # A category with no real requirement stays empty rather than holding page text
+                        if not is_requirement(sentence):
+                            continue
+                        for category in detect_categories(sentence):
+                            self.add_fact(code, category, sentence, source)
+
+    def save(self, path: str):
+        """Write atomically through a private temp file, so concurrent writers never mix"""
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".state_requirements.", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({"format": STORE_FORMAT, "built": datetime.now().isoformat(), "states": self.states},
+                          f, indent=2)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> "RegulationStore":
+        with open(path, "r") as f:
+            data = json.load(f)
+        if data.get("format") != STORE_FORMAT:
+            raise ValueError(f"format {data.get('format')} is not {STORE_FORMAT}")
+        return cls(data["states"])
+
+    @classmethod
+    def load_or_empty(cls, agent_path: str = ".") -> "RegulationStore":
+        """Load rag/state_requirements.json, or an empty store if it is missing, unreadable or outdated.
+
+        Serving processes never mine the mirror themselves; the store is
+        (re)built by update_regulations_daily.py or by running this module.
+        """
+        path = os.path.join(agent_path, "rag", "state_requirements.json")
+        try:
+            return cls.load(path)
+        except FileNotFoundError:
+            logger.warning(f"{path} not found; run regulation_store.py to build it")
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Could not read {path} ({e}); run regulation_store.py to rebuild it")
+        return cls()
+
+    def format(self, code: str, categories: Optional[List[str]] = None) -> str:
+        """Render a state's requirements for the agent"""
+        record = self.states.get(code)
+        if record is None:
+            return f"No structured requirements on file for {code}"
+        lines = [f"{record['name']} ({code})"]
+        if record.get("agency"):
+            lines.append(f"Regulator: {record['agency']}" + (f" - {record['website']}" if record.get("website") else ""))
+        for category in categories or CATEGORIES:
+            facts = record["categories"].get(category, [])
+            if facts:
+                lines.append(f"{category.title()}:")
+                lines.extend(f"  - {fact['fact']} [{fact['source']}]" for fact in facts)
+            elif categories:
+                lines.append(f"{category.title()}: no requirements on file")
+        if record.get("last_updated"):
+            lines.append(f"Sources last mirrored: {record['last_updated']}")
+        return "\n".join(lines)
+
+
+def main():
+    """Rebuild rag/state_requirements.json"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    store = RegulationStore.build()
+    store.save(os.path.join("rag", "state_requirements.json"))
+    print(f"Saved requirements for {len(store.states)} jurisdictions to rag/state_requirements.json")
+
+
+if __name__ == "__main__":
+    main()
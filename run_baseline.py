@@ -1,20 +1,304 @@
-
 #!/usr/bin/env python3
 """
 Baseline Testing Script for Compliance Agent
-Runs questions from baseline.json against the agent and saves results
+Runs questions from baseline.json against the agent and saves results.
+With --retrieval-only it skips the LLM and scores what regulatory_search
+retrieves against each question's expected answer and states.
 """
 
+import os
+import re
+import sys
 import json
 import asyncio
+import argparse
 import time
 from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+# Add the base_agent module to Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(current_dir, "base_agent"))
+
 from agent import create_compliance_agent
+from jurisdictions import detect_jurisdictions
+from core.bm25 import tokenize
+
+# Words that introduce an expected answer's list of facts rather than being one
+_LEAD_IN = re.compile(r"^.{0,80}?\b(?:include|includes|including|requires|require|must be tested for|must include)\b\s*",
+                      re.I)
+_PHRASE_SPLIT = re.compile(r"[,;.]\s+|\s+(?:and|plus|with)\s+|[.;]$")
+# Share of a phrase's terms that must appear in the retrieved text to count it as found
+PHRASE_COVERAGE = 0.6
+
+def question_states(question_data: Dict[str, Any]) -> List[str]:
+    """Return the state codes a question applies to"""
+    states = question_data.get("state", [])
+    return [states] if isinstance(states, str) else list(states)
+
+def filter_questions(questions: List[Dict[str, Any]], categories: Optional[List[str]] = None,
+                     difficulties: Optional[List[str]] = None,
+                     states: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """Select baseline questions matching every given filter"""
+    selected = []
+    for question_data in questions:
+        if categories and question_data.get("category") not in categories:
+            continue
+        if difficulties and question_data.get("difficulty") not in difficulties:
+            continue
+        if states and not set(question_states(question_data)) & set(states):
+            continue
+        selected.append(question_data)
+    return selected
+
+def summarize(test_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Calculate summary statistics"""
+    total_tests = len(test_results)
+    passed_tests = sum(1 for r in test_results if r["passed"])
+    avg_score = sum(r["score"] for r in test_results) / total_tests if total_tests > 0 else 0
+    avg_response_time = sum(r["response_time"] for r in test_results) / total_tests if total_tests > 0 else 0
+
+    return {
+        "total_tests": total_tests,
+        "passed_tests": passed_tests,
+        "failed_tests": total_tests - passed_tests,
+        "pass_rate": round((passed_tests / total_tests) * 100, 1) if total_tests > 0 else 0,
+        "average_score": round(avg_score, 1),
+        "average_response_time": round(avg_response_time, 2)
+    }
+
+def save_results(results: Dict[str, Any], output_path: str):
+    """Write results atomically so a crash never leaves a truncated file"""
+    tmp_path = f"{output_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(results, f, indent=2)
+    os.replace(tmp_path, output_path)
+
+def expected_phrases(expected_answer: str) -> List[List[str]]:
+    """Split an expected answer into the facts it lists, each as its search terms"""
+    phrases = []
+    for sentence in re.split(r"(?<=\.)\s+", expected_answer):
+        for part in _PHRASE_SPLIT.split(_LEAD_IN.sub("", sentence)):
+            terms = tokenize(part)
+            if terms:
+                phrases.append(terms)
+    return phrases
+
+def phrase_found(terms: List[str], retrieved_terms: set) -> bool:
+    return sum(term in retrieved_terms for term in terms) >= PHRASE_COVERAGE * len(terms)
+
+def target_states(question_data: Dict[str, Any]) -> List[str]:
+    """States a question should retrieve from; MULTI questions name theirs in the text"""
+    states = [state for state in question_states(question_data) if state != "MULTI"]
+    return states or detect_jurisdictions(f"{question_data['question']} {question_data.get('expected_answer', '')}")
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))] if ordered else 0.0
 
-async def run_baseline_tests():
+def evaluate_retrieval(agent, question_data: Dict[str, Any], ks: List[int]) -> Dict[str, Any]:
+    """Recall of the expected answer's facts and state hits in the top k retrieved chunks"""
+    start_time = time.perf_counter()
+    hits = agent.search_regulations(question_data["question"], max(ks))
+    latency_ms = (time.perf_counter() - start_time) * 1000
+
+    phrases = expected_phrases(question_data.get("expected_answer", ""))
+    states = target_states(question_data)
+    recall, state_hit = {}, {}
+    for k in ks:
+        top = [record for record, _ in hits[:k]]
+        retrieved_terms = set(tokenize(" ".join(record["text"] for record in top)))
+        found = [phrase for phrase in phrases if phrase_found(phrase, retrieved_terms)]
+        recall[str(k)] = round(len(found) / len(phrases), 3) if phrases else 0.0
+        retrieved_states = {str(record.get("state", "")).upper() for record in top}
+        state_hit[str(k)] = {state: state in retrieved_states for state in states}
+
+    missed = [" ".join(phrase) for phrase in phrases if not phrase_found(
+        phrase, set(tokenize(" ".join(record["text"] for record, _ in hits[:max(ks)]))))]
+
+    # What the agent actually sees: regulatory_search's own candidates after context assembly
+    context_hits = agent.search_regulations(question_data["question"], agent.context_candidates())
+    context, citations = agent.build_context(question_data["question"], context_hits)
+    context_terms = set(tokenize(context))
+    context_found = [phrase for phrase in phrases if phrase_found(phrase, context_terms)]
+    return {
+        "id": question_data["id"],
+        "question": question_data["question"],
+        "category": question_data.get("category", "general"),
+        "states": states,
+        "recall": recall,
+        "state_hit": state_hit,
+        "missed_phrases": missed,
+        "sources": [{"source": record.get("source"), "state": record.get("state"), "score": round(score, 4)}
+                    for record, score in hits[:max(ks)]],
+        "latency_ms": round(latency_ms, 3),
+        "context": {
+            "tokens": agent.memory.count_tokens(context) if context else 0,
+            "retrieved_tokens": agent.memory.count_tokens(
+                " ".join(record["text"] for record, _ in context_hits)) if context_hits else 0,
+            "recall": round(len(context_found) / len(phrases), 3) if phrases else 0.0,
+            "citations": len(citations)
+        }
+    }
+
+def summarize_retrieval(results: List[Dict[str, Any]], ks: List[int]) -> Dict[str, Any]:
+    """Mean recall@k, state hit rates@k overall and per state, and latency percentiles"""
+    def mean(values: List[float]) -> float:
+        return round(sum(values) / len(values), 3) if values else 0.0
+
+    by_state: Dict[str, Dict[str, Any]] = {}
+    for result in results:
+        for state in result["states"]:
+            entry = by_state.setdefault(state, {"questions": 0, "hit_rate": {}, "recall": {}})
+            entry["questions"] += 1
+    for state, entry in by_state.items():
+        relevant = [r for r in results if state in r["states"]]
+        for k in map(str, ks):
+            entry["hit_rate"][k] = mean([float(r["state_hit"][k][state]) for r in relevant])
+            entry["recall"][k] = mean([r["recall"][k] for r in relevant])
+
+    by_category: Dict[str, Dict[str, float]] = {}
+    for category in sorted({r["category"] for r in results}):
+        relevant = [r for r in results if r["category"] == category]
+        by_category[category] = {k: mean([r["recall"][k] for r in relevant]) for k in map(str, ks)}
+
+    latencies = [r["latency_ms"] for r in results]
+    state_checks = {k: [hit for r in results for hit in r["state_hit"][k].values()] for k in map(str, ks)}
+    return {
+        "total_questions": len(results),
+        "recall_at_k": {k: mean([r["recall"][k] for r in results]) for k in map(str, ks)},
+        "state_hit_rate_at_k": {k: mean([float(hit) for hit in checks]) for k, checks in state_checks.items()},
+        "by_state": dict(sorted(by_state.items())),
+        "by_category": by_category,
+        "context": {
+            "mean_tokens": mean([r["context"]["tokens"] for r in results]),
+            "mean_retrieved_tokens": mean([r["context"]["retrieved_tokens"] for r in results]),
+            "recall": mean([r["context"]["recall"] for r in results])
+        },
+        "latency_ms": {
+            "mean": mean(latencies),
+            "p50": round(percentile(latencies, 50), 3),
+            "p95": round(percentile(latencies, 95), 3),
+            "max": round(max(latencies), 3) if latencies else 0.0
+        }
+    }
+
+def run_retrieval_eval(ks: List[int], categories: Optional[List[str]] = None,
+                       difficulties: Optional[List[str]] = None, states: Optional[List[str]] = None,
+                       output_path: str = 'retrieval_results.json', hybrid: bool = True):
+    """Score only the retrieval stage against baseline.json; no LLM calls"""
+    print("🔎 Starting retrieval-only evaluation for compliance agent...")
+    try:
+        with open('baseline.json', 'r') as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print("❌ baseline.json not found")
+        return
+
+    questions = filter_questions(baseline["questions"], categories, difficulties, states)
+    if not questions:
+        print("❌ No baseline questions match the given filters")
+        return
+
+    agent = create_compliance_agent()
+    if agent.retriever is None:
+        print("❌ No published index; run knowledge_base_builder.py first")
+        return
+    agent.retriever.hybrid = hybrid
+    # Map the index in before timing anything
+    agent.search_regulations(questions[0]["question"], max(ks))
+
+    suite_start = time.time()
+    results = [evaluate_retrieval(agent, question_data, ks) for question_data in questions]
+    output = {
+        "agent": baseline["agent"],
+        "mode": "retrieval",
+        "timestamp": datetime.now().isoformat(),
+        "corpus_version": agent.corpus_version(),
+        "filters": {"category": categories, "difficulty": difficulties, "state": states},
+        "k": ks,
+        "hybrid": hybrid,
+        "results": results,
+        "summary": summarize_retrieval(results, ks)
+    }
+    output["summary"]["wall_time"] = round(time.time() - suite_start, 2)
+    save_results(output, output_path)
+
+    summary = output["summary"]
+    print(f"\n📊 Retrieval Evaluation Complete ({summary['total_questions']} questions, "
+          f"{'hybrid' if hybrid else 'dense'} search, index {output['corpus_version']})")
+    for k in map(str, ks):
+        print(f"   Recall@{k}: {summary['recall_at_k'][k]:.3f}   State hit rate@{k}: {summary['state_hit_rate_at_k'][k]:.3f}")
+    print(f"\n   Per-state hit rate@{ks[-1]}:")
+    for state, entry in summary["by_state"].items():
+        print(f"     {state:<4} {entry['hit_rate'][str(ks[-1])]:.3f} ({entry['questions']} questions)")
+    context = summary["context"]
+    print(f"\n   Context: {context['mean_tokens']} tokens (from {context['mean_retrieved_tokens']} retrieved), "
+          f"recall {context['recall']:.3f}")
+    latency = summary["latency_ms"]
+    print(f"\n   Latency: mean {latency['mean']}ms, p50 {latency['p50']}ms, p95 {latency['p95']}ms, "
+          f"max {latency['max']}ms")
+    print(f"   Wall Time: {summary['wall_time']}s")
+    print(f"\n💾 Results saved to {output_path}")
+
+async def run_question(agent, question_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Run a single baseline question and score the response"""
+    start_time = time.time()
+
+    try:
+        # Process the question
+        result = await agent.process_query(
+            user_id=f"baseline_test_{question_data['id']}",
+            query=question_data["question"]
+        )
+
+        response_time = time.time() - start_time
+
+        # Simple scoring logic (can be enhanced)
+        response_text = result.get('response', '')
+        confidence = result.get('confidence', 0)
+
+        # Basic evaluation (replace with more sophisticated scoring)
+        score = 0
+        max_score = question_data.get("max_score", 10)
+        passed = False
+
+        if response_text and len(response_text) > 50:
+            score = min(max_score, int(confidence * max_score))
+            passed = score >= (max_score * 0.6)  # 60% threshold
+
+        return {
+            "id": question_data["id"],
+            "question": question_data["question"],
+            "response": response_text,
+            "score": score,
+            "max_score": max_score,
+            "confidence": confidence,
+            "response_time": round(response_time, 2),
+            "passed": passed,
+            "timestamp": datetime.now().isoformat()
+        }
+
+    except Exception as e:
+        print(f"   ❌ ERROR ({question_data['id']}): {str(e)}")
+        return {
+            "id": question_data["id"],
+            "question": question_data["question"],
+            "response": f"Error: {str(e)}",
+            "score": 0,
+            "max_score": question_data.get("max_score", 10),
+            "confidence": 0,
+            "response_time": 0,
+            "passed": False,
+            "timestamp": datetime.now().isoformat()
+        }
+
+async def run_baseline_tests(concurrency: int = 1, categories: Optional[List[str]] = None,
+                             difficulties: Optional[List[str]] = None, states: Optional[List[str]] = None,
+                             output_path: str = 'baseline_results.json'):
     """Run baseline tests and save results"""
     print("🧪 Starting baseline tests for compliance agent...")
-    
+
     # Load baseline questions
     try:
         with open('baseline.json', 'r') as f:
@@ -22,108 +306,66 @@ async def run_baseline_tests():
     except FileNotFoundError:
         print("❌ baseline.json not found")
         return
-    
+
+    questions = filter_questions(baseline["questions"], categories, difficulties, states)
+    if not questions:
+        print("❌ No baseline questions match the given filters")
+        return
+
     # Create agent
     agent = create_compliance_agent()
-    
+
     results = {
         "agent": baseline["agent"],
         "description": baseline["description"],
         "timestamp": datetime.now().isoformat(),
+        "filters": {"category": categories, "difficulty": difficulties, "state": states},
+        "concurrency": concurrency,
         "results": []
     }
-    
-    total_questions = len(baseline["questions"])
-    print(f"📝 Running {total_questions} baseline tests...")
-    
+
+    total_questions = len(questions)
+    print(f"📝 Running {total_questions} baseline tests (concurrency {concurrency})...")
+
     # Display question organization
     if "question_summary" in baseline:
         summary = baseline["question_summary"]
         print(f"\n📊 Question Organization:")
         print(f"   By Category: {summary.get('by_category', {})}")
         print(f"   By Difficulty: {summary.get('by_difficulty', {})}")
-    
-    for i, question_data in enumerate(baseline["questions"], 1):
-        category = question_data.get('category', 'general')
-        difficulty = question_data.get('difficulty', 'unknown')
-        print(f"\n[{i}/{total_questions}] Testing question {question_data['id']} ({category.title()} - {difficulty.title()})...")
-        
-        start_time = time.time()
-        
-        try:
-            # Process the question
-            result = await agent.process_query(
-                user_id="baseline_test",
-                query=question_data["question"]
-            )
-            
-            response_time = time.time() - start_time
-            
-            # Simple scoring logic (can be enhanced)
-            response_text = result.get('response', '')
-            confidence = result.get('confidence', 0)
-            
-            # Basic evaluation (replace with more sophisticated scoring)
-            score = 0
-            max_score = question_data.get("max_score", 10)
-            passed = False
-            
-            if response_text and len(response_text) > 50:
-                score = min(max_score, int(confidence * max_score))
-                passed = score >= (max_score * 0.6)  # 60% threshold
-            
-            test_result = {
-                "id": question_data["id"],
-                "question": question_data["question"],
-                "response": response_text,
-                "score": score,
-                "max_score": max_score,
-                "confidence": confidence,
-                "response_time": round(response_time, 2),
-                "passed": passed,
-                "timestamp": datetime.now().isoformat()
-            }
-            
-            results["results"].append(test_result)
-            
-            status = "✅ PASSED" if passed else "❌ FAILED"
-            print(f"   {status} - Score: {score}/{max_score} - Time: {response_time:.2f}s")
-            
-        except Exception as e:
-            print(f"   ❌ ERROR: {str(e)}")
-            test_result = {
-                "id": question_data["id"],
-                "question": question_data["question"],
-                "response": f"Error: {str(e)}",
-                "score": 0,
-                "max_score": question_data.get("max_score", 10),
-                "confidence": 0,
-                "response_time": 0,
-                "passed": False,
-                "timestamp": datetime.now().isoformat()
-            }
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    write_lock = asyncio.Lock()
+    order = {question_data["id"]: i for i, question_data in enumerate(questions)}
+    suite_start = time.time()
+
+    async def run_and_record(question_data: Dict[str, Any]):
+        async with semaphore:
+            category = question_data.get('category', 'general')
+            difficulty = question_data.get('difficulty', 'unknown')
+            print(f"\n▶️  Testing question {question_data['id']} ({category.title()} - {difficulty.title()})...")
+            test_result = await run_question(agent, question_data)
+
+        # Stream each finished result to disk so completed work survives a crash
+        async with write_lock:
             results["results"].append(test_result)
-    
-    # Calculate summary statistics
-    total_tests = len(results["results"])
-    passed_tests = sum(1 for r in results["results"] if r["passed"])
-    avg_score = sum(r["score"] for r in results["results"]) / total_tests if total_tests > 0 else 0
-    avg_response_time = sum(r["response_time"] for r in results["results"]) / total_tests if total_tests > 0 else 0
-    
-    results["summary"] = {
-        "total_tests": total_tests,
-        "passed_tests": passed_tests,
-        "failed_tests": total_tests - passed_tests,
-        "pass_rate": round((passed_tests / total_tests) * 100, 1) if total_tests > 0 else 0,
-        "average_score": round(avg_score, 1),
-        "average_response_time": round(avg_response_time, 2)
-    }
-    
-    # Save results
-    with open('baseline_results.json', 'w') as f:
-        json.dump(results, f, indent=2)
-    
+            results["results"].sort(key=lambda r: order[r["id"]])
+            results["summary"] = summarize(results["results"])
+            save_results(results, output_path)
+
+            status = "✅ PASSED" if test_result["passed"] else "❌ FAILED"
+            print(f"   [{len(results['results'])}/{total_questions}] {question_data['id']}: {status} - "
+                  f"Score: {test_result['score']}/{test_result['max_score']} - Time: {test_result['response_time']:.2f}s")
+
+    await asyncio.gather(*(run_and_record(question_data) for question_data in questions))
+
+    results["summary"] = summarize(results["results"])
+    results["summary"]["wall_time"] = round(time.time() - suite_start, 2)
+    save_results(results, output_path)
+
     # Print summary
+    total_tests = results["summary"]["total_tests"]
+    passed_tests = results["summary"]["passed_tests"]
     print(f"\n📊 Baseline Testing Complete!")
     print(f"   Total Tests: {total_tests}")
     print(f"   Passed: {passed_tests}")
@@ -131,7 +373,48 @@ async def run_baseline_tests():
     print(f"   Pass Rate: {results['summary']['pass_rate']}%")
     print(f"   Average Score: {results['summary']['average_score']}")
     print(f"   Average Response Time: {results['summary']['average_response_time']}s")
-    print(f"\n💾 Results saved to baseline_results.json")
+    print(f"   Wall Time: {results['summary']['wall_time']}s")
+    print(f"\n💾 Results saved to {output_path}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run baseline.json questions against the compliance agent")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="Number of questions to run at once (default: 1)")
+    parser.add_argument("--category", action="append",
+                        help="Only run questions in this category (repeatable)")
+    parser.add_argument("--difficulty", action="append",
+                        help="Only run questions at this difficulty (repeatable)")
+    parser.add_argument("--state", action="append",
+                        help="Only run questions covering this state code (repeatable)")
+    parser.add_argument("--output", default=None,
+                        help="Results file, rewritten after every finished question "
+                             "(default: baseline_results.json, or retrieval_results.json with --retrieval-only)")
+    parser.add_argument("--retrieval-only", action="store_true",
+                        help="Only run retrieval and score it against expected answers (no LLM)")
+    parser.add_argument("--k", default="1,3,5,10",
+                        type=lambda value: sorted({int(part) for part in value.split(",") if part.strip()}),
+                        help="Cut-offs for recall@k and state hit rate@k (default: 1,3,5,10)")
+    parser.add_argument("--no-hybrid", action="store_true",
+                        help="With --retrieval-only, search FAISS alone instead of FAISS + BM25")
+    return parser.parse_args()
 
 if __name__ == "__main__":
-    asyncio.run(run_baseline_tests())
+    args = parse_args()
+    states = [state.upper() for state in args.state] if args.state else None
+    if args.retrieval_only:
+        run_retrieval_eval(
+            ks=args.k,
+            categories=args.category,
+            difficulties=args.difficulty,
+            states=states,
+            output_path=args.output or 'retrieval_results.json',
+            hybrid=not args.no_hybrid
+        )
+    else:
+        asyncio.run(run_baseline_tests(
+            concurrency=args.concurrency,
+            categories=args.category,
+            difficulties=args.difficulty,
+            states=states,
+            output_path=args.output or 'baseline_results.json'
+        ))
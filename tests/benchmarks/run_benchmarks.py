@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+"""
+Performance Benchmarks
+Measures retrieval latency against corpus size, agent end-to-end latency
+on the offline stub LLM, AgentServer throughput under concurrent load,
+startup time and peak RSS. Everything runs against synthetic indexes
+built in a temporary workspace with stub embeddings, so runs are
+reproducible on an isolated box and comparable run over run:
+
+    python tests/benchmarks/run_benchmarks.py --output=json --save results.json
+    python tests/benchmarks/run_benchmarks.py --compare results.json
+
+With --compare the run exits non-zero when a metric regresses past the
+limits in tests/benchmarks/thresholds.json.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import yaml
+import random
+import shutil
+import asyncio
+import fnmatch
+import logging
+import argparse
+import platform
+import resource
+import tempfile
+import threading
+import contextlib
+import subprocess
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO_ROOT))
+sys.path.insert(0, str(REPO_ROOT / "base_agent"))
+
+from core.corpus_store import ColumnarCorpusWriter
+from core.embeddings import HashEmbeddings
+from core.vectorstore import FaissVectorStore, HotReloadRetriever
+
+from extract_regulations import iter_mirror_files, iter_text
+from jurisdictions import detect_jurisdictions
+from knowledge_base_builder import KnowledgeBaseBuilder
+
+logger = logging.getLogger(__name__)
+
+THRESHOLDS_PATH = Path(__file__).resolve().parent / "thresholds.json"
+# Synthetic chunks cycle through these shards; None lands in the general shard
+STATES = ["CA", "CO", "OR", "WA", "NY", "MI", "IL", "MA", None]
+CHUNK_WORDS = 160
+EMBED_BATCH_SIZE = 512
+# Metrics where a larger value is an improvement
+HIGHER_IS_BETTER = ("_per_second",)
+
+_WORD = re.compile(r"[A-Za-z][A-Za-z\-']+")
+
+
+def percentiles(samples: List[float], prefix: str, scale: float = 1000.0) -> Dict[str, float]:
+    """p50/p95/p99 (and mean) of samples in seconds, reported in milliseconds"""
+    values = np.asarray(samples, dtype="float64") * scale
+    return {
+        f"{prefix}.mean_ms": round(float(values.mean()), 3),
+        **{f"{prefix}.p{q}_ms": round(float(np.percentile(values, q)), 3) for q in (50, 95, 99)}
+    }
+
+
+def peak_rss_mb(who: int = resource.RUSAGE_SELF) -> float:
+    rss = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes on Linux
+    return round(rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024, 1)
+
+
+def load_questions() -> List[str]:
+    with open(REPO_ROOT / "baseline.json", "r") as f:
+        return [q["question"] for q in json.load(f)["questions"]]
+
+
+def corpus_vocabulary(limit: int = 50000) -> List[str]:
+    """Words from the regulation mirror, so synthetic chunks read like real ones"""
+    words: List[str] = []
+    regulations_dir = REPO_ROOT / "regulations"
+    if regulations_dir.is_dir():
+        for doc in iter_mirror_files(regulations_dir):
+            for segment in iter_text(doc["path"], doc["content_type"]):
+                words.extend(_WORD.findall(segment))
+                if len(words) >= limit:
+                    return words
+    # Without a mirror, fall back to the wording of the baseline questions
+    return words or [word for question in load_questions() for word in _WORD.findall(question)]
+
+
+def synthetic_records(count: int, vocabulary: List[str], seed: int) -> Iterator[Dict[str, Any]]:
+    rng = random.Random(seed)
+    for i in range(count):
+        record = {
+            "id": i,
+            "text": " ".join(rng.choice(vocabulary) for _ in range(CHUNK_WORDS)),
+            "source": f"synthetic/{i // 20}.html",
+            "category": "regulation"
+        }
+        state = STATES[i % len(STATES)]
+        if state:
+            record["state"] = state
+        yield record
+
+
+def build_workspace(directory: Path, corpus_size: int, vocabulary: List[str], seed: int,
+                    stub_llm: Dict[str, Any]) -> float:
+    """Create an agent directory on stub models with a published synthetic index; returns build seconds"""
+    rag_dir = directory / "rag"
+    rag_dir.mkdir(parents=True)
+
+    with open(REPO_ROOT / "rag" / "config.yaml", "r") as f:
+        rag_config = yaml.safe_load(f)
+    rag_config["vectorstore"].update(embedding_provider="stub", embedding_cache={"enabled": False},
+                                     reload_interval=3600)
+    with open(rag_dir / "config.yaml", "w") as f:
+        yaml.safe_dump(rag_config, f)
+
+    with open(REPO_ROOT / "agent_config.yaml", "r") as f:
+        agent_config = yaml.safe_load(f)
+    agent_config["llm"]["provider"] = "stub"
+    agent_config["llm"]["stub"] = {**(agent_config["llm"].get("stub") or {}), **stub_llm}
+    # Every query should exercise the full pipeline
+    agent_config["response_cache"] = {"enabled": False}
+    agent_config["tracing"] = {"trace_dir": None}
+    with open(directory / "agent_config.yaml", "w") as f:
+        yaml.safe_dump(agent_config, f)
+
+    shutil.copy(REPO_ROOT / "rag" / "knowledge_base.ttl", rag_dir / "knowledge_base.ttl")
+    if (REPO_ROOT / "rag" / "state_requirements.json").exists():
+        shutil.copy(REPO_ROOT / "rag" / "state_requirements.json", rag_dir / "state_requirements.json")
+    if (REPO_ROOT / "regulations").is_dir():
+        os.symlink(REPO_ROOT / "regulations", directory / "regulations")
+
+    start = time.perf_counter()
+    embeddings = HashEmbeddings()
+    store = FaissVectorStore()
+    writer = ColumnarCorpusWriter(str(rag_dir / "corpus"))
+    batch: List[Dict[str, Any]] = []
+
+    def flush():
+        store.add([record["id"] for record in batch], embeddings.embed_documents([r["text"] for r in batch]))
+        batch.clear()
+
+    for record in synthetic_records(corpus_size, vocabulary, seed):
+        writer.add(record)
+        batch.append(record)
+        if len(batch) >= EMBED_BATCH_SIZE:
+            flush()
+    if batch:
+        flush()
+    writer.commit()
+
+    builder = KnowledgeBaseBuilder(regulations_dir=str(directory / "regulations"), rag_dir=str(rag_dir),
+                                   embeddings=embeddings)
+    builder.publish(store, builder.load_manifest(), {"chunks": corpus_size})
+    return time.perf_counter() - start
+
+
+def bench_retrieval(workspace: Path, size: int, questions: List[str], repeats: int) -> Dict[str, float]:
+    """Query latency of the hybrid and dense-only retrieval paths"""
+    metrics: Dict[str, float] = {}
+    index_dir = str(workspace / "rag" / "index")
+    for mode, hybrid in (("hybrid", True), ("dense", False)):
+        retriever = HotReloadRetriever(index_dir, HashEmbeddings(), k=4, check_interval=3600, hybrid=hybrid,
+                                       router=detect_jurisdictions)
+        # First touch pages in the memory-mapped index
+        for question in questions:
+            retriever.search(question)
+        samples = []
+        for _ in range(repeats):
+            for question in questions:
+                start = time.perf_counter()
+                retriever.search(question)
+                samples.append(time.perf_counter() - start)
+        metrics.update(percentiles(samples, f"retrieval.{mode}.n{size}"))
+    return metrics
+
+
+def bench_agent(agent: Any, questions: List[str], repeats: int) -> Dict[str, float]:
+    """End-to-end process_query latency and its mean per-stage breakdown"""
+    samples: List[float] = []
+    stages: Dict[str, List[float]] = {}
+
+    async def run():
+        for i in range(repeats):
+            for n, question in enumerate(questions):
+                start = time.perf_counter()
+                result = await agent.process_query(f"bench-agent-{i}-{n}", question)
+                samples.append(time.perf_counter() - start)
+                if result.get("error"):
+                    raise RuntimeError(result["response"])
+                for stage, ms in result.get("timings", {}).items():
+                    stages.setdefault(stage, []).append(ms)
+
+    asyncio.run(run())
+    metrics = percentiles(samples, "agent")
+    for stage, values in sorted(stages.items()):
+        metrics[f"agent.stage.{stage}_ms"] = round(sum(values) / len(samples), 3)
+    return metrics
+
+
+def bench_server(agent: Any, questions: List[str], concurrency: int, duration: float) -> Dict[str, float]:
+    """Requests per second and latency of POST /api/query under concurrent clients.
+
+    Uses the threaded development server in-process; gunicorn (gthread)
+    shares the same request threads, query loop and backpressure.
+    """
+    from werkzeug.serving import make_server
+    from server import AgentServer
+
+    server = AgentServer(agent=agent, max_in_flight=max(64, concurrency * 2))
+    server.start()
+    http = make_server("127.0.0.1", 0, server.app, threaded=True)
+    thread = threading.Thread(target=http.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{http.server_port}/api/query"
+
+    samples: List[float] = []
+    statuses: Dict[int, int] = {}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(worker: int):
+        n = 0
+        while time.perf_counter() < deadline:
+            body = json.dumps({"query": questions[(worker + n) % len(questions)],
+                               "user_id": f"bench-server-{worker}-{n}"}).encode("utf-8")
+            request = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=120) as response:
+                    response.read()
+                    status = response.status
+            except urllib.error.HTTPError as e:
+                status = e.code
+            elapsed = time.perf_counter() - start
+            with lock:
+                statuses[status] = statuses.get(status, 0) + 1
+                if status == 200:
+                    samples.append(elapsed)
+            n += 1
+
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(client, range(concurrency)))
+        wall = time.perf_counter() - started
+    finally:
+        http.shutdown()
+        server.runner.shutdown()
+
+    metrics = percentiles(samples or [0.0], "server")
+    metrics["server.requests_per_second"] = round(len(samples) / wall, 2)
+    metrics["server.errors"] = sum(count for status, count in statuses.items() if status != 200)
+    return metrics
+
+
+STARTUP_SCRIPT = """
+import sys, time, json, asyncio, resource
+started = time.perf_counter()
+sys.path[:0] = [{root!r}, {base_agent!r}]
+from agent import create_compliance_agent
+imported = time.perf_counter()
+agent = create_compliance_agent({workspace!r})
+constructed = time.perf_counter()
+agent.warm_up()
+agent.agent.verbose = False
+warmed = time.perf_counter()
+asyncio.run(agent.process_query("bench-startup", {question!r}))
+answered = time.perf_counter()
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print("BENCHMARK " + json.dumps({{
+    "startup.import_seconds": imported - started,
+    "startup.construct_seconds": constructed - imported,
+    "startup.warm_up_seconds": warmed - constructed,
+    "startup.first_query_seconds": answered - warmed,
+    "startup.peak_rss_mb": rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+}}))
+"""
+
+
+def bench_startup(workspace: Path, question: str) -> Dict[str, float]:
+    """Cold start in a fresh interpreter: imports, construction, warm-up and first query"""
+    script = STARTUP_SCRIPT.format(root=str(REPO_ROOT), base_agent=str(REPO_ROOT / "base_agent"),
+                                   workspace=str(workspace), question=question)
+    completed = subprocess.run([sys.executable, "-c", script], cwd=str(workspace), capture_output=True,
+                               text=True, check=True)
+    line = next(line for line in reversed(completed.stdout.splitlines()) if line.startswith("BENCHMARK "))
+    return {key: round(value, 3) for key, value in json.loads(line[len("BENCHMARK "):]).items()}
+
+
+def run_benchmarks(args: argparse.Namespace) -> Dict[str, Any]:
+    questions = load_questions()
+    vocabulary = corpus_vocabulary()
+    stub_llm = {"first_token_ms": args.llm_first_token_ms, "latency_jitter_ms": 0.0,
+                "latency_distribution": "fixed", "token_delay_ms": args.llm_token_delay_ms}
+    metrics: Dict[str, float] = {}
+
+    with tempfile.TemporaryDirectory(prefix="agent-bench-") as tmp:
+        if "retrieval" in args.only:
+            for size in args.sizes:
+                workspace = Path(tmp) / f"retrieval-{size}"
+                logger.info(f"Building synthetic index of {size} chunks")
+                metrics[f"retrieval.build.n{size}_seconds"] = round(
+                    build_workspace(workspace, size, vocabulary, args.seed, stub_llm), 3)
+                logger.info(f"Benchmarking retrieval over {size} chunks")
+                metrics.update(bench_retrieval(workspace, size, questions, args.repeats))
+                shutil.rmtree(workspace)
+
+        if {"agent", "server", "startup"} & set(args.only):
+            workspace = Path(tmp) / "agent"
+            logger.info(f"Building agent workspace ({args.agent_corpus_size} chunks)")
+            build_workspace(workspace, args.agent_corpus_size, vocabulary, args.seed, stub_llm)
+
+            if "startup" in args.only:
+                logger.info("Benchmarking cold startup")
+                metrics.update(bench_startup(workspace, questions[0]))
+
+            if {"agent", "server"} & set(args.only):
+                from agent import create_compliance_agent
+                agent = create_compliance_agent(str(workspace)).warm_up()
+                agent.agent.verbose = False
+                try:
+                    if "agent" in args.only:
+                        logger.info("Benchmarking agent end to end")
+                        metrics.update(bench_agent(agent, questions, args.agent_repeats))
+                    if "server" in args.only:
+                        logger.info(f"Benchmarking server with {args.concurrency} clients for {args.duration}s")
+                        metrics.update(bench_server(agent, questions, args.concurrency, args.duration))
+                finally:
+                    agent.close()
+
+    metrics["process.peak_rss_mb"] = peak_rss_mb()
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "settings": {key: value for key, value in vars(args).items()
+                         if key not in ("output", "save", "compare", "thresholds")}
+        },
+        "metrics": metrics
+    }
+
+
+def load_thresholds(path: Path) -> List[Dict[str, Any]]:
+    """Ordered (pattern, limits) rules; the first pattern matching a metric applies"""
+    with open(path, "r") as f:
+        config = json.load(f)
+    default = config.get("default", {})
+    rules = [{"pattern": pattern, **default, **limits} for pattern, limits in config.get("metrics", {}).items()]
+    return rules + [{"pattern": "*", **default}]
+
+
+def compare(previous: Dict[str, float], current: Dict[str, float],
+            rules: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Change of every metric present in both runs, flagged when it regresses past its limit"""
+    rows = []
+    for name in sorted(set(previous) & set(current)):
+        rule = next(rule for rule in rules if fnmatch.fnmatch(name, rule["pattern"]))
+        before, after = float(previous[name]), float(current[name])
+        worse = before - after if name.endswith(HIGHER_IS_BETTER) else after - before
+        if before:
+            regression = worse / abs(before)
+        else:
+            regression = float("inf") if worse > 0 else 0.0
+        failed = worse > rule.get("min_delta", 0.0) and regression > rule.get("max_regression", 0.25)
+        rows.append({"metric": name, "previous": before, "current": after,
+                     "regression": regression, "limit": rule.get("max_regression", 0.25), "failed": failed})
+    return rows
+
+
+def print_report(results: Dict[str, Any], comparison: Optional[List[Dict[str, Any]]]):
+    print(f"Benchmarks ({results['environment']['platform']}, Python {results['environment']['python']})")
+    for name, value in results["metrics"].items():
+        print(f"  {name:<45} {value}")
+    if comparison is not None:
+        print("\nCompared with previous run:")
+        for row in comparison:
+            status = "REGRESSION" if row["failed"] else "ok"
+            print(f"  {row['metric']:<45} {row['previous']:>12.3f} -> {row['current']:>12.3f} "
+                  f"(regression {row['regression'] * 100:+.1f}%, limit {row['limit'] * 100:.0f}%) {status}")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run retrieval, agent, server and startup benchmarks")
+    parser.add_argument("--output", choices=["text", "json"], default="text", help="Report format on stdout")
+    parser.add_argument("--save", help="Write the results JSON to this path")
+    parser.add_argument("--compare", help="Results JSON of a previous run; exit 1 on regressions")
+    parser.add_argument("--thresholds", default=str(THRESHOLDS_PATH), help="Regression limits per metric")
+    parser.add_argument("--only", default="retrieval,agent,server,startup",
+                        type=lambda value: [part.strip() for part in value.split(",") if part.strip()],
+                        help="Comma-separated benchmarks to run")
+    parser.add_argument("--sizes", default="1000,5000,20000",
+                        type=lambda value: [int(part) for part in value.split(",") if part.strip()],
+                        help="Corpus sizes (chunks) for the retrieval benchmark")
+    parser.add_argument("--repeats", type=int, default=5, help="Passes over the questions per retrieval mode")
+    parser.add_argument("--agent-corpus-size", type=int, default=5000)
+    parser.add_argument("--agent-repeats", type=int, default=2, help="Passes over the questions for the agent")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent server clients")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of server load")
+    parser.add_argument("--llm-first-token-ms", type=float, default=0.0,
+                        help="Stub LLM time to first token (0 measures everything but the model)")
+    parser.add_argument("--llm-token-delay-ms", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', stream=sys.stderr)
+    args = parse_args()
+    # Per-request access lines from the load test drown the progress log
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+    # The agent and index loader print progress; keep stdout for the report
+    with contextlib.redirect_stdout(sys.stderr):
+        results = run_benchmarks(args)
+
+    comparison = None
+    if args.compare:
+        with open(args.compare, "r") as f:
+            previous = json.load(f)["metrics"]
+        comparison = compare(previous, results["metrics"], load_thresholds(Path(args.thresholds)))
+        results["comparison"] = comparison
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.output == "json":
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results, comparison)
+
+    if comparison and any(row["failed"] for row in comparison):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Shared test setup: the repo root and base_agent on sys.path, the same
+layout the root scripts use (from core.X import ...)
+"""
+
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+sys.path.insert(0, str(REPO_ROOT / "base_agent"))
+
+import random
+
+import pytest
+import yaml
+
+WORDS = (
+    "license licensee retail cultivation manufacturing testing laboratory potency label package "
+    "inventory record security camera transport manifest delivery consumer age verification "
+    "batch sample contaminant pesticide microbial storage waste disposal advertising signage "
+    "employee training badge premises hours sale limit ounce concentrate edible tincture"
+).split()
+
+
+def regulation_text(seed: int, sentences: int = 40) -> str:
+    """Deterministic regulation-like prose; different seeds give unrelated pages"""
+    rng = random.Random(seed)
+    return " ".join(
+        f"Section {seed}.{i} requires each " + " ".join(rng.choice(WORDS) for _ in range(14)) + "."
+        for i in range(sentences)
+    )
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    """An empty regulation mirror and rag/config.yaml on stub embeddings, as the working directory.
+
+    Call workspace(state, name, text) to write a mirrored HTML page; it
+    returns the file's path.
+    """
+    with open(REPO_ROOT / "rag" / "config.yaml", "r") as f:
+        rag_config = yaml.safe_load(f)
+    rag_config["vectorstore"].update(embedding_provider="stub", embedding_cache={"enabled": False})
+    (tmp_path / "rag").mkdir()
+    with open(tmp_path / "rag" / "config.yaml", "w") as f:
+        yaml.safe_dump(rag_config, f)
+    (tmp_path / "regulations").mkdir()
+    monkeypatch.chdir(tmp_path)
+
+    def write_page(state: str, name: str, text: str) -> Path:
+        path = tmp_path / "regulations" / state / name
+        path.parent.mkdir(exist_ok=True)
+        path.write_text(f"<html><body><p>{text}</p></body></html>", encoding="utf-8")
+        return path
+
+    return write_page
+
+
+@pytest.fixture
+def stub_agent(tmp_path):
+    """Build a BaseAgent on the stub LLM with one "lookup" tool.
+
+    Call stub_agent(lookup, **stub_settings); lookup(query) is the tool and
+    stub_settings override the llm.stub section. No index or cache is used.
+    """
+    from langchain.agents import Tool
+
+    from core.agent import BaseAgent
+
+    def make(lookup, **stub_settings) -> BaseAgent:
+        agent_dir = tmp_path / "agent"
+        (agent_dir / "rag").mkdir(parents=True, exist_ok=True)
+        stub = {"tool_steps": 1, "completion_tokens": 8, **stub_settings}
+        with open(agent_dir / "agent_config.yaml", "w") as f:
+            yaml.safe_dump({"llm": {"provider": "stub", "stub": stub}, "response_cache": {"enabled": False}}, f)
+        with open(agent_dir / "rag" / "config.yaml", "w") as f:
+            yaml.safe_dump({"vectorstore": {"type": "none"}}, f)
+
+        class LookupAgent(BaseAgent):
+            def _create_tools(self):
+                return [Tool(name="lookup", func=lookup, description="Look up a regulation")]
+
+        return LookupAgent("stub-agent", "Answers from a lookup tool", "testing", str(agent_dir))
+
+    return make
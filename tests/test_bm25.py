@@ -0,0 +1,53 @@
+"""BM25 ranking, sharded statistics and reciprocal rank fusion"""
+
+import pytest
+
+from core.bm25 import BM25Index, collection_stats, reciprocal_rank_fusion, tokenize
+
+DOCUMENTS = [
+    (10, "Section 5001.1 requires licensees to report inventory in METRC daily."),
+    (11, "Licensees must keep inventory records for three years."),
+    (12, "Retail security requires video cameras covering every entrance."),
+    (13, "Testing laboratories must test each batch for potency and contaminants."),
+    (14, "Labels must list potency, testing laboratory and batch number."),
+]
+
+
+def test_tokenize_keeps_section_numbers():
+    assert tokenize("Per Section 5001.1 and 26-10 of the code") == ["per", "section", "5001.1", "26-10", "code"]
+
+
+def test_exact_identifier_ranks_first():
+    index = BM25Index.build(DOCUMENTS)
+    assert index.search("5001.1")[0][0] == 10
+    assert [doc_id for doc_id, _ in index.search("METRC inventory")][:2] == [10, 11]
+    assert index.search("no such words") == []
+
+
+def test_save_and_load_round_trip(tmp_path):
+    index = BM25Index.build(DOCUMENTS)
+    index.save(str(tmp_path))
+    loaded = BM25Index.load(str(tmp_path))
+    assert loaded.search("potency testing batch") == index.search("potency testing batch")
+
+
+def test_shards_scored_with_collection_stats_match_one_index():
+    query = "testing potency security inventory"
+    whole = BM25Index.build(DOCUMENTS)
+    shards = [BM25Index.build(DOCUMENTS[:2]), BM25Index.build(DOCUMENTS[2:])]
+    stats = collection_stats(shards, query)
+    sharded = sorted(hit for shard in shards for hit in shard.search(query, 10, stats))
+    for (doc_id, score), (expected_id, expected) in zip(sharded, sorted(whole.search(query, 10))):
+        assert doc_id == expected_id
+        assert score == pytest.approx(expected)
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([[1, 2, 3], [3, 1, 4]], k=60)
+    assert [doc_id for doc_id, _ in fused] == [1, 3, 2, 4]
+    assert fused[0][1] == pytest.approx(1 / 61 + 1 / 62)
+
+
+def test_reciprocal_rank_fusion_weights():
+    fused = reciprocal_rank_fusion([[1, 2], [2, 1]], k=60, weights=[1.0, 3.0])
+    assert fused[0][0] == 2
@@ -0,0 +1,74 @@
+"""Context assembly: overlap merging, sentence selection, token budget and citations"""
+
+from core.context import assemble_context, merge_overlapping, select_sentences
+
+from conftest import regulation_text
+
+
+def words(text):
+    return len(text.split())
+
+
+def chunk_hits(text, size=600, overlap=150, source="https://example.gov/ca", state="CA", first_id=0):
+    """Overlapping chunks of text as (record, score) hits, best score first"""
+    hits, start, chunk_id = [], 0, first_id
+    while start < len(text):
+        record = {"id": chunk_id, "text": text[start:start + size], "source": source, "state": state,
+                  "category": "regulation"}
+        hits.append((record, 1.0 / (chunk_id + 1)))
+        start += size - overlap
+        chunk_id += 1
+    return hits
+
+
+def test_overlapping_chunks_merge_back_into_the_source_text():
+    text = regulation_text(1, sentences=10)
+    hits = chunk_hits(text)
+    passages = merge_overlapping(list(reversed(hits)), max_overlap=300)
+    assert len(passages) == 1
+    assert passages[0]["text"] == text
+    assert passages[0]["chunk_ids"] == [record["id"] for record, _ in hits]
+    assert passages[0]["score"] == 1.0
+
+
+def test_chunks_of_different_sources_stay_apart():
+    hits = chunk_hits(regulation_text(1, 4)) + chunk_hits(regulation_text(2, 4), source="b", state="CO",
+                                                          first_id=100)
+    assert len(merge_overlapping(hits, max_overlap=300)) == 2
+
+
+def test_select_sentences_keeps_matches_and_neighbours_once():
+    text = "Alpha rule applies. Beta rule applies. Gamma tests potency. Delta rule applies. Epsilon rule applies."
+    seen = set()
+    assert select_sentences(text, {"potency"}, neighbours=1, seen=seen) == \
+        "Beta rule applies. Gamma tests potency. Delta rule applies."
+    assert select_sentences(text, {"potency"}, neighbours=1, seen=seen) == ""
+    assert "…" in select_sentences(text, {"alpha", "epsilon"}, neighbours=0)
+
+
+def test_context_respects_token_budget():
+    hits = [hit for seed in range(1, 6) for hit in chunk_hits(regulation_text(seed), source=f"s{seed}",
+                                                               first_id=seed * 100)]
+    for budget in (60, 200, 800):
+        context, citations = assemble_context(hits, "requires potency testing", max_tokens=budget,
+                                              count_tokens=words)
+        assert 0 < words(context) <= budget
+        assert citations
+
+
+def test_every_passage_is_cited_in_order():
+    hits = chunk_hits(regulation_text(1, 6), source="https://example.gov/ca") + \
+        chunk_hits(regulation_text(2, 6), source="https://example.gov/co", state="CO", first_id=50)
+    context, citations = assemble_context(hits, "requires", max_tokens=10000, select=False, count_tokens=words)
+    assert [c["source"] for c in citations] == ["https://example.gov/ca", "https://example.gov/co"]
+    assert context.startswith("[1] https://example.gov/ca (CA)\n")
+    assert "\n\n[2] https://example.gov/co (CO)\n" in context
+    assert citations[0]["state"] == "CA" and citations[0]["category"] == "regulation"
+    assert citations[0]["chunk_ids"] == [record["id"] for record, _ in chunk_hits(regulation_text(1, 6))]
+
+
+def test_no_matching_terms_falls_back_to_retrieved_text():
+    hits = chunk_hits("Plain text without the words asked about.")
+    context, citations = assemble_context(hits, "zzz", max_tokens=100, count_tokens=words)
+    assert "Plain text without the words asked about." in context
+    assert len(citations) == 1
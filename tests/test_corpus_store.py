@@ -0,0 +1,68 @@
+"""Columnar corpus: write, reopen, lookup by id, staging and JSONL conversion"""
+
+import json
+
+import pytest
+
+from core.corpus_store import ColumnarCorpus, ColumnarCorpusWriter, convert_jsonl
+
+RECORDS = [
+    {"id": 7, "text": "Licensees must verify age.", "source": "https://example.gov/a", "state": "CA"},
+    {"id": 3, "text": "Labels must list potency — in mg.", "source": "https://example.gov/b", "state": "CO"},
+    {"text": "Curated note without an id.", "category": "faq"},
+    {"id": 12, "text": "", "source": "https://example.gov/a", "state": "CA", "category": "regulation"},
+]
+
+
+def write(directory, records):
+    writer = ColumnarCorpusWriter(str(directory))
+    for record in records:
+        writer.add(record)
+    writer.commit()
+
+
+def test_round_trip_preserves_records_and_order(tmp_path):
+    write(tmp_path / "corpus", RECORDS)
+    corpus = ColumnarCorpus(str(tmp_path / "corpus"))
+    assert len(corpus) == len(RECORDS)
+    assert list(corpus) == RECORDS
+
+
+def test_lookup_by_id(tmp_path):
+    write(tmp_path / "corpus", RECORDS)
+    corpus = ColumnarCorpus(str(tmp_path / "corpus"))
+    assert corpus[3] == RECORDS[1]
+    assert corpus[12]["text"] == ""
+    assert 7 in corpus and 8 not in corpus
+    assert corpus.get(8) is None
+    with pytest.raises(KeyError):
+        corpus[8]
+
+
+def test_columns_are_dictionary_encoded(tmp_path):
+    write(tmp_path / "corpus", RECORDS)
+    corpus = ColumnarCorpus(str(tmp_path / "corpus"))
+    assert corpus.values["state"] == [None, "CA", "CO"]
+
+
+def test_commit_replaces_and_abort_keeps_existing(tmp_path):
+    directory = tmp_path / "corpus"
+    write(directory, RECORDS)
+
+    writer = ColumnarCorpusWriter(str(directory))
+    writer.add({"id": 1, "text": "replacement"})
+    staged = ColumnarCorpus(writer.finish())
+    assert list(staged) == [{"id": 1, "text": "replacement"}]
+    assert len(ColumnarCorpus(str(directory))) == len(RECORDS)
+    writer.abort()
+    assert list(ColumnarCorpus(str(directory))) == RECORDS
+
+    write(directory, [{"id": 1, "text": "replacement"}])
+    assert list(ColumnarCorpus(str(directory))) == [{"id": 1, "text": "replacement"}]
+
+
+def test_convert_jsonl(tmp_path):
+    jsonl = tmp_path / "corpus.jsonl"
+    jsonl.write_text("\n".join(json.dumps(record) for record in RECORDS) + "\n\n")
+    assert convert_jsonl(str(jsonl), str(tmp_path / "corpus")) == len(RECORDS)
+    assert ColumnarCorpus(str(tmp_path / "corpus"))[7] == RECORDS[0]
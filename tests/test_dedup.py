@@ -0,0 +1,64 @@
+"""SimHash near-duplicate detection and duplicate pages in knowledge base builds"""
+
+import json
+
+from core.embeddings import HashEmbeddings
+from core.vectorstore import HotReloadRetriever
+
+from conftest import regulation_text
+from dedup import SimHashIndex, hamming_distance, simhash
+from knowledge_base_builder import KnowledgeBaseBuilder
+
+
+def test_near_duplicates_have_close_fingerprints():
+    text = regulation_text(1)
+    edited = text.replace("Section 1.3 requires", "Section 1.3 require")
+    assert hamming_distance(simhash(text), simhash(edited)) <= 3
+    assert hamming_distance(simhash(text), simhash(regulation_text(2))) > 3
+
+
+def test_index_finds_within_distance():
+    index = SimHashIndex(max_distance=3)
+    index.add(0b1011 << 40, "a")
+    assert index.find((0b1011 << 40) ^ 0b111) == "a"
+    assert index.find((0b1011 << 40) ^ 0b1111) is None
+
+
+def test_duplicate_page_is_skipped_and_recorded(workspace):
+    text = regulation_text(1)
+    workspace("CA", "a.html", text)
+    workspace("CA", "b.html", text.replace("Section 1.3 requires", "Section 1.3 require"))
+    workspace("CA", "c.html", regulation_text(2))
+    stats = KnowledgeBaseBuilder(embeddings=HashEmbeddings()).build()
+    assert stats["duplicate_documents"] == 1
+
+    with open("rag/canonical_sources.json") as f:
+        canonical = json.load(f)
+    assert canonical["documents"] == {"CA/b.html": "CA/a.html"}
+
+
+def test_duplicate_is_indexed_once_its_canonical_page_goes(workspace):
+    text = regulation_text(1)
+    canonical = workspace("CA", "a.html", text)
+    workspace("CA", "b.html", text)
+    first = KnowledgeBaseBuilder(embeddings=HashEmbeddings()).build()
+
+    canonical.unlink()
+    stats = KnowledgeBaseBuilder(embeddings=HashEmbeddings()).build()
+    assert stats["duplicate_documents"] == 0
+    assert stats["changed_documents"] == 1
+    assert stats["total_vectors"] == first["total_vectors"]
+
+
+def test_copy_in_another_state_stays_in_its_own_shard(workspace):
+    text = regulation_text(1)
+    workspace("CA", "a.html", text)
+    workspace("WA", "a.html", text)
+    workspace("WA", "b.html", regulation_text(2))
+    stats = KnowledgeBaseBuilder(embeddings=HashEmbeddings()).build()
+    assert stats["duplicate_documents"] == 0
+
+    retriever = HotReloadRetriever("rag/index", HashEmbeddings(), k=50, router=lambda query: ["WA"])
+    sources = {record["source"] for record, _ in retriever.search(regulation_text(1, sentences=2))}
+    assert "WA/a.html" in sources
+    assert "CA/a.html" not in sources
@@ -0,0 +1,127 @@
+"""Mirroring: per-URL filenames and conditional re-fetches"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from download_regulations import SimpleRegulationMirror
+
+MAIN = "https://cannabis.example.gov/"
+LAWS = "https://cannabis.example.gov/laws-and-regulations/"
+ABOUT_LAWS = "https://cannabis.example.gov/about-us/laws-and-regulations/"
+
+
+class FakeSite:
+    """Serves fixed pages with ETags, answering matching If-None-Match with 304"""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.requests = []
+        # Servers without validators always answer 200 with the full body
+        self.etags = True
+
+    def __call__(self, url, max_retries=3, extra_headers=None):
+        extra_headers = extra_headers or {}
+        self.requests.append((url, extra_headers))
+        body = self.pages[url].encode()
+        if not self.etags:
+            return SimpleNamespace(status_code=200, content=body, text=body.decode(), headers={})
+        etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+        if extra_headers.get("If-None-Match") == etag:
+            return SimpleNamespace(status_code=304, content=b"", text="", headers={"ETag": etag})
+        return SimpleNamespace(status_code=200, content=body, text=body.decode(), headers={"ETag": etag})
+
+
+@pytest.fixture
+def mirror(tmp_path, monkeypatch):
+    site = FakeSite({
+        MAIN: "<html><body>Home</body></html>",
+        LAWS: "<html><body>Current regulations</body></html>",
+        ABOUT_LAWS: "<html><body>About our rulemaking</body></html>",
+    })
+    mirror = SimpleRegulationMirror(base_dir=str(tmp_path), host_delay=0)
+    mirror.state_sites = {"CA": {"name": "California", "agency": "DCC", "main_url": MAIN,
+                                 "regulation_urls": [LAWS, ABOUT_LAWS]}}
+    monkeypatch.setattr(mirror, "_request_with_retries", site)
+    mirror.site = site
+    return mirror
+
+
+def fetch_cache(mirror):
+    with open(f"{mirror.base_dir}/CA/metadata.json") as f:
+        return json.load(f)["fetch_cache"]
+
+
+def test_urls_sharing_a_last_segment_get_their_own_files(mirror):
+    mirror.mirror_state_simple("CA")
+    cache = fetch_cache(mirror)
+    assert cache[LAWS]["filename"] != cache[ABOUT_LAWS]["filename"]
+    for url in (LAWS, ABOUT_LAWS):
+        with open(f"{mirror.base_dir}/CA/{cache[url]['filename']}") as f:
+            assert f.read() == mirror.site.pages[url]
+
+
+def test_validators_are_not_sent_for_a_file_that_no_longer_matches(mirror):
+    mirror.mirror_state_simple("CA")
+    laws_path = f"{mirror.base_dir}/CA/{fetch_cache(mirror)[LAWS]['filename']}"
+    with open(laws_path, "w") as f:
+        f.write("overwritten")
+
+    mirror.site.requests.clear()
+    mirror.mirror_state_simple("CA")
+    sent = dict(mirror.site.requests)
+    assert "If-None-Match" not in sent[LAWS]
+    assert "If-None-Match" in sent[ABOUT_LAWS]
+    assert mirror.changed_files["CA"] == [fetch_cache(mirror)[LAWS]["filename"]]
+    with open(laws_path) as f:
+        assert f.read() == mirror.site.pages[LAWS]
+
+
+def test_files_under_an_old_name_are_removed(mirror):
+    mirror.mirror_state_simple("CA")
+    state_dir = Path(mirror.base_dir) / "CA"
+    metadata = json.loads((state_dir / "metadata.json").read_text())
+    # As written before filenames carried a URL hash
+    metadata["fetch_cache"][LAWS]["filename"] = "laws-and-regulations.html"
+    (state_dir / "metadata.json").write_text(json.dumps(metadata))
+    (state_dir / "laws-and-regulations.html").write_text(mirror.site.pages[LAWS])
+
+    mirror.mirror_state_simple("CA")
+    assert not (state_dir / "laws-and-regulations.html").exists()
+    assert (state_dir / fetch_cache(mirror)[LAWS]["filename"]).exists()
+
+
+def age_files(state_dir):
+    """Backdate every mirrored file so a rewrite shows up as a new mtime"""
+    for path in state_dir.iterdir():
+        os.utime(path, (1_000_000_000, 1_000_000_000))
+
+
+def test_not_modified_pages_are_not_rewritten(mirror):
+    mirror.mirror_state_simple("CA")
+    state_dir = Path(mirror.base_dir) / "CA"
+    age_files(state_dir)
+
+    mirror.mirror_state_simple("CA")
+    assert mirror.changed_files["CA"] == []
+    assert all(path.stat().st_mtime == 1_000_000_000 for path in state_dir.iterdir() if path.name != "metadata.json")
+    metadata = json.loads((state_dir / "metadata.json").read_text())
+    assert metadata["bytes_downloaded"] == 0 and metadata["total_files"] == 3
+
+
+def test_unchanged_content_is_not_rewritten_without_validators(mirror):
+    mirror.site.etags = False
+    mirror.mirror_state_simple("CA")
+    state_dir = Path(mirror.base_dir) / "CA"
+    age_files(state_dir)
+
+    mirror.site.pages[LAWS] = "<html><body>Amended regulations</body></html>"
+    mirror.mirror_state_simple("CA")
+    laws = fetch_cache(mirror)[LAWS]["filename"]
+    assert mirror.changed_files["CA"] == [laws]
+    rewritten = {path.name for path in state_dir.iterdir() if path.stat().st_mtime != 1_000_000_000}
+    assert rewritten == {laws, "metadata.json"}
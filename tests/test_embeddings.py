@@ -0,0 +1,92 @@
+"""Embedding cache: hits and misses, persistence across restarts and LRU eviction"""
+
+import sqlite3
+
+from core.embeddings import CachedEmbeddings, EmbeddingCache, HashEmbeddings
+
+MODEL = "stub:test"
+
+
+class CountingEmbeddings(HashEmbeddings):
+    """HashEmbeddings that records every text it is asked to embed"""
+
+    def __init__(self):
+        super().__init__(dimension=16)
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.extend(texts)
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        self.calls.append(text)
+        return super().embed_query(text)
+
+
+def cached(path, **kwargs):
+    model = CountingEmbeddings()
+    return CachedEmbeddings(model, EmbeddingCache(str(path), **kwargs), MODEL), model
+
+
+def test_miss_then_hit(tmp_path):
+    embeddings, model = cached(tmp_path / "cache.sqlite3")
+    first = embeddings.embed_documents(["Licensees must keep records.", "Licensees  must keep records."])
+    assert model.calls == ["Licensees must keep records."]
+    assert first[0] == first[1]
+
+    second = embeddings.embed_documents(["Licensees must keep records.", "Labels must list THC."])
+    assert model.calls == ["Licensees must keep records.", "Labels must list THC."]
+    assert second[0] == first[0]
+    assert embeddings.cache.hits == 1 and embeddings.cache.misses == 2
+
+
+def test_queries_and_documents_are_cached_separately(tmp_path):
+    embeddings, model = cached(tmp_path / "cache.sqlite3")
+    embeddings.embed_documents(["testing rules"])
+    embeddings.embed_query("testing rules")
+    embeddings.embed_query("testing rules")
+    assert model.calls == ["testing rules", "testing rules"]
+
+
+def test_contents_survive_restart(tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    embeddings, _ = cached(path)
+    vector = embeddings.embed_query("Colorado packaging requirements")
+    embeddings.cache._conn.close()
+
+    reopened, model = cached(path)
+    assert reopened.embed_query("Colorado packaging requirements") == vector
+    assert model.calls == []
+
+
+def test_hits_do_not_write_until_flushed(tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    embeddings, _ = cached(path, touch_flush_size=100, touch_flush_seconds=3600)
+    embeddings.embed_query("age verification")
+    key = EmbeddingCache.make_key(MODEL, "query", "age verification")
+
+    def last_used():
+        with sqlite3.connect(str(path)) as conn:
+            return conn.execute("SELECT last_used FROM embeddings WHERE key = ?", (key,)).fetchone()[0]
+
+    stored = last_used()
+    embeddings.embed_query("age verification")
+    assert last_used() == stored
+    embeddings.cache.flush()
+    assert last_used() > stored
+
+
+def test_eviction_keeps_recently_hit_entries(tmp_path):
+    embeddings, model = cached(tmp_path / "cache.sqlite3", max_entries=10, touch_flush_size=100,
+                               touch_flush_seconds=3600)
+    texts = [f"regulation {i}" for i in range(10)]
+    for text in texts:
+        embeddings.embed_query(text)
+    # Only buffered in memory; eviction must still honour it
+    embeddings.embed_query(texts[0])
+    embeddings.embed_query("regulation 10")
+
+    assert len(embeddings.cache) == 9
+    model.calls.clear()
+    embeddings.embed_query(texts[0])
+    assert model.calls == []
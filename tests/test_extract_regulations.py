@@ -0,0 +1,93 @@
+"""Streaming text extraction from mirrored HTML and PDF files"""
+
+from pathlib import Path
+
+import pytest
+
+import extract_regulations
+from extract_regulations import iter_chunks, iter_mirror_files, iter_text, sniff_content_type
+
+PAGE = """<!DOCTYPE html>
+<html><head><title>Rules</title><script>var tracking = "ignored";</script></head>
+<body>
+<div id="outdated" role="complementary"><p>Your browser is out-of-date!</p></div>
+<nav><ul><li>Home</li><li>Apply for a license</li></ul></nav>
+<div class="with-nav-sidebar"><main>
+<h1>Section 5000 – Packaging</h1>
+<p>Each package must bear the universal symbol.</p>
+<p>Licensees must keep records for seven years.</p>
+</main></div>
+<footer>Copyright the State</footer>
+</body></html>
+"""
+
+
+def pdf_bytes(pages):
+    """A minimal PDF with one line of Helvetica text per page"""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in pages:
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects))
+        kids.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(kids), len(kids))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+@pytest.mark.parametrize("encoding", ["utf-8", "cp1252"])
+def test_html_text_streams_without_chrome_across_read_blocks(tmp_path, monkeypatch, encoding):
+    # Tiny blocks split tags, entities and multi-byte characters between reads
+    monkeypatch.setattr(extract_regulations, "READ_BLOCK_SIZE", 7)
+    path = tmp_path / "rules.aspx"
+    path.write_bytes(PAGE.encode(encoding))
+
+    assert sniff_content_type(path) == "text/html"
+    assert list(iter_text(path)) == [
+        "Rules",
+        "Section 5000 – Packaging",
+        "Each package must bear the universal symbol.",
+        "Licensees must keep records for seven years.",
+    ]
+
+
+def test_pdf_text_is_extracted_page_by_page(tmp_path):
+    path = tmp_path / "regulations.html"  # mirrors often save PDFs under the page's name
+    path.write_bytes(pdf_bytes(["Section 1 Licensees must renew annually.", "Section 2 Labels must list THC."]))
+
+    assert sniff_content_type(path) == "application/pdf"
+    assert list(iter_text(path)) == ["Section 1 Licensees must renew annually.", "Section 2 Labels must list THC."]
+
+
+def test_mirror_walk_skips_assets_and_metadata(tmp_path):
+    state = tmp_path / "CA"
+    state.mkdir()
+    (state / "index.html").write_text(PAGE)
+    (state / "rules.pdf").write_bytes(pdf_bytes(["Rules"]))
+    (state / "favicon.html").write_bytes(b"\x89PNG\r\n\x1a\n" + bytes(64))
+    (state / "styles.css").write_text("body { color: red; }")
+    (state / "metadata.json").write_text("{}")
+
+    files = {Path(f["path"]).name: f["content_type"] for f in iter_mirror_files(tmp_path)}
+    assert files == {"index.html": "text/html", "rules.pdf": "application/pdf"}
+
+
+def test_chunks_overlap_and_respect_the_size():
+    segments = [f"Sentence {i} sets a rule for licensees." for i in range(40)]
+    chunks = list(iter_chunks(segments, chunk_size=200, chunk_overlap=50))
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 200 for chunk in chunks)
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert chunk[:20] in previous
+    assert chunks[-1].endswith("Sentence 39 sets a rule for licensees.")
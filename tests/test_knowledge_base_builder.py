@@ -0,0 +1,105 @@
+"""Incremental knowledge base builds: no-op, changed and removed pages, failed publishes"""
+
+from collections import Counter
+
+import pytest
+
+from core.corpus_store import ColumnarCorpus
+from core.embeddings import HashEmbeddings
+from core.vectorstore import DOCSTORE_DIRNAME, HotReloadRetriever, current_version
+
+from conftest import regulation_text
+from knowledge_base_builder import KnowledgeBaseBuilder
+
+
+def builder():
+    return KnowledgeBaseBuilder(embeddings=HashEmbeddings())
+
+
+def published_ids():
+    docstore = ColumnarCorpus(f"rag/index/{current_version('rag/index')}/{DOCSTORE_DIRNAME}")
+    return [record["id"] for record in docstore]
+
+
+def corpus_ids():
+    return [record["id"] for record in ColumnarCorpus("rag/corpus") if "id" in record]
+
+
+def test_first_build_publishes_everything(workspace):
+    workspace("CA", "a.html", regulation_text(1))
+    workspace("CO", "b.html", regulation_text(2))
+    stats = builder().build()
+    assert stats["changed_documents"] == 2
+    assert stats["embedded_chunks"] == stats["total_vectors"] > 0
+    assert sorted(published_ids()) == sorted(corpus_ids()) == list(range(stats["total_vectors"]))
+
+
+def test_rebuild_without_changes_is_a_no_op(workspace):
+    workspace("CA", "a.html", regulation_text(1))
+    builder().build()
+    version = current_version("rag/index")
+
+    stats = builder().build()
+    assert stats["embedded_chunks"] == 0 and stats["changed_documents"] == 0
+    assert current_version("rag/index") == version
+
+
+def test_incremental_build_only_embeds_changed_pages(workspace):
+    workspace("CA", "a.html", regulation_text(1))
+    page = workspace("CO", "b.html", regulation_text(2))
+    first = builder().build()
+    ids_before = set(published_ids())
+
+    page.write_text(f"<html><body><p>{regulation_text(3)}</p></body></html>")
+    stats = builder().build()
+    assert stats["changed_documents"] == 1 and stats["unchanged_documents"] == 1
+    assert 0 < stats["embedded_chunks"] < first["embedded_chunks"]
+    ids_after = published_ids()
+    assert len(ids_after) == len(set(ids_after)) == stats["total_vectors"]
+    # New chunks never reuse ids
+    assert min(set(ids_after) - ids_before) >= first["total_vectors"]
+
+
+def test_removed_page_drops_its_vectors(workspace):
+    workspace("CA", "a.html", regulation_text(1))
+    page = workspace("CO", "b.html", regulation_text(2))
+    first = builder().build()
+
+    page.unlink()
+    stats = builder().build()
+    assert stats["removed_documents"] == 1
+    assert stats["removed_vectors"] > 0
+    assert stats["total_vectors"] == first["total_vectors"] - stats["removed_vectors"] == len(published_ids())
+
+
+def test_failed_publish_leaves_corpus_and_ids_intact(workspace, monkeypatch):
+    workspace("CA", "a.html", regulation_text(1))
+    builder().build()
+    version, corpus_before = current_version("rag/index"), corpus_ids()
+
+    workspace("CO", "new.html", regulation_text(2))
+    failing = builder()
+
+    def publish(*args, **kwargs):
+        raise RuntimeError("publish failed")
+
+    monkeypatch.setattr(failing, "publish", publish)
+    with pytest.raises(RuntimeError):
+        failing.build()
+    assert current_version("rag/index") == version
+    assert corpus_ids() == corpus_before
+
+    stats = builder().build()
+    assert stats["changed_documents"] == 1
+    for ids in (published_ids(), corpus_ids()):
+        assert not [i for i, count in Counter(ids).items() if count > 1]
+        assert len(ids) == stats["total_vectors"]
+
+
+def test_published_snapshot_is_searchable(workspace):
+    workspace("CA", "a.html", regulation_text(1))
+    workspace("CO", "b.html", regulation_text(2))
+    builder().build()
+    retriever = HotReloadRetriever("rag/index", HashEmbeddings(), k=3)
+    hits = retriever.search("Section 2.5 requires")
+    assert hits and hits[0][0]["state"] == "CO"
@@ -0,0 +1,63 @@
+"""Structured questions against the in-memory compliance graph"""
+
+from knowledge_graph import KnowledgeGraph, parse_turtle, snapshot_path
+
+ONTOLOGY = """
+@prefix compliance: <http://formul8.ai/ontology/compliance#> .
+@prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#> .
+
+compliance:CaliforniaDCC a compliance:RegulatoryBody ;
+    rdfs:label "California Department of Cannabis Control" .
+
+compliance:ColoradoMED a compliance:RegulatoryBody ;
+    rdfs:label "Colorado Marijuana Enforcement Division" .
+
+compliance:CultivationLicense a compliance:LicenseType ;
+    rdfs:label "Cannabis Cultivation License" ;
+    compliance:issuedBy compliance:CaliforniaDCC ;
+    compliance:requiresWaterRights true .
+
+compliance:RetailLicense a compliance:LicenseType ;
+    rdfs:label "Cannabis Retail License" ;
+    compliance:requiresWaterRights false .
+"""
+
+
+def graph() -> KnowledgeGraph:
+    return KnowledgeGraph(list(parse_turtle(ONTOLOGY)))
+
+
+def test_answer_flags_classes_and_entities():
+    kg = graph()
+    assert kg.answer("which license types require water rights") == (
+        "Entities with requires water rights:\n"
+        "  - Cannabis Cultivation License (compliance:CultivationLicense)"
+    )
+    assert kg.answer("list the regulatory bodies") == (
+        "Regulatory Body (2):\n"
+        "  - California Department of Cannabis Control (compliance:CaliforniaDCC)\n"
+        "  - Colorado Marijuana Enforcement Division (compliance:ColoradoMED)"
+    )
+    assert kg.answer("Colorado marijuana enforcement").startswith("Colorado Marijuana Enforcement Division")
+    assert kg.answer("hello world") == "No matching entities in the compliance knowledge graph"
+
+
+def test_answer_does_not_scan_every_triple(monkeypatch):
+    kg = graph()
+    match = kg.match
+
+    def bound_match(subject=None, predicate=None, obj=None):
+        assert (subject, predicate, obj) != (None, None, None), "answer() scanned the whole graph"
+        return match(subject, predicate, obj)
+
+    monkeypatch.setattr(kg, "match", bound_match)
+    assert "Cultivation License" in kg.answer("which license types require water rights")
+
+
+def test_label_index_survives_snapshot(tmp_path):
+    ttl_path = tmp_path / "knowledge_base.ttl"
+    ttl_path.write_text(ONTOLOGY)
+    parsed = KnowledgeGraph.load(str(ttl_path), snapshot_path(str(ttl_path)))
+    restored = KnowledgeGraph.load(str(ttl_path), snapshot_path(str(ttl_path)))
+    assert restored.word_nodes == parsed.word_nodes
+    assert restored.answer("cannabis retail license") == parsed.answer("cannabis retail license")
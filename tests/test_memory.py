@@ -0,0 +1,41 @@
+"""Per-user conversation windows: isolation, token budgets and persistence"""
+
+from core.memory import SessionMemoryStore
+
+
+def store(**kwargs):
+    memory = SessionMemoryStore(**kwargs)
+    # One token per word keeps budgets easy to reason about
+    memory._count_tokens = lambda text: len(text.split())
+    return memory
+
+
+def test_users_do_not_see_each_other_s_turns(tmp_path):
+    memory = store(persist_dir=str(tmp_path / "sessions"))
+    memory.save_turn("alice", "Is delivery allowed in Oregon?", "Yes, with a license.")
+    memory.save_turn("bob", "What are Colorado testing rules?", "Potency and contaminants.")
+
+    assert memory.get_history("alice") == "Human: Is delivery allowed in Oregon?\nAI: Yes, with a license."
+    assert "Oregon" not in memory.get_history("bob")
+    assert memory.get_history("carol") == ""
+
+    # Sessions reloaded from disk stay separated too
+    reloaded = store(persist_dir=str(tmp_path / "sessions"))
+    assert "Colorado" not in reloaded.get_history("alice")
+    assert "Colorado" in reloaded.get_history("bob")
+
+
+def test_window_is_trimmed_to_the_budget_keeping_the_newest_turn():
+    memory = store(max_tokens=10)
+    for n in range(1, 5):
+        memory.save_turn("alice", f"question {n}", f"answer number {n}")  # 5 tokens per turn
+
+    history = memory.get_history("alice")
+    assert "question 1" not in history and "question 2" not in history
+    assert history.endswith("Human: question 4\nAI: answer number 4")
+    assert memory._sessions["alice"].tokens <= 10
+
+    # A turn larger than the whole budget is still kept, on its own
+    memory.save_turn("alice", "a very long question " * 5, "long answer")
+    turns = memory._sessions["alice"].turns
+    assert len(turns) == 1 and turns[0]["ai"] == "long answer"
@@ -0,0 +1,70 @@
+"""Requirement mining from mirrored pages and state_requirements.json persistence"""
+
+import json
+
+import pytest
+
+from regulation_store import RegulationStore, is_requirement
+
+BANNER = "It has known security flaws and may not display all features of this and other websites."
+MENU = "View the plan Get started Apply for a license Renew your license Search for a license File a complaint"
+REQUIREMENT = "Licensees must maintain video surveillance of all limited-access areas at all times."
+
+
+def test_is_requirement():
+    assert is_requirement(REQUIREMENT)
+    assert is_requirement("Each package bears the universal symbol described in Section 5000 of this chapter.")
+    assert not is_requirement(BANNER)
+    assert not is_requirement(MENU)
+    assert not is_requirement("The office oversees licensing, compliance and enforcement statewide.")
+
+
+def test_mining_skips_page_chrome(workspace):
+    page = workspace("OR", "index.html", "")
+    page.write_text(
+        "<html><body>"
+        f'<div id="outdated" role="complementary"><p>Your browser is out-of-date! {BANNER}</p></div>'
+        f'<div class="site-menu"><ul><li>{MENU}.</li></ul></div>'
+        f"<main><p>{REQUIREMENT} Security cameras are a popular topic this year.</p></main>"
+        "</body></html>"
+    )
+    store = RegulationStore.build("regulations", "missing.ttl")
+    facts = store.lookup("OR", "security")["security"]
+    assert [fact["fact"] for fact in facts] == [REQUIREMENT]
+    assert store.lookup("OR", "testing")["testing"] == []
+    assert "Testing: no requirements on file" in store.format("OR", ["testing"])
+
+
+def test_save_leaves_no_temp_files(tmp_path):
+    path = tmp_path / "rag" / "state_requirements.json"
+    store = RegulationStore()
+    store.add_fact("CA", "security", REQUIREMENT, "CA/index.html")
+    store.save(str(path))
+    store.save(str(path))
+    assert [p.name for p in path.parent.iterdir()] == ["state_requirements.json"]
+    assert RegulationStore.load(str(path)).lookup("CA", "security")["security"][0]["fact"] == REQUIREMENT
+
+
+def test_agents_never_mine_a_missing_or_outdated_store(workspace, monkeypatch):
+    workspace("CA", "index.html", REQUIREMENT)
+    monkeypatch.setattr(RegulationStore, "build", lambda *args: pytest.fail("a serving process mined the mirror"))
+    path = "rag/state_requirements.json"
+    assert RegulationStore.load_or_empty(".").states == {}
+    for contents in ('{"states": {"CA": ', json.dumps({"built": "2024-01-01", "states": {}})):
+        with open(path, "w") as f:
+            f.write(contents)
+        assert RegulationStore.load_or_empty(".").states == {}
+        with open(path) as f:
+            assert f.read() == contents
+
+
+def test_daily_update_rebuilds_a_missing_or_outdated_store(workspace):
+    from update_regulations_daily import regulation_store_is_current
+
+    path = "rag/state_requirements.json"
+    assert not regulation_store_is_current()
+    with open(path, "w") as f:
+        json.dump({"built": "2024-01-01", "states": {}}, f)
+    assert not regulation_store_is_current()
+    RegulationStore().save(path)
+    assert regulation_store_is_current()
@@ -0,0 +1,60 @@
+"""Response cache: exact hits, version invalidation and semantic near misses"""
+
+import numpy as np
+
+from core.response_cache import ResponseCache, same_question
+
+SCOPE, VERSION = "CA", "v1"
+
+
+class ConstantEmbeddings:
+    """Every query embeds to the same vector, so similarity never rules a match out"""
+
+    def embed_query(self, text):
+        return np.ones(8, dtype="float32")
+
+
+def semantic_cache():
+    return ResponseCache(embeddings=ConstantEmbeddings(), similarity_threshold=0.98)
+
+
+def test_exact_hit_and_version_invalidation():
+    cache = ResponseCache()
+    cache.put("What are the testing requirements?", SCOPE, VERSION, {"response": "answer"})
+    assert cache.get("what are the testing requirements", SCOPE, VERSION) == {"response": "answer"}
+    assert cache.get("What are the testing requirements?", "CO", VERSION) is None
+    assert cache.get("What are the testing requirements?", SCOPE, "v2") is None
+
+
+def test_semantic_match_allows_reordering_and_inflection():
+    cache = semantic_cache()
+    cache.put("What are the product testing requirements in California?", SCOPE, VERSION, {"response": "testing"})
+    hit = cache.get("California requirement for testing products", SCOPE, VERSION)
+    assert hit == {"response": "testing"}
+    assert cache.semantic_hits == 1
+
+
+def test_semantic_match_rejects_different_content_terms():
+    cache = semantic_cache()
+    cache.put("What are the product testing requirements?", SCOPE, VERSION, {"response": "testing"})
+    assert cache.get("What are the product labeling requirements?", SCOPE, VERSION) is None
+    assert cache.get("What are the product testing requirements for edibles?", SCOPE, VERSION) is None
+
+
+def test_semantic_match_rejects_negation():
+    cache = semantic_cache()
+    cache.put("Must dispensaries verify customer age?", SCOPE, VERSION, {"response": "yes"})
+    assert cache.get("Must dispensaries not verify customer age?", SCOPE, VERSION) is None
+    assert cache.get("Don't dispensaries verify customer age?", SCOPE, VERSION) is None
+
+
+def test_semantic_match_respects_threshold():
+    cache = ResponseCache(embeddings=ConstantEmbeddings(), similarity_threshold=1.01)
+    cache.put("What are the testing requirements?", SCOPE, VERSION, {"response": "answer"})
+    assert cache.get("Testing requirements: what are they?", SCOPE, VERSION) is None
+
+
+def test_same_question():
+    assert same_question("testing requirements", "requirement testing")
+    assert not same_question("labeling requirements", "testing requirements")
+    assert not same_question("must verify age", "must not verify age")
@@ -0,0 +1,160 @@
+"""QueryRunner backpressure, query timeouts, SSE streaming and ETag revalidation through the AgentServer API"""
+
+import asyncio
+import json
+import os
+import threading
+
+import pytest
+
+from server import AgentServer, CachedJSONFile, QueryRunner
+
+
+class SlowAgent:
+    """Answers after delay seconds, or once release is set"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.release = threading.Event()
+
+    async def process_query(self, user_id, query):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        else:
+            while not self.release.is_set():
+                await asyncio.sleep(0.01)
+        return {"response": f"answer to {query}", "user_id": user_id}
+
+
+@pytest.fixture
+def make_server():
+    servers = []
+
+    def make(agent, **kwargs):
+        server = AgentServer(agent=agent, **kwargs)
+        server.runner.start()
+        servers.append(server)
+        return server
+
+    yield make
+    for server in servers:
+        server.runner.shutdown(timeout=5)
+
+
+def test_query_is_answered(make_server):
+    server = make_server(SlowAgent(delay=0.01))
+    response = server.app.test_client().post("/api/query", json={"query": "testing rules", "user_id": "u"})
+    assert response.status_code == 200
+    assert response.get_json()["response"] == "answer to testing rules"
+
+
+def test_saturated_runner_returns_503_with_retry_after(make_server):
+    agent = SlowAgent()
+    server = make_server(agent, max_in_flight=1)
+    held = server.runner.try_submit(lambda: agent.process_query("other", "held"))
+    assert held is not None
+
+    response = server.app.test_client().post("/api/query", json={"query": "testing rules"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert server.runner.rejected == 1
+
+    agent.release.set()
+    held.result(timeout=5)
+    response = server.app.test_client().post("/api/query", json={"query": "testing rules"})
+    assert response.status_code == 200
+
+
+def test_slow_query_times_out_with_504(make_server):
+    server = make_server(SlowAgent(delay=1.0), query_timeout=0.1)
+    response = server.app.test_client().post("/api/query", json={"query": "testing rules"})
+    assert response.status_code == 504
+    assert server.runner.timeouts == 1
+
+
+def test_empty_query_is_rejected(make_server):
+    server = make_server(SlowAgent(delay=0.01))
+    assert server.app.test_client().post("/api/query", json={"query": "  "}).status_code == 400
+
+
+def test_shutdown_waits_for_in_flight_queries_and_stops_accepting():
+    agent = SlowAgent(delay=0.2)
+    runner = QueryRunner(max_in_flight=4)
+    future = runner.try_submit(lambda: agent.process_query("u", "q"))
+    runner.shutdown(timeout=5)
+    assert future.done() and runner.in_flight == 0
+    assert runner.try_submit(lambda: agent.process_query("u", "q")) is None
+
+
+def sse_events(body):
+    """(event, data) pairs of a server-sent event stream, without heartbeats"""
+    events = []
+    for block in body.split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if line and not line.startswith(":"))
+        if "event" in fields:
+            events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def test_stream_sends_tool_progress_then_answer_tokens(make_server, stub_agent):
+    agent = stub_agent(lambda query: "Licensees must keep security footage for ninety days")
+    server = make_server(agent)
+    response = server.app.test_client().post("/api/query/stream", json={"query": "footage retention", "user_id": "u"})
+    assert response.mimetype == "text/event-stream"
+    events = sse_events(response.get_data(as_text=True))
+
+    names = [name for name, _ in events]
+    assert names[:3] == ["start", "tool", "tool_end"]
+    assert names[-2:] == ["result", "done"]
+    assert set(names[3:-2]) == {"token"}
+    assert events[1][1]["message"] == "Using lookup: footage retention"
+    result = events[-2][1]
+    assert "".join(data["text"] for name, data in events if name == "token") == result["response"]
+    assert result["response"].startswith("Based on the regulations, ")
+
+
+def test_stream_reports_a_failed_run_as_an_error_event(make_server, stub_agent):
+    def lookup(query):
+        raise RuntimeError("regulation store offline")
+
+    server = make_server(stub_agent(lookup))
+    events = sse_events(server.app.test_client().post("/api/query/stream", json={"query": "footage"})
+                        .get_data(as_text=True))
+    assert [name for name, _ in events][-2:] == ["error", "done"]
+    assert "regulation store offline" in events[-2][1]["response"]
+
+
+def test_dashboard_json_is_revalidated_with_etags(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    questions = tmp_path / "baseline.json"
+    questions.write_text(json.dumps({"questions": [{"id": "q1", "question": "Who licenses retail?"}]}))
+    server = AgentServer()
+    server.baseline_questions.check_interval = 0
+    client = server.app.test_client()
+
+    first = client.get("/api/baseline-questions")
+    assert first.status_code == 200 and first.headers["ETag"]
+    revalidated = client.get("/api/baseline-questions", headers={"If-None-Match": first.headers["ETag"]})
+    assert revalidated.status_code == 304 and revalidated.get_data() == b""
+
+    questions.write_text(json.dumps({"questions": []}))
+    os.utime(questions, ns=(questions.stat().st_atime_ns, questions.stat().st_mtime_ns + 10**9))
+    changed = client.get("/api/baseline-questions", headers={"If-None-Match": first.headers["ETag"]})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != first.headers["ETag"]
+    assert changed.get_json() == {"questions": []}
+
+
+def test_cached_file_is_reread_only_when_it_changes(tmp_path):
+    path = tmp_path / "results.json"
+    path.write_text(json.dumps({"results": [1]}))
+    loads = []
+    cached = CachedJSONFile([str(path)], prepare=lambda payload: loads.append(payload) or payload,
+                            check_interval=0)
+    assert cached.get() == {"results": [1]}
+    assert cached.get() == {"results": [1]}
+    assert len(loads) == 1
+
+    path.write_text(json.dumps({"results": [1, 2]}))
+    assert cached.get() == {"results": [1, 2]}
+    assert len(loads) == 2
@@ -0,0 +1,54 @@
+"""Stub LLM selection and the ReAct text it produces"""
+
+import asyncio
+
+from core.stub_llm import StubLLM
+
+PROMPT = """Assistant has access to the following tools:
+
+> lookup: Look up a regulation
+> state_requirements: Per-state requirements
+
+To use a tool, please use the following format:
+Action: the action to take, should be one of [lookup, state_requirements]
+
+New input: How long must footage be kept?
+"""
+OBSERVED = PROMPT + "Thought: Do I need to use a tool? Yes\nAction: lookup\nAction Input: How long must footage be kept?\n" \
+    "Observation: Licensees must keep surveillance footage for ninety days\nThought:"
+
+
+def test_stub_calls_a_listed_tool_then_answers_from_the_observation():
+    llm = StubLLM(tool_steps=1, completion_tokens=12, seed=3)
+    assert llm.invoke(PROMPT) == (
+        "Thought: Do I need to use a tool? Yes\nAction: lookup\nAction Input: How long must footage be kept?"
+    )
+    answer = llm.invoke(OBSERVED)
+    assert answer.startswith("Thought: Do I need to use a tool? No\nAI: Based on the regulations, ")
+    words = answer.split("AI: Based on the regulations, ")[1].rstrip(".").split()
+    assert len(words) == 8
+    assert set(words) <= set("Licensees must keep surveillance footage for ninety days".split())
+
+
+def test_stub_output_depends_only_on_prompt_and_seed():
+    assert StubLLM(seed=1).invoke(OBSERVED) == StubLLM(seed=1).invoke(OBSERVED)
+    assert StubLLM(seed=1).invoke(OBSERVED) != StubLLM(seed=2).invoke(OBSERVED)
+    assert StubLLM(tool_sequence=["state_requirements"]).invoke(PROMPT).splitlines()[1] == \
+        "Action: state_requirements"
+
+
+def test_provider_stub_selects_the_stub_and_answers_through_the_agent(stub_agent):
+    agent = stub_agent(lambda query: "Licensees must keep surveillance footage for ninety days")
+    result = asyncio.run(agent.process_query("u", "How long must footage be kept?"))
+    assert isinstance(agent.llm, StubLLM)
+    assert not result.get("error")
+    assert result["response"].startswith("Based on the regulations, ")
+
+
+def test_unconfigured_llm_fails_instead_of_falling_back_to_the_stub(stub_agent, monkeypatch):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    agent = stub_agent(lambda query: "unused")
+    agent.config["llm"]["provider"] = "openai"
+    result = asyncio.run(agent.process_query("u", "How long must footage be kept?"))
+    assert agent.llm is None and agent.llm_error
+    assert result["error"] and "LLM unavailable" in result["response"]
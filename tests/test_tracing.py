@@ -0,0 +1,105 @@
+"""Histograms, Prometheus rendering and metrics merged across worker processes"""
+
+import subprocess
+import sys
+
+import pytest
+
+from core.tracing import Histogram, MetricsRegistry, aggregate_process_metrics, write_process_metrics
+from conftest import REPO_ROOT
+
+WORKER = """
+import sys
+sys.path.insert(0, {base_agent!r})
+from core.tracing import MetricsRegistry, write_process_metrics
+registry = MetricsRegistry()
+registry.observe("query_seconds", 0.2)
+registry.increment("tool_calls_total", 3, tool="regulatory_search")
+write_process_metrics({directory!r}, registry, gauges={{"queries_in_flight": 7}})
+"""
+
+
+def test_histogram_quantiles():
+    histogram = Histogram((0.1, 1.0, 10.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(value)
+    assert histogram.count == 4 and histogram.max == 5.0
+    assert 0.1 <= histogram.quantile(0.5) <= 1.0
+    assert histogram.quantile(0.99) <= 5.0
+
+
+def test_prometheus_histogram_is_cumulative():
+    registry = MetricsRegistry()
+    for value in (0.002, 0.2, 2.0):
+        registry.observe("query_seconds", value)
+    text = registry.render_prometheus()
+    assert 'agent_query_seconds_bucket{le="0.0025"} 1' in text
+    assert 'agent_query_seconds_bucket{le="+Inf"} 3' in text
+    assert "agent_query_seconds_count 3" in text
+
+
+def test_merge_requires_matching_buckets():
+    with pytest.raises(ValueError):
+        Histogram((1.0,)).merge(Histogram((2.0,)))
+
+
+def test_processes_are_merged_and_exited_workers_keep_their_counts(tmp_path):
+    directory = str(tmp_path / "metrics")
+    script = WORKER.format(base_agent=str(REPO_ROOT / "base_agent"), directory=directory)
+    subprocess.run([sys.executable, "-c", script], check=True)
+
+    registry = MetricsRegistry()
+    registry.observe("query_seconds", 0.4)
+    registry.increment("tool_calls_total", 2, tool="regulatory_search")
+    write_process_metrics(directory, registry, gauges={"queries_in_flight": 1})
+
+    merged, gauges = aggregate_process_metrics(directory)
+    summary = merged.summary()
+    assert summary["histograms"]["query_seconds"]["all"]["count"] == 2
+    assert summary["counters"]["tool_calls_total"]['{tool="regulatory_search"}'] == 5
+    # The subprocess has exited: its counts stay, its gauges go
+    assert list(gauges.values()) == [{"queries_in_flight": 1}]
+
+
+def test_metrics_endpoint_reports_every_worker(tmp_path):
+    import os
+
+    from server import AgentServer
+
+    directory = str(tmp_path / "metrics")
+    script = WORKER.format(base_agent=str(REPO_ROOT / "base_agent"), directory=directory)
+    subprocess.run([sys.executable, "-c", script], check=True)
+
+    server = AgentServer(metrics_dir=directory)
+    server.start()
+    try:
+        text = server.app.test_client().get("/metrics").get_data(as_text=True)
+    finally:
+        server.shutdown(timeout=5)
+    assert 'agent_tool_calls_total{tool="regulatory_search"}' in text
+    assert f'agent_queries_in_flight{{pid="{os.getpid()}"}} 0' in text
+    # The exited worker's gauges are not reported
+    assert text.count("agent_queries_in_flight{") == 1
+
+
+def test_metrics_polls_do_no_file_io_within_the_cache_ttl(tmp_path, monkeypatch):
+    import server as server_module
+    from server import AgentServer
+
+    server = AgentServer(metrics_dir=str(tmp_path / "metrics"), metrics_cache_ttl=60)
+    server.start()
+    try:
+        merges = []
+        aggregate = server_module.aggregate_process_metrics
+        monkeypatch.setattr(server_module, "aggregate_process_metrics",
+                            lambda *args: merges.append(args) or aggregate(*args))
+        monkeypatch.setattr(server_module, "write_process_metrics",
+                            lambda *args, **kwargs: pytest.fail("a request wrote metrics"))
+        client = server.app.test_client()
+        for _ in range(3):
+            assert client.get("/api/metrics").status_code == 200
+            assert client.get("/metrics").status_code == 200
+        assert len(merges) == 1
+    finally:
+        monkeypatch.undo()
+        server.shutdown(timeout=5)
@@ -0,0 +1,63 @@
+"""Snapshot indexes: memory-mapped loads and hot reload"""
+
+import os
+
+import faiss
+import numpy as np
+
+from core.embeddings import HashEmbeddings
+from core.vectorstore import MMAP_FLAGS, FaissVectorStore, HotReloadRetriever, current_version
+
+from conftest import regulation_text
+from knowledge_base_builder import KnowledgeBaseBuilder
+
+
+def test_mmap_load_serves_vectors_from_the_file(tmp_path):
+    vectors = np.random.default_rng(0).random((50, 8), dtype="float32")
+    store = FaissVectorStore(dimension=8)
+    store.add(list(range(50)), vectors)
+    path = str(tmp_path / "index.faiss")
+    store.save(path)
+
+    assert MMAP_FLAGS & faiss.IO_FLAG_MMAP_IFC
+    mapped = FaissVectorStore.load(path, mmap=True)
+    assert not faiss.downcast_index(mapped.index.index).codes.is_owned
+    assert faiss.downcast_index(FaissVectorStore.load(path).index.index).codes.is_owned
+    assert mapped.search(vectors[7], k=1)[0][0] == 7
+
+
+def sources(retriever, query):
+    return {record["source"] for record, _ in retriever.search(query)}
+
+
+def test_new_snapshot_is_served_after_the_pointer_flips(workspace):
+    workspace("CA", "a.html", regulation_text(1))
+    KnowledgeBaseBuilder(embeddings=HashEmbeddings()).build()
+    live = HotReloadRetriever("rag/index", HashEmbeddings(), k=5, check_interval=0)
+    first = live.snapshot.version
+    assert "CO/b.html" not in sources(live, "Section 2.5 requires")
+
+    workspace("CO", "b.html", regulation_text(2))
+    KnowledgeBaseBuilder(embeddings=HashEmbeddings()).build()
+    assert current_version("rag/index") != first
+    assert "CO/b.html" in sources(live, "Section 2.5 requires")
+    assert live.snapshot.version == current_version("rag/index")
+
+
+def test_pruned_snapshot_keeps_serving_an_open_reader(workspace):
+    workspace("CA", "a.html", regulation_text(1))
+    KnowledgeBaseBuilder(embeddings=HashEmbeddings()).build()
+    # Never reloads, like a worker mid-query while newer versions are published
+    reader = HotReloadRetriever("rag/index", HashEmbeddings(), k=5, check_interval=3600)
+    held = reader.snapshot.version
+
+    for seed, state in ((2, "CO"), (3, "WA")):
+        workspace(state, f"{seed}.html", regulation_text(seed))
+        KnowledgeBaseBuilder(embeddings=HashEmbeddings()).build()
+    # keep=2: only the current version and the one before it remain
+    assert not os.path.exists(os.path.join("rag/index", held))
+    assert len([name for name in os.listdir("rag/index") if os.path.isdir(os.path.join("rag/index", name))]) == 2
+
+    hits = reader.search("Section 1.5 requires")
+    assert hits and hits[0][0]["source"] == "CA/a.html"
+    assert reader.snapshot.version == held
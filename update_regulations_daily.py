@@ -9,7 +9,9 @@ import os
 import sys
 import logging
 from datetime import datetime
-from download_regulations import RegulationMirror
+from download_regulations import SimpleRegulationMirror
+from knowledge_base_builder import KnowledgeBaseBuilder
+from regulation_store import RegulationStore
 
 # Configure logging
 logging.basicConfig(
@@ -22,17 +24,31 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# States mirrored concurrently; per-host politeness is handled by the mirror
+MIRROR_WORKERS = int(os.environ.get("MIRROR_WORKERS", "8"))
+
+STATE_REQUIREMENTS_PATH = os.path.join("rag", "state_requirements.json")
+
+def regulation_store_is_current() -> bool:
+    """True if state_requirements.json exists and was written by this version's miner"""
+    try:
+        RegulationStore.load(STATE_REQUIREMENTS_PATH)
+        return True
+    except (OSError, ValueError, KeyError, TypeError):
+        return False
+
 def update_knowledge_base():
     """Update the RAG knowledge base with new regulations"""
     try:
-        # This would integrate with your existing RAG system
         logger.info("Updating knowledge base with new regulations...")
-        
-        # Process downloaded PDFs and extract text
-        # Update corpus.jsonl and knowledge_base.ttl
-        # Rebuild vector embeddings
-        
-        logger.info("Knowledge base update completed")
+
+        # Only documents that differ from the last build manifest are
+        # re-chunked and re-embedded; vectors for removed files are deleted
+        stats = KnowledgeBaseBuilder().build()
+        RegulationStore.build().save(STATE_REQUIREMENTS_PATH)
+
+        logger.info(f"Knowledge base update completed: {stats['changed_documents']} changed, "
+                    f"{stats['removed_documents']} removed, {stats['embedded_chunks']} chunks embedded")
         return True
     except Exception as e:
         logger.error(f"Failed to update knowledge base: {str(e)}")
@@ -42,12 +58,18 @@ def daily_update():
     """Perform daily regulation update"""
     logger.info("Starting daily regulation update...")
     
-    # Mirror latest regulatory websites
-    mirror = RegulationMirror()
-    download_results = mirror.mirror_all_websites()
+    # Mirror latest regulatory websites, all states in parallel
+    mirror = SimpleRegulationMirror(max_workers=MIRROR_WORKERS)
+    download_results = mirror.mirror_all_states()
     
-    # Update knowledge base
-    kb_success = update_knowledge_base()
+    # Update knowledge base only when the mirror actually rewrote something,
+    # or when the requirements store is missing or from an older miner
+    changed = sum(len(files) for files in mirror.changed_files.values())
+    if changed or not regulation_store_is_current():
+        kb_success = update_knowledge_base()
+    else:
+        logger.info("No regulation content changed; skipping knowledge base update")
+        kb_success = True
     
     # Log summary
     successful_downloads = sum(download_results.values())
@@ -55,6 +77,7 @@ def daily_update():
     
     logger.info(f"Daily update complete:")
     logger.info(f"  Downloads: {successful_downloads}/{total_states}")
+    logger.info(f"  Changed files: {changed}")
     logger.info(f"  Knowledge base: {'✅' if kb_success else '❌'}")
     
     return successful_downloads == total_states and kb_success
@@ -0,0 +1,45 @@
+"""
+WSGI Entry Point
+Serves the dashboard and query API under gunicorn:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Each worker process builds its own ComplianceAgent; the FAISS index and
+docstore are memory-mapped, so workers share those pages anyway.
+"""
+
+import os
+import sys
+
+# Add the base_agent module to Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(current_dir, "base_agent"))
+
+from core.agent import load_config
+from server import AgentServer
+
+
+def create_agent():
+    from agent import ComplianceAgent
+    return ComplianceAgent(current_dir)
+
+
+def create_server(port: int = 5000) -> AgentServer:
+    """Dashboard plus query API backed by one ComplianceAgent per process"""
+    config = load_config(os.path.join(current_dir, "agent_config.yaml"))
+    server_config = (config.get("server") if isinstance(config, dict) else None) or {}
+    return AgentServer(
+        agent_name="compliance-agent",
+        port=port,
+        agent_factory=create_agent,
+        max_in_flight=int(os.environ.get("MAX_IN_FLIGHT", server_config.get("max_in_flight", 32))),
+        query_timeout=float(os.environ.get("QUERY_TIMEOUT", server_config.get("query_timeout_seconds", 60))),
+        # Set by gunicorn.conf.py so /metrics covers every worker
+        metrics_dir=os.environ.get("METRICS_DIR"),
+        metrics_flush_interval=float(server_config.get("metrics_flush_seconds", 5)),
+        metrics_cache_ttl=float(server_config.get("metrics_cache_seconds", 2))
+    )
+
+
+server = create_server(int(os.environ.get("PORT", 5000)))
+app = server.app